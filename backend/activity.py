@@ -0,0 +1,183 @@
+# activity.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from datetime import date, timedelta
+from typing import List, Optional
+import logging
+
+from database import DailyPractice, UserDailyActivity
+
+logger = logging.getLogger(__name__)
+
+# practice_type -> UserDailyActivity per-type counter
+PRACTICE_TYPE_COLUMNS = {
+    "meditation": "meditation_sessions",
+    "yoga": "yoga_sessions",
+    "nlp": "nlp_sessions",
+}
+
+
+def record_daily_activity(
+    db: Session,
+    user_id: int,
+    day: date,
+    practice_type: str,
+    minutes: Optional[int],
+    new_session: bool,
+) -> UserDailyActivity:
+    """
+    Add one practice log to the user's rollup row for `day`.
+    new_session is False when minutes were added to an existing log.
+    Must run in the same transaction as the practice write; the caller commits.
+    """
+    # Locked so a concurrent backfill batch and this log apply in turn
+    activity = db.get(UserDailyActivity, (user_id, day), with_for_update=True)
+    if activity is None:
+        activity = UserDailyActivity(
+            user_id=user_id, activity_date=day, sessions=0, minutes=0,
+            **{column: 0 for column in PRACTICE_TYPE_COLUMNS.values()})
+        db.add(activity)
+        # Make the row visible to db.get for later logs in this transaction
+        db.flush()
+
+    activity.minutes += minutes or 0
+    if new_session:
+        activity.sessions += 1
+        column = PRACTICE_TYPE_COLUMNS.get(practice_type)
+        if column:
+            setattr(activity, column, getattr(activity, column) + 1)
+    return activity
+
+
+def daily_sessions(db: Session, user_id: int, days: int, today: Optional[date] = None) -> List[int]:
+    """
+    Sessions per day for the last `days` days, oldest first, from a single
+    range query over the rollup. Days without activity stay 0.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+    counts = [0] * days
+
+    rows = db.query(UserDailyActivity.activity_date, UserDailyActivity.sessions).filter(
+        UserDailyActivity.user_id == user_id,
+        UserDailyActivity.activity_date >= start,
+        UserDailyActivity.activity_date <= today,
+    )
+    for day, sessions in rows:
+        counts[(day - start).days] = sessions
+    return counts
+
+
+def activity_totals(db: Session, user_id: int) -> dict:
+    """Lifetime session and minute totals from the rollup."""
+    sessions, minutes = db.query(
+        func.coalesce(func.sum(UserDailyActivity.sessions), 0),
+        func.coalesce(func.sum(UserDailyActivity.minutes), 0),
+    ).filter(UserDailyActivity.user_id == user_id).one()
+    return {"sessions": int(sessions), "minutes": int(minutes)}
+
+
+def write_activity_batch(db: Session, user_ids: list) -> int:
+    """
+    Rebuild the rollup rows of one batch of users in a single transaction.
+    Existing rows are locked before daily_practice is read, so a practice
+    logged meanwhile is either already counted or waits for this batch.
+    Returns the number of rollup rows written.
+    """
+    existing = {
+        (user_id, day) for user_id, day in db.query(
+            UserDailyActivity.user_id, UserDailyActivity.activity_date,
+        ).filter(UserDailyActivity.user_id.in_(user_ids)).with_for_update()
+    }
+
+    grouped = db.query(
+        DailyPractice.user_id,
+        DailyPractice.logged_date,
+        DailyPractice.practice_type,
+        func.count(DailyPractice.id),
+        func.coalesce(func.sum(DailyPractice.duration_minutes), 0),
+    ).filter(
+        DailyPractice.user_id.in_(user_ids),
+    ).group_by(
+        DailyPractice.user_id,
+        DailyPractice.logged_date,
+        DailyPractice.practice_type,
+    )
+
+    rollups = {}
+    for user_id, day, practice_type, sessions, minutes in grouped:
+        row = rollups.setdefault((user_id, day), {
+            "user_id": user_id, "activity_date": day, "sessions": 0, "minutes": 0,
+            **{column: 0 for column in PRACTICE_TYPE_COLUMNS.values()},
+        })
+        row["sessions"] += sessions
+        row["minutes"] += int(minutes)
+        column = PRACTICE_TYPE_COLUMNS.get(practice_type)
+        if column:
+            row[column] += sessions
+
+    updates = [row for key, row in rollups.items() if key in existing]
+    inserts = [row for key, row in rollups.items() if key not in existing]
+    stale = existing - rollups.keys()
+
+    if updates:
+        # ORM bulk UPDATE by primary key (one executemany)
+        db.execute(update(UserDailyActivity), updates)
+    if inserts:
+        db.execute(insert(UserDailyActivity), inserts)
+    if stale:
+        db.query(UserDailyActivity).filter(
+            tuple_(UserDailyActivity.user_id, UserDailyActivity.activity_date).in_(stale),
+        ).delete(synchronize_session=False)
+    db.commit()
+    return len(rollups)
+
+
+def backfill_daily_activity(db: Session, batch_size: int = 500) -> int:
+    """
+    Rebuild the rollup from daily_practice for every user who has practiced.
+    Users are processed in id-ordered batches, one aggregate per batch.
+    Safe to run while practices are being logged. Returns the number of
+    rollup rows written.
+    """
+    written = 0
+    last_user_id = 0
+
+    while True:
+        user_ids = [
+            row[0] for row in db.query(DailyPractice.user_id).filter(
+                DailyPractice.user_id > last_user_id,
+            ).distinct().order_by(DailyPractice.user_id).limit(batch_size)
+        ]
+        if not user_ids:
+            break
+
+        try:
+            written += write_activity_batch(db, user_ids)
+        except IntegrityError:
+            # A practice log created one of the new rows first; the retry
+            # sees it and updates it instead
+            db.rollback()
+            written += write_activity_batch(db, user_ids)
+        last_user_id = user_ids[-1]
+        logger.info("Daily activity backfilled: %s rows", written)
+
+    return written
+
+
+if __name__ == "__main__":
+    # Backfill command: python activity.py [batch_size]
+    import sys
+    from database import SessionLocal, init_db
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    session = SessionLocal()
+    try:
+        batch = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+        total = backfill_daily_activity(session, batch_size=batch)
+        logger.info("Backfill complete: %s rollup rows", total)
+    finally:
+        session.close()
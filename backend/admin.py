@@ -1,6 +1,7 @@
 # admin.py (FIXED)
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta
@@ -23,6 +24,7 @@ from database import (
     AdminLog,
     RoleEnum,
     SessionLocal,
+    engine,
 )
 
 # Import all Pydantic SCHEMAS from models.py (as per your file structure)
@@ -38,7 +40,39 @@ from models import (
 )
 
 # Import auth dependencies
-from auth import admin_required, coach_required, AuthService
+from auth import (
+    admin_required,
+    coach_required,
+    AuthService,
+    Principal,
+    revoke_user_tokens,
+    invalidate_token_state,
+    token_cache_stats,
+)
+from scoring import get_user_scores
+from analytics import load_cohort, summarize_cohort, summarize_domains
+from pagination import (
+    fetch_results_page,
+    stream_results_ndjson,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+)
+from user_cache import user_cache
+from user_import import import_users
+from entitlements import (
+    revoke_level,
+    invalidate_entitlements,
+    level_from_service_type,
+    entitlement_cache_stats,
+)
+from db_pool import pool_stats
+from async_db import async_pool_stats
+from tracking import tracker
+from hashing import hashing_pool_stats
+from ratelimit import rate_limit_stats
+from maintenance import scheduler as maintenance_scheduler
+from leaderboard import leaderboard
 import json
 
 logger = logging.getLogger(__name__)
@@ -113,7 +147,7 @@ async def create_content(
     content_type: ContentType,
     content_data: ContentCreate,
     file: Optional[UploadFile] = File(None),
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """
@@ -187,7 +221,7 @@ async def create_content(
 async def update_content(
     content_id: int,
     update_data: ContentUpdate,
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """
@@ -246,7 +280,7 @@ async def update_content(
 @router.delete("/content/{content_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_content(
     content_id: int,
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """
@@ -298,7 +332,7 @@ async def list_content(
     is_published: Optional[bool] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """
@@ -323,7 +357,7 @@ async def list_content(
 @router.get("/content/{content_id}", response_model=ContentResponse)
 async def get_content(
     content_id: int,
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """Get single content details."""
@@ -341,12 +375,44 @@ async def get_content(
 
 # ====== USER MANAGEMENT ENDPOINTS ======
 
+@router.post("/users/import")
+async def bulk_import_users(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    current_admin: Principal = Depends(admin_required),
+    db: Session = Depends(get_db),
+):
+    """
+    Bulk-create users from a CSV (header row) or NDJSON upload with
+    UserCreate fields; password is optional. Existing emails are skipped
+    and every rejected row is listed in the report.
+    """
+    file_format = format or (
+        "ndjson" if (file.filename or "").lower().endswith((".ndjson", ".jsonl")) else "csv")
+    logger.info(
+        f"User import ({file_format}) by admin {current_admin.id}: {file.filename}")
+
+    # Parsing, hashing and inserts are blocking; keep them off the event loop
+    report = await run_in_threadpool(import_users, db, file.file, file_format)
+
+    log_admin_action(
+        db,
+        current_admin.id,
+        "users_imported",
+        "user",
+        None,
+        {key: report[key] for key in ("total", "created", "existing", "failed")},
+    )
+
+    return report
+
+
 @router.get("/users", response_model=List[UserDetailedResponse])
 async def list_users(
     is_active: Optional[bool] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """
@@ -369,11 +435,11 @@ async def list_users(
 @router.get("/users/{user_id}", response_model=UserDetailedResponse)
 async def get_user(
     user_id: int,
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """Get detailed user information."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = user_cache.get(db, user_id)
 
     if not user:
         raise HTTPException(
@@ -389,7 +455,7 @@ async def get_user(
 async def suspend_user(
     user_id: int,
     reason: Optional[str] = None,
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """Suspend a user account."""
@@ -406,7 +472,10 @@ async def suspend_user(
             )
 
         user.is_active = False
+        revoke_user_tokens(user)
         db.commit()
+        invalidate_token_state(user_id)
+        user_cache.invalidate(user_id)
 
         log_admin_action(
             db,
@@ -431,7 +500,7 @@ async def suspend_user(
 @router.put("/users/{user_id}/activate")
 async def activate_user(
     user_id: int,
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """Activate a user account."""
@@ -449,6 +518,8 @@ async def activate_user(
 
         user.is_active = True
         db.commit()
+        invalidate_token_state(user_id)
+        user_cache.invalidate(user_id)
 
         log_admin_action(
             db,
@@ -474,14 +545,19 @@ async def activate_user(
 @router.get("/users/{user_id}/assessments", response_model=List[AssessmentResultResponse])
 async def get_user_assessments(
     user_id: int,
+    response: Response,
     level: Optional[int] = None,
     domain: Optional[str] = None,
-    current_admin: User = Depends(admin_required),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """
     Get assessment scoring details for a user.
-    FastAPI will handle the from_orm conversion automatically.
+    Keyset-paginated like /assessment/history (X-Next-Cursor header,
+    ?cursor=); format=ndjson streams all rows after the cursor.
     """
     logger.info(
         f"Assessment details request for user {user_id} by admin {current_admin.id}")
@@ -495,7 +571,12 @@ async def get_user_assessments(
     if domain:
         query = query.filter(AssessmentResult.domain == domain)
 
-    results = query.all()
+    if format == "ndjson":
+        return stream_results_ndjson(query, cursor)
+
+    results, next_cursor = fetch_results_page(query, cursor, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
     return results
 
@@ -503,43 +584,26 @@ async def get_user_assessments(
 @router.get("/users/{user_id}/assessment-summary")
 async def get_user_assessment_summary(
     user_id: int,
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """Get overall assessment summary for a user."""
     logger.info(
         f"Assessment summary request for user {user_id} by admin {current_admin.id}")
 
-    # Get all assessment results for user
-    results = db.query(AssessmentResult).filter(
-        AssessmentResult.user_id == user_id).all()
+    summary = get_user_scores(db, user_id)
 
-    if not results:
+    if not summary["total_answers"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No assessments found for user",
         )
 
-    # Group by domain
-    domain_scores = {}
-    for result in results:
-        if result.domain not in domain_scores:
-            domain_scores[result.domain] = []
-        domain_scores[result.domain].append(result.domain_score)
-
-    # Calculate cumulative scores per domain
-    cumulative_scores = {
-        domain: sum(scores) for domain, scores in domain_scores.items()
-    }
-
-    # Calculate overall score
-    overall_score = sum(cumulative_scores.values())
-
     return {
         "user_id": user_id,
-        "domain_scores": cumulative_scores,
-        "overall_score": overall_score,
-        "total_assessments": len(results),
+        "domain_scores": summary["domain_scores"],
+        "overall_score": summary["overall_score"],
+        "total_assessments": summary["total_answers"],
     }
 
 
@@ -551,7 +615,7 @@ async def get_user_payments(
     status: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """
@@ -579,7 +643,7 @@ async def list_all_payments(
     payment_gateway: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """
@@ -608,7 +672,7 @@ async def process_refund(
     user_id: int,
     payment_id: int,
     refund_reason: str,
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """
@@ -643,8 +707,12 @@ async def process_refund(
         payment.refund_reason = refund_reason
         payment.refunded_at = datetime.utcnow()
         payment.status = "refunded"
+        level = level_from_service_type(payment.service_type)
+        if level is not None:
+            revoke_level(db, user_id, level)
 
         db.commit()
+        invalidate_entitlements(user_id)
 
         log_admin_action(
             db,
@@ -671,7 +739,7 @@ async def process_refund(
 @router.get("/analytics/users")
 async def get_user_analytics(
     days: int = Query(30, ge=1, le=365),
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """Get user engagement analytics for last N days."""
@@ -714,7 +782,7 @@ async def get_user_analytics(
 @router.get("/analytics/payments")
 async def get_payment_analytics(
     days: int = Query(30, ge=1, le=365),
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """Get payment analytics for last N days."""
@@ -759,7 +827,7 @@ async def get_payment_analytics(
 
 @router.get("/analytics/content")
 async def get_content_analytics(
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """Get content performance analytics."""
@@ -788,6 +856,74 @@ async def get_content_analytics(
     return {"content_stats": content_stats}
 
 
+@router.get("/analytics/assessments")
+async def get_assessment_analytics(
+    days: Optional[int] = Query(None, ge=1, le=3650),
+    complete_only: bool = False,
+    current_admin: Principal = Depends(admin_required),
+    db: Session = Depends(get_db),
+):
+    """
+    Population-level assessment report: overall score distribution,
+    stage histogram and level completion funnel.
+    complete_only restricts scores to users who finished all levels.
+    """
+    logger.info(f"Assessment analytics request by admin {current_admin.id}")
+
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    cohort = load_cohort(db, since)
+
+    return {
+        "period_days": days,
+        **summarize_cohort(cohort, complete_only),
+    }
+
+
+@router.get("/analytics/assessments/domains")
+async def get_assessment_domain_analytics(
+    days: Optional[int] = Query(None, ge=1, le=3650),
+    complete_only: bool = False,
+    current_admin: Principal = Depends(admin_required),
+    db: Session = Depends(get_db),
+):
+    """Per-domain score mean and percentiles across all users."""
+    logger.info(
+        f"Assessment domain analytics request by admin {current_admin.id}")
+
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    cohort = load_cohort(db, since)
+
+    return {
+        "period_days": days,
+        **summarize_domains(cohort, complete_only),
+    }
+
+
+# ====== SYSTEM METRICS ======
+
+@router.get("/metrics")
+async def get_system_metrics(
+    current_admin: Principal = Depends(admin_required),
+):
+    """
+    Per-process runtime counters: DB pool occupancy and waits, background
+    queues, caches and rate limiters. Each worker reports its own numbers.
+    """
+    return {
+        "pid": os.getpid(),
+        "db_pool": pool_stats(engine),
+        "db_pool_async": async_pool_stats(),
+        "tracking": tracker.stats(),
+        "password_hashing": hashing_pool_stats(),
+        "tokens": token_cache_stats(),
+        "user_cache": user_cache.stats(),
+        "entitlements": entitlement_cache_stats(),
+        "rate_limits": rate_limit_stats(),
+        "maintenance": maintenance_scheduler.stats(),
+        "leaderboard": leaderboard.stats(),
+    }
+
+
 # ====== AUDIT LOG ENDPOINTS ======
 
 @router.get("/audit-logs")
@@ -796,7 +932,7 @@ async def get_audit_logs(
     admin_id: Optional[int] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=500),
-    current_admin: User = Depends(admin_required),
+    current_admin: Principal = Depends(admin_required),
     db: Session = Depends(get_db),
 ):
     """Get audit logs for admin actions."""
@@ -0,0 +1,178 @@
+# analytics.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import case
+from datetime import datetime
+from typing import Optional
+import logging
+
+import numpy as np
+
+from database import AssessmentResult
+from assessment_data import LIFE_DOMAINS
+from scoring import (
+    POINTS_EXPRESSION,
+    latest_attempt_only,
+    OVERALL_STAGE_THRESHOLDS,
+    QUESTIONS_PER_LEVEL,
+)
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 50000
+ASSESSMENT_LEVELS = (1, 2, 3)
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Maps the stored domain name to its LIFE_DOMAINS position in the database,
+# so every fetched column is a plain integer.
+DOMAIN_INDEX_EXPRESSION = case(
+    {domain: idx for idx, domain in enumerate(LIFE_DOMAINS)},
+    value=AssessmentResult.domain,
+    else_=-1,
+)
+
+
+def load_result_columns(db: Session, since: Optional[datetime] = None) -> np.ndarray:
+    """
+    Pull (user_id, domain_index, level, points) for the latest attempt of
+    every user's levels as an (n, 4) int64 array, fetched in CHUNK_SIZE
+    batches.
+    """
+    criteria = []
+    if since is not None:
+        criteria.append(AssessmentResult.completed_at >= since)
+    query = latest_attempt_only(db.query(
+        AssessmentResult.user_id,
+        DOMAIN_INDEX_EXPRESSION,
+        AssessmentResult.level,
+        POINTS_EXPRESSION,
+    ), *criteria)
+
+    result = db.execute(
+        query.statement.execution_options(yield_per=CHUNK_SIZE))
+    chunks = [
+        np.array(partition, dtype=np.int64).reshape(-1, 4)
+        for partition in result.partitions(CHUNK_SIZE)
+    ]
+
+    if not chunks:
+        return np.empty((0, 4), dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+def build_cohort(columns: np.ndarray) -> dict:
+    """
+    Fold result columns into per-user matrices:
+    domain_scores (users x domains) and level_counts (users x levels).
+    """
+    user_ids, user_idx = np.unique(columns[:, 0], return_inverse=True)
+    domain_idx = columns[:, 1]
+    levels = columns[:, 2]
+    points = columns[:, 3]
+
+    domain_scores = np.zeros((len(user_ids), len(LIFE_DOMAINS)), dtype=np.int64)
+    known = domain_idx >= 0
+    np.add.at(domain_scores, (user_idx[known], domain_idx[known]), points[known])
+
+    level_counts = np.zeros(
+        (len(user_ids), len(ASSESSMENT_LEVELS)), dtype=np.int64)
+    in_range = (levels >= 1) & (levels <= len(ASSESSMENT_LEVELS))
+    np.add.at(level_counts, (user_idx[in_range], levels[in_range] - 1), 1)
+
+    return {
+        "user_ids": user_ids,
+        "domain_scores": domain_scores,
+        "level_counts": level_counts,
+    }
+
+
+def load_cohort(db: Session, since: Optional[datetime] = None) -> dict:
+    """Load and fold all assessment results into cohort matrices."""
+    cohort = build_cohort(load_result_columns(db, since))
+    logger.info("Cohort built: %s users", len(cohort["user_ids"]))
+    return cohort
+
+
+def stage_histogram(overall_scores: np.ndarray) -> dict:
+    """Count users per overall stage using OVERALL_STAGE_THRESHOLDS."""
+    upper_bounds = np.array([bound for bound, _ in OVERALL_STAGE_THRESHOLDS])
+    stage_idx = np.minimum(
+        np.searchsorted(upper_bounds, overall_scores, side="left"),
+        len(upper_bounds) - 1,
+    )
+    counts = np.bincount(stage_idx, minlength=len(upper_bounds))
+    return {
+        stage: int(count)
+        for (_, stage), count in zip(OVERALL_STAGE_THRESHOLDS, counts)
+    }
+
+
+def distribution(values: np.ndarray, axis: Optional[int] = None) -> dict:
+    """Mean and PERCENTILES of values (per column when axis=0)."""
+    if values.size == 0:
+        return {"mean": None, "percentiles": {}}
+
+    mean = values.mean(axis=axis)
+    pct = np.percentile(values, PERCENTILES, axis=axis)
+    return {"mean": mean, "percentiles": dict(zip(PERCENTILES, pct))}
+
+
+def completion_funnel(level_counts: np.ndarray) -> list:
+    """Users who started and completed each level."""
+    completed = level_counts >= QUESTIONS_PER_LEVEL
+    return [
+        {
+            "level": level,
+            "started": int((level_counts[:, idx] > 0).sum()),
+            "completed": int(completed[:, idx].sum()),
+        }
+        for idx, level in enumerate(ASSESSMENT_LEVELS)
+    ]
+
+
+def select_users(cohort: dict, complete_only: bool) -> np.ndarray:
+    """Row mask for the users to report on."""
+    if complete_only:
+        return (cohort["level_counts"] >= QUESTIONS_PER_LEVEL).all(axis=1)
+    return np.ones(len(cohort["user_ids"]), dtype=bool)
+
+
+def summarize_cohort(cohort: dict, complete_only: bool = False) -> dict:
+    """Population-level overall score, stage and funnel report."""
+    mask = select_users(cohort, complete_only)
+    overall = cohort["domain_scores"][mask].sum(axis=1)
+    overall_dist = distribution(overall)
+
+    return {
+        "users": int(mask.sum()),
+        "overall_score": {
+            "mean": _round(overall_dist["mean"]),
+            "percentiles": {
+                str(p): _round(v) for p, v in overall_dist["percentiles"].items()
+            },
+        },
+        "stage_histogram": stage_histogram(overall),
+        "level_funnel": completion_funnel(cohort["level_counts"]),
+    }
+
+
+def summarize_domains(cohort: dict, complete_only: bool = False) -> dict:
+    """Per-domain mean and percentiles across the cohort."""
+    mask = select_users(cohort, complete_only)
+    scores = cohort["domain_scores"][mask]
+    dist = distribution(scores, axis=0)
+
+    domains = {}
+    for idx, domain in enumerate(LIFE_DOMAINS):
+        domains[domain] = {
+            "mean": _round(dist["mean"][idx]) if scores.size else None,
+            "percentiles": {
+                str(p): _round(v[idx]) for p, v in dist["percentiles"].items()
+            },
+        }
+
+    return {"users": int(mask.sum()), "domains": domains}
+
+
+def _round(value) -> Optional[float]:
+    return None if value is None else round(float(value), 2)
@@ -1,25 +1,44 @@
 # assessment.py (FINAL FIXED VERSION)
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, Header
 from sqlalchemy.orm import Session
+from sqlalchemy import insert, func
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import hashlib
+import json
 import logging
 from database import (
     get_db,
-    User,
     AssessmentResult,
-    PaymentLog,
-    UserTracking,
+    AssessmentSubmission,
 )
+from async_db import run_db
 from models import AssessmentResultResponse, AnswersBody
 from assessment_data import (
     ASSESSMENT_QUESTIONS,
     DOMAIN_FEEDBACK,
     OVERALL_SCORE_STAGES,
-    LIFE_DOMAINS,
+    POINT_VALUES,
+)
+from auth import get_current_principal, Principal
+from pagination import (
+    fetch_results_page,
+    stream_results_ndjson,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+)
+from tracking import track_event
+from entitlements import check_level_access, get_unlocked_levels, FREE_LEVELS
+from scoring import (
+    get_user_scores,
+    count_answers_by_level,
+    get_overall_stage_key,
+    apply_submission_to_snapshot,
+    QUESTIONS_PER_LEVEL,
 )
-from auth import get_current_user
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +46,12 @@ router = APIRouter(prefix="/api/v1/assessment", tags=["Assessment & Scoring"])
 
 # ====== CONSTANTS ======
 
-POINT_VALUES = {"A": 4, "B": 3, "C": 2, "D": 1}
 LEVEL_PRICES = {
     1: {"INR": 0, "GBP": 0, "USD": 0},  # Level 1 is free
     2: {"INR": 500, "GBP": 5, "USD": 5},
     3: {"INR": 1000, "GBP": 10, "USD": 10},
 }
+QUESTION_LANGUAGES = ("en", "de", "fr")
 
 
 # ====== HELPER FUNCTIONS ======
@@ -49,47 +68,250 @@ def get_domain_score_interpretation(score: int) -> dict:
 
 def get_overall_stage(overall_score: int) -> dict:
     """Get stage interpretation for overall score (36-144)."""
-    if overall_score <= 71:
-        return OVERALL_SCORE_STAGES["foundation"]
-    elif overall_score <= 107:
-        return OVERALL_SCORE_STAGES["growth"]
-    else:
-        return OVERALL_SCORE_STAGES["transformation"]
+    return OVERALL_SCORE_STAGES[get_overall_stage_key(overall_score)]
 
 
 def calculate_cumulative_domain_scores(db: Session, user_id: int) -> dict:
     """
     Calculate per-domain scores across all completed levels.
     """
-    domain_scores = {}
+    return get_user_scores(db, user_id)["domain_scores"]
+
+
+def build_answer_rows(user_id: int, level: int, answers: dict) -> list:
+    """
+    Validate a full answer map in one pass and build the rows to insert.
+    Raises HTTPException(400) listing every invalid answer at once.
+    """
+    questions = ASSESSMENT_QUESTIONS[level]
+
+    if len(answers) != len(questions):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Expected {len(questions)} answers, got {len(answers)}",
+        )
+
+    completed_at = datetime.utcnow()
+    rows = []
+    invalid = []
+
+    for idx, question in enumerate(questions):
+        answer = (answers.get(str(idx)) or "").upper()
+        points = POINT_VALUES.get(answer)
+
+        if points is None:
+            invalid.append(f"{idx}: {answer}")
+            continue
+
+        rows.append({
+            "user_id": user_id,
+            "level": level,
+            "domain": question["domain"],
+            "domain_score": points,
+            "answer": answer,
+            "question_index": idx,
+            "completed_at": completed_at,
+            "created_at": completed_at,
+        })
+
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid answers for questions {', '.join(invalid)}",
+        )
+
+    return rows
+
+
+def answers_digest(rows: list) -> str:
+    """Fingerprint of a validated answer set, used to spot resubmissions."""
+    return hashlib.sha256(
+        "".join(row["answer"] for row in rows).encode("ascii")).hexdigest()
+
+
+def find_duplicate_submission(
+    db: Session,
+    user_id: int,
+    level: int,
+    idempotency_key: Optional[str],
+    digest: str,
+) -> Optional[AssessmentSubmission]:
+    """
+    Find the earlier submission a request is a retry of: the same
+    Idempotency-Key or, without a key, the same answers as the latest
+    attempt at this level.
+    """
+    if idempotency_key:
+        submission = db.query(AssessmentSubmission).filter(
+            AssessmentSubmission.user_id == user_id,
+            AssessmentSubmission.idempotency_key == idempotency_key,
+        ).first()
+        if submission and submission.level != level:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Idempotency-Key was already used for another level",
+            )
+        return submission
+
+    latest = db.query(AssessmentSubmission).filter(
+        AssessmentSubmission.user_id == user_id,
+        AssessmentSubmission.level == level,
+    ).order_by(AssessmentSubmission.attempt.desc()).first()
+
+    if latest and latest.answers_digest == digest:
+        return latest
+    return None
+
+
+def next_attempt(db: Session, user_id: int, level: int) -> int:
+    """Next attempt number for a user's level."""
+    latest = db.query(func.max(AssessmentSubmission.attempt)).filter(
+        AssessmentSubmission.user_id == user_id,
+        AssessmentSubmission.level == level,
+    ).scalar()
+    return (latest or 0) + 1
+
+
+def submission_response(submission: AssessmentSubmission, duplicate: bool = False) -> dict:
+    """Response body for an accepted (or replayed) submission."""
+    return {
+        "message": f"Level {submission.level} assessment submitted successfully",
+        "level": submission.level,
+        "status": "completed",
+        "attempt": submission.attempt,
+        "duplicate": duplicate,
+    }
+
+
+def store_submission(
+    db: Session,
+    user_id: int,
+    level: int,
+    rows: list,
+    idempotency_key: Optional[str],
+    digest: str,
+) -> Tuple[dict, bool]:
+    """
+    Write one submission and its answers in a single transaction.
+    Returns (response, duplicate); a retry replays the original response.
+    """
+    duplicate = find_duplicate_submission(
+        db, user_id, level, idempotency_key, digest)
+    if duplicate:
+        return submission_response(duplicate, duplicate=True), True
+
+    try:
+        submission = AssessmentSubmission(
+            user_id=user_id,
+            level=level,
+            attempt=next_attempt(db, user_id, level),
+            idempotency_key=idempotency_key,
+            answers_digest=digest,
+        )
+        db.add(submission)
+        db.flush()
+
+        for row in rows:
+            row["attempt"] = submission.attempt
+
+        # Single executemany instead of one ORM unit-of-work per answer
+        db.execute(insert(AssessmentResult), rows)
+        apply_submission_to_snapshot(db, user_id, level, rows)
+        db.commit()
+        return submission_response(submission), False
+
+    except IntegrityError:
+        # A concurrent retry claimed this attempt first; replay its result
+        db.rollback()
+        duplicate = find_duplicate_submission(
+            db, user_id, level, idempotency_key, digest)
+        if duplicate:
+            return submission_response(duplicate, duplicate=True), True
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Concurrent submission for this level, please retry",
+        )
+    except Exception:
+        db.rollback()
+        raise
 
-    for domain in LIFE_DOMAINS:
-        results = db.query(AssessmentResult).filter(
-            AssessmentResult.user_id == user_id,
-            AssessmentResult.domain == domain,
-        ).all()
 
-        cumulative_score = sum([POINT_VALUES.get(r.answer, 0)
-                               for r in results])
-        domain_scores[domain] = cumulative_score
+def load_progress(db: Session, user_id: int) -> Tuple[dict, set]:
+    """Answer counts per level and the unlocked levels for one user."""
+    # One grouped count plus one (cached) entitlement lookup
+    level_counts = count_answers_by_level(db, user_id)
+    return level_counts, FREE_LEVELS | get_unlocked_levels(db, user_id)
 
-    return domain_scores
+
+def build_level_progress(level_counts: dict, unlocked_levels, is_admin: bool) -> dict:
+    """Build the per-level progress response from answer counts."""
+    progress = {}
+    for level in LEVEL_PRICES:
+        answered = level_counts.get(level, 0)
+        progress[f"level_{level}"] = {
+            "level": level,
+            "completed": answered == QUESTIONS_PER_LEVEL,
+            "questions_answered": answered,
+            "unlocked": level in unlocked_levels or is_admin,
+            "price": LEVEL_PRICES[level],
+        }
+    return progress
 
 
-def check_level_access(db: Session, user_id: int, level: int) -> bool:
+def render_question_payload(level: int, language: Optional[str] = None) -> dict:
     """
-    Check if user has paid for and unlocked a level.
+    Build the questions response for a level. With a language, each
+    question carries only its domain and the text in that language.
     """
-    if level == 1:
-        return True
+    questions = ASSESSMENT_QUESTIONS[level]
 
-    payment = db.query(PaymentLog).filter(
-        PaymentLog.user_id == user_id,
-        PaymentLog.service_type == f"level_{level}",
-        PaymentLog.status == "completed",
-    ).first()
+    if language and language != "en":
+        questions = [
+            {"domain": q["domain"],
+             "question": q.get(f"question_{language}") or q["question"]}
+            for q in questions
+        ]
+    elif language == "en":
+        questions = [
+            {"domain": q["domain"], "question": q["question"]}
+            for q in questions
+        ]
 
-    return payment is not None
+    return {
+        "level": level,
+        "total_questions": len(questions),
+        "questions": questions,
+    }
+
+
+def build_question_payloads() -> dict:
+    """
+    Pre-serialize every (level, language) question set to JSON bytes with a
+    strong ETag. Key language None is the full multi-language payload.
+    """
+    payloads = {}
+    for level in ASSESSMENT_QUESTIONS:
+        for language in (None,) + QUESTION_LANGUAGES:
+            body = json.dumps(
+                render_question_payload(level, language),
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ).encode("utf-8")
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            payloads[(level, language)] = (body, etag)
+    return payloads
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+# Static question data is rendered once per process
+QUESTION_PAYLOADS = build_question_payloads()
 
 
 # ====== ASSESSMENT ENDPOINTS ======
@@ -97,17 +319,21 @@ def check_level_access(db: Session, user_id: int, level: int) -> bool:
 @router.get("/questions/{level}")
 async def get_assessment_questions(
     level: int,
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    lang: Optional[str] = Query(None, pattern="^(en|de|fr)$"),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
     Get the 12 assessment questions for a given level (AS-01).
+    Pass ?lang=en|de|fr for a single-language payload. Responses carry an
+    ETag; a matching If-None-Match returns 304 Not Modified.
     """
     logger.info(
         f"Assessment questions requested: Level {level} by user {current_user.id}")
 
     is_admin = current_user.role == "admin" or current_user.role == "ADMIN"
-    has_access = check_level_access(db, current_user.id, level)
+    has_access = await run_db(db, check_level_access, current_user.id, level)
 
     if not is_admin and not has_access:
         raise HTTPException(
@@ -121,30 +347,33 @@ async def get_assessment_questions(
             detail="Invalid level",
         )
 
-    questions = ASSESSMENT_QUESTIONS[level]
+    body, etag = QUESTION_PAYLOADS[(level, lang)]
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
 
-    return {
-        "level": level,
-        "total_questions": len(questions),
-        "questions": questions,
-    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.post("/submit/{level}")
 async def submit_assessment_answers(
     level: int,
     body: AnswersBody,
-    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
     Submit assessment answers for a level (AS-02).
+    Retries (same Idempotency-Key header, or identical answers to the
+    latest attempt) return the original submission without writing.
     """
     logger.info(
         f"Assessment submission: Level {level} by user {current_user.id}")
 
     is_admin = current_user.role == "admin" or current_user.role == "ADMIN"
-    has_access = check_level_access(db, current_user.id, level)
+    has_access = await run_db(db, check_level_access, current_user.id, level)
 
     if not is_admin and not has_access:
         raise HTTPException(
@@ -158,62 +387,31 @@ async def submit_assessment_answers(
             detail="Invalid level",
         )
 
-    try:
-        user_answers = body.answers
-        questions = ASSESSMENT_QUESTIONS[level]
-
-        if len(user_answers) != 12:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Expected 12 answers, got {len(user_answers)}",
-            )
-
-        for idx, question in enumerate(questions):
-            domain = question["domain"]
-            answer = user_answers.get(str(idx), "").upper()
-
-            if answer not in ["A", "B", "C", "D"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Invalid answer for question {idx}: {answer}",
-                )
-
-            points = POINT_VALUES[answer]
-
-            result = AssessmentResult(
-                user_id=current_user.id,
-                level=level,
-                domain=domain,
-                domain_score=points,
-                answer=answer,
-                question_text=question["question"],
-                completed_at=datetime.utcnow(),
-            )
-
-            db.add(result)
+    rows = build_answer_rows(current_user.id, level, body.answers)
+    digest = answers_digest(rows)
 
-        tracking = UserTracking(
-            user_id=current_user.id,
-            event_type="assessment_completed",
-            event_data={"level": level,
-                        "timestamp": datetime.utcnow().isoformat()},
-        )
-        db.add(tracking)
+    try:
+        response, duplicate = await run_db(
+            db, store_submission, current_user.id, level, rows, idempotency_key, digest)
+        if duplicate:
+            logger.info(
+                f"Duplicate assessment submission ignored: Level {level}, User {current_user.id}")
+            return response
 
-        db.commit()
         logger.info(
             f"Assessment answers stored: Level {level}, User {current_user.id}")
 
-        return {
-            "message": f"Level {level} assessment submitted successfully",
+        track_event(current_user.id, "assessment_completed", {
             "level": level,
-            "status": "completed",
-        }
+            "attempt": response["attempt"],
+            "timestamp": datetime.utcnow().isoformat(),
+        })
+
+        return response
 
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
         logger.error(f"Error submitting assessment: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -223,7 +421,7 @@ async def submit_assessment_answers(
 
 @router.get("/report")
 async def get_assessment_report(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -232,13 +430,8 @@ async def get_assessment_report(
     logger.info(f"Assessment report requested by user {current_user.id}")
 
     try:
-        completed_levels = set()
-        results = db.query(AssessmentResult).filter(
-            AssessmentResult.user_id == current_user.id,
-        ).all()
-
-        for result in results:
-            completed_levels.add(result.level)
+        summary = await run_db(db, get_user_scores, current_user.id)
+        completed_levels = summary["completed_levels"]
 
         if not completed_levels:
             raise HTTPException(
@@ -246,8 +439,8 @@ async def get_assessment_report(
                 detail="No assessment data found. Please complete an assessment."
             )
 
-        domain_scores = calculate_cumulative_domain_scores(db, current_user.id)
-        overall_score = sum(domain_scores.values())
+        domain_scores = summary["domain_scores"]
+        overall_score = summary["overall_score"]
         overall_stage = get_overall_stage(overall_score)
 
         domain_feedback = {}
@@ -271,7 +464,7 @@ async def get_assessment_report(
         report = {
             "user_id": current_user.id,
             "report_generated_at": datetime.utcnow().isoformat(),
-            "completed_levels": sorted(list(completed_levels)),
+            "completed_levels": completed_levels,
             "overall_score": overall_score,
             "overall_stage": {
                 "stage": overall_stage["label"],
@@ -310,33 +503,18 @@ async def get_assessment_report(
 
 @router.get("/progress")
 async def get_assessment_progress(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get user's assessment progress across all levels."""
     logger.info(f"Assessment progress requested by user {current_user.id}")
 
     try:
-        progress = {}
-
-        for level in [1, 2, 3]:
-            level_results = db.query(AssessmentResult).filter(
-                AssessmentResult.user_id == current_user.id,
-                AssessmentResult.level == level,
-            ).all()
-
-            completed = len(level_results) == 12
-            progress[f"level_{level}"] = {
-                "level": level,
-                "completed": completed,
-                "questions_answered": len(level_results),
-                "unlocked": (check_level_access(db, current_user.id, level) or
-                             current_user.role == "admin" or
-                             current_user.role == "ADMIN"),
-                "price": LEVEL_PRICES[level],
-            }
+        level_counts, unlocked_levels = await run_db(
+            db, load_progress, current_user.id)
+        is_admin = current_user.role == "admin" or current_user.role == "ADMIN"
 
-        return progress
+        return build_level_progress(level_counts, unlocked_levels, is_admin)
 
     except Exception as e:
         logger.error(f"Error fetching progress: {e}")
@@ -348,12 +526,21 @@ async def get_assessment_progress(
 
 @router.get("/history", response_model=List[AssessmentResultResponse])
 async def get_assessment_history(
+    response: Response,
     level: Optional[int] = None,
     domain: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    """Get user's full assessment history with optional filters."""
+    """
+    Get user's assessment history with optional filters.
+    Pages are keyed on (completed_at, id): pass the X-Next-Cursor header
+    value back as ?cursor= for the next page. format=ndjson streams every
+    row after the cursor instead of returning one page.
+    """
     logger.info(f"Assessment history requested by user {current_user.id}")
 
     try:
@@ -367,10 +554,17 @@ async def get_assessment_history(
         if domain:
             query = query.filter(AssessmentResult.domain == domain)
 
-        results = query.order_by(AssessmentResult.completed_at).all()
+        if format == "ndjson":
+            return stream_results_ndjson(query, cursor)
+
+        results, next_cursor = fetch_results_page(query, cursor, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
         return [AssessmentResultResponse.model_validate(r) for r in results]
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching history: {e}")
         raise HTTPException(
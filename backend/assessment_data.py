@@ -16,6 +16,9 @@ LIFE_DOMAINS = [
     "Spirituality"
 ]
 
+# --- From "Scoring Scale -Project1 V1.0.pdf" ---
+POINT_VALUES = {"A": 4, "B": 3, "C": 2, "D": 1}
+
 # --- From "Level 1,2,3 - Integrated questions.pdf" ---
 # Added question_de and question_fr keys
 ASSESSMENT_QUESTIONS = {
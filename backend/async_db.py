@@ -0,0 +1,158 @@
+# async_db.py
+
+from sqlalchemy.orm import Session
+from typing import Callable, TypeVar
+import logging
+import os
+
+from database import DATABASE_URL
+from db_pool import pool_options, configure_engine, pool_stats
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# DB_ASYNC=true runs the hot routes' database work in an AsyncSession
+# (asyncpg for Postgres, aiosqlite for the SQLite fallback), so it no
+# longer blocks the event loop. Off by default, which leaves those routes
+# on the get_db session exactly as before; the benchmark below has not yet
+# shown a throughput gain for the async path.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its asyncio counterpart."""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+def create_async_session_factory(url: str = DATABASE_URL):
+    """Async engine and session factory, or None if the driver is missing."""
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        async_url = async_database_url(url)
+        async_engine = create_async_engine(
+            async_url, **pool_options(async_url, is_async=True))
+    except ImportError as e:
+        logger.warning(f"DB_ASYNC set but async driver unavailable ({e}); using sync sessions")
+        return None
+    configure_engine(async_engine.sync_engine)
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+AsyncSessionLocal = create_async_session_factory() if DB_ASYNC else None
+
+
+def async_pool_stats():
+    """Pool telemetry for the async engine, or None when it is off."""
+    if AsyncSessionLocal is None:
+        return None
+    return pool_stats(AsyncSessionLocal.kw["bind"].sync_engine)
+
+
+async def dispose_async_engine() -> None:
+    """Close the async engine's pooled connections (call on shutdown)."""
+    if AsyncSessionLocal is not None:
+        await AsyncSessionLocal.kw["bind"].dispose()
+
+
+# ====== RUNNER ======
+
+async def run_db(db: Session, fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a unit of ORM work for a route that depends on get_db. fn receives
+    a sync Session first, so the existing query helpers work unchanged.
+    By default it runs on db, inline as before. With DB_ASYNC it runs in
+    an AsyncSession through run_sync instead, and db is never used (it
+    only checks out a connection on first use).
+    """
+    if AsyncSessionLocal is None:
+        return fn(db, *args, **kwargs)
+    async with AsyncSessionLocal() as session:
+        return await session.run_sync(fn, *args, **kwargs)
+
+
+# ====== BENCHMARK ======
+
+async def benchmark(requests: int = 200, concurrency: int = 50) -> None:
+    """
+    Run `requests` progress queries `concurrency` at a time, once inline on
+    the event loop (the default path) and once in an AsyncSession (the
+    DB_ASYNC path). Prints throughput, p95 request latency and the worst
+    event-loop stall seen by a 1 ms heartbeat. Point DATABASE_URL at the
+    database to measure.
+    """
+    import asyncio
+    import time
+    from database import SessionLocal
+    from scoring import count_answers_by_level
+
+    # Measured whether or not DB_ASYNC is set for the app
+    async_sessions = AsyncSessionLocal or create_async_session_factory()
+    if async_sessions is None:
+        print("No async driver installed for this database; nothing to compare")
+        return
+
+    async def heartbeat(stop: asyncio.Event, lag: list) -> None:
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag[0] = max(lag[0], time.perf_counter() - started - 0.001)
+
+    async def inline(user_id: int) -> None:
+        # Yield once, as a request would while its body is read, then run
+        # the query on the loop thread like the default route path does
+        await asyncio.sleep(0)
+        db = SessionLocal()
+        try:
+            count_answers_by_level(db, user_id)
+        finally:
+            db.close()
+
+    async def in_async_session(user_id: int) -> None:
+        async with async_sessions() as session:
+            await session.run_sync(count_answers_by_level, user_id)
+
+    async def measure(name: str, handler) -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(i % 100 + 1)
+                latencies.append(time.perf_counter() - started)
+
+        latencies = []
+        stop, lag = asyncio.Event(), [0.0]
+        beat = asyncio.create_task(heartbeat(stop, lag))
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await beat
+        p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+        print(f"{name:>8}: {requests / elapsed:8.1f} req/s, "
+              f"p95 {p95 * 1000:.1f} ms, max loop stall {lag[0] * 1000:.1f} ms")
+
+    print(f"{DATABASE_URL.split('://')[0]} requests={requests} "
+          f"concurrency={concurrency}")
+    await measure("inline", inline)
+    await measure("async", in_async_session)
+    # aiosqlite connections hold non-daemon threads that block exit
+    await async_sessions.kw["bind"].dispose()
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(benchmark(*(int(arg) for arg in sys.argv[1:3])))
@@ -1,6 +1,5 @@
 # auth.py
 
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Optional, Tuple
 import jwt
@@ -9,29 +8,59 @@ from sqlalchemy.orm import Session
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 import secrets
+import hashlib
 import logging
+import time
 
 # --- FIX 1: Cleaned up Imports ---
 
 # Import DB Tables (SQLAlchemy) and get_db
-from database import User, PasswordReset, ConsentLog, RoleEnum, get_db
+from database import User, PasswordReset, ConsentLog, RoleEnum, RefreshToken, get_db
+from cache import TTLCache
+from user_cache import user_cache
 
 # Import Pydantic Schemas this file *actually uses* from models.py
 from models import TokenPayload, UserCreate
+from hashing import (
+    hash_password,
+    verify_and_update,
+    hash_password_async,
+    verify_and_update_async,
+)
 
 # --- End of Fix ---
 
 logger = logging.getLogger(__name__)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-
 # JWT Configuration
 SECRET_KEY = os.getenv(
     "SECRET_KEY", "your-super-secret-key-change-in-production")
 ALGORITHM = "HS256"
+# Access tokens are short-lived and checked from claims only; clients
+# renew them with a refresh token
 ACCESS_TOKEN_EXPIRE_MINUTES = int(
-    os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))  # 24 hours
+    os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# Browser tabs share one refresh token and refresh together when the access
+# token expires; a token rotated this recently whose successor is unused is
+# refused without being treated as reuse
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "30"))
+
+# user_id -> (token_version, is_active). Each worker holds its own copy, so
+# a suspension or revocation made on another worker applies within the TTL.
+_token_state_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_STATE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_STATE_CACHE_TTL_SECONDS", "30")),
+    name="token_state",
+)
+
+# sha256(token) -> validated TokenPayload, kept until the token's exp so
+# repeated requests with the same bearer token skip HMAC and validation.
+_verified_token_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "20000")),
+    ttl=float(ACCESS_TOKEN_EXPIRE_MINUTES * 60),
+    name="verified_tokens",
+)
 
 
 class AuthService:
@@ -40,16 +69,13 @@ class AuthService:
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash password using Argon2."""
-        return pwd_context.hash(password)
+        return hash_password(password)
 
     @staticmethod
     def verify_password(plain_password: str, password_hash: str) -> bool:
         """Verify password against hash."""
-        try:
-            return pwd_context.verify(plain_password, password_hash)
-        except Exception as e:
-            logger.error(f"Password verification error: {e}")
-            return False
+        valid, _ = verify_and_update(plain_password, password_hash)
+        return valid
 
     @staticmethod
     def create_access_token(user: User, expires_delta: Optional[timedelta] = None) -> Tuple[str, datetime]:
@@ -63,6 +89,7 @@ class AuthService:
             "sub": user.id,
             "email": user.email,
             "role": user.role.value,
+            "ver": user.token_version or 0,
             "iat": datetime.utcnow(),
             "exp": expire,
         }
@@ -72,11 +99,16 @@ class AuthService:
 
     @staticmethod
     def verify_token(token: str) -> Optional[TokenPayload]:
-        """Verify and decode JWT token."""
+        """Verify and decode JWT token, reusing earlier verifications."""
+        cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+        cached = _verified_token_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             # --- FIX 2: Use .model_validate() for Pydantic v2 ---
-            return TokenPayload.model_validate(payload)
+            token_payload = TokenPayload.model_validate(payload)
         except jwt.ExpiredSignatureError:
             logger.warning("Token expired")
             return None
@@ -84,27 +116,123 @@ class AuthService:
             logger.warning(f"Invalid token: {e}")
             return None
 
+        remaining = token_payload.exp.timestamp() - time.time()
+        if remaining > 0:
+            _verified_token_cache.set(cache_key, token_payload, ttl=remaining)
+        return token_payload
+
     @staticmethod
-    def create_user(db: Session, user_data: UserCreate) -> Tuple[Optional[User], Optional[str]]:
-        """
-        Create a new user with consent logging (UM-02 compliance).
-        Returns: (User, None) on success, (None, error_message) on failure.
-        """
+    def registration_error(db: Session, user_data: UserCreate) -> Optional[str]:
+        """Return why user_data cannot register, or None."""
         # Check consent flags
         if not (user_data.terms_accepted and user_data.privacy_accepted and user_data.consent_accepted):
-            return None, "You must accept Terms, Privacy Policy, and Data Consent to register."
+            return "You must accept Terms, Privacy Policy, and Data Consent to register."
 
         # Check if user exists
         existing_user = db.query(User).filter(
             User.email == user_data.email).first()
         if existing_user:
-            return None, "Email already registered."
+            return "Email already registered."
+
+        return None
+
+    @staticmethod
+    def issue_refresh_token(db: Session, user: User, family_id: Optional[str] = None) -> Tuple[str, datetime]:
+        """
+        Create and store a refresh token, starting a new family unless one
+        is given. Only the token's hash is stored. Returns (token, expires_at).
+        """
+        token = secrets.token_urlsafe(48)
+        expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+        db.add(RefreshToken(
+            user_id=user.id,
+            family_id=family_id or secrets.token_hex(16),
+            token_hash=hash_refresh_token(token),
+            token_version=user.token_version or 0,
+            expires_at=expires_at,
+        ))
+        db.commit()
+        return token, expires_at
+
+    @staticmethod
+    def rotate_refresh_token(db: Session, token: str) -> Tuple[Optional[User], Optional[str], Optional[str]]:
+        """
+        Exchange a refresh token for a new one in the same family.
+        Presenting an already-rotated token revokes the whole family, unless
+        it was rotated within REFRESH_REUSE_GRACE_SECONDS and its successor
+        is still unused (another tab refreshing at the same time).
+        Returns: (User, new_token, None) or (None, None, error_message).
+        """
+        record = db.query(RefreshToken).filter(
+            RefreshToken.token_hash == hash_refresh_token(token),
+        ).first()
+
+        if not record or record.revoked_at:
+            return None, None, "Invalid refresh token."
+
+        # Claimed with a conditional update rather than from the row just
+        # read: of two concurrent refreshes with one token only the first
+        # matches, and the other is handled as reuse
+        claimed = db.query(RefreshToken).filter(
+            RefreshToken.id == record.id,
+            RefreshToken.used_at == None,
+            RefreshToken.revoked_at == None,
+        ).update({RefreshToken.used_at: datetime.utcnow()}, synchronize_session=False)
+        if not claimed:
+            if is_concurrent_rotation(db, record):
+                return None, None, "Refresh token was already rotated."
+            logger.warning(
+                f"Refresh token reuse detected for user {record.user_id}, revoking family")
+            revoke_refresh_family(db, record.family_id)
+            db.commit()
+            return None, None, "Invalid refresh token."
+
+        if record.expires_at < datetime.utcnow():
+            return None, None, "Refresh token has expired."
+
+        # The one full user lookup of the session happens here
+        user = AuthService.get_user_by_id(db, record.user_id)
+        if not user or not user.is_active or (user.token_version or 0) != record.token_version:
+            revoke_refresh_family(db, record.family_id)
+            db.commit()
+            return None, None, "Invalid refresh token."
+
+        new_token, _ = AuthService.issue_refresh_token(
+            db, user, family_id=record.family_id)
+        return user, new_token, None
+
+    @staticmethod
+    def revoke_refresh_token(db: Session, token: str) -> None:
+        """Revoke the family a refresh token belongs to (logout)."""
+        record = db.query(RefreshToken).filter(
+            RefreshToken.token_hash == hash_refresh_token(token),
+        ).first()
+        if record:
+            revoke_refresh_family(db, record.family_id)
+            db.commit()
+
+    @staticmethod
+    def create_user(
+        db: Session,
+        user_data: UserCreate,
+        password_hash: Optional[str] = None,
+    ) -> Tuple[Optional[User], Optional[str]]:
+        """
+        Create a new user with consent logging (UM-02 compliance).
+        Pass password_hash when it was already computed off the event loop.
+        Returns: (User, None) on success, (None, error_message) on failure.
+        """
+        error = AuthService.registration_error(db, user_data)
+        if error:
+            return None, error
 
         try:
             # Create user
             new_user = User(
                 email=user_data.email,
-                password_hash=AuthService.hash_password(user_data.password),
+                password_hash=password_hash or AuthService.hash_password(
+                    user_data.password),
                 first_name=user_data.first_name,
                 last_name=user_data.last_name,
                 age=user_data.age,
@@ -142,11 +270,18 @@ class AuthService:
             return None, "Registration failed. Please try again."
 
     @staticmethod
-    def authenticate_user(db: Session, email: str, password: str) -> Tuple[Optional[User], Optional[str]]:
-        """
-        Authenticate user with email and password.
-        Returns: (User, None) on success, (None, error_message) on failure.
-        """
+    async def create_user_async(db: Session, user_data: UserCreate) -> Tuple[Optional[User], Optional[str]]:
+        """create_user with the password hashed on the hashing pool."""
+        error = AuthService.registration_error(db, user_data)
+        if error:
+            return None, error
+
+        password_hash = await hash_password_async(user_data.password)
+        return AuthService.create_user(db, user_data, password_hash=password_hash)
+
+    @staticmethod
+    def login_candidate(db: Session, email: str) -> Tuple[Optional[User], Optional[str]]:
+        """Find the active user a login attempt refers to."""
         user = db.query(User).filter(User.email == email).first()
 
         if not user:
@@ -156,17 +291,52 @@ class AuthService:
         if not user.is_active:
             return None, "User account is inactive."
 
-        if not AuthService.verify_password(password, user.password_hash):
-            logger.warning(f"Failed login attempt for user: {email}")
-            return None, "Invalid email or password."
+        return user, None
 
-        # Update last login
+    @staticmethod
+    def record_login(db: Session, user: User, new_hash: Optional[str] = None) -> None:
+        """Update last login, upgrading the stored hash if its profile is outdated."""
         try:
+            if new_hash:
+                user.password_hash = new_hash
             user.last_login = datetime.utcnow()
             db.commit()
+            user_cache.invalidate(user.id)
         except Exception as e:
+            db.rollback()
             logger.error(f"Error updating last login: {e}")
 
+    @staticmethod
+    def authenticate_user(db: Session, email: str, password: str) -> Tuple[Optional[User], Optional[str]]:
+        """
+        Authenticate user with email and password.
+        Returns: (User, None) on success, (None, error_message) on failure.
+        """
+        user, error = AuthService.login_candidate(db, email)
+        if error:
+            return None, error
+
+        valid, new_hash = verify_and_update(password, user.password_hash)
+        if not valid:
+            logger.warning(f"Failed login attempt for user: {email}")
+            return None, "Invalid email or password."
+
+        AuthService.record_login(db, user, new_hash)
+        return user, None
+
+    @staticmethod
+    async def authenticate_user_async(db: Session, email: str, password: str) -> Tuple[Optional[User], Optional[str]]:
+        """authenticate_user with verification on the hashing pool."""
+        user, error = AuthService.login_candidate(db, email)
+        if error:
+            return None, error
+
+        valid, new_hash = await verify_and_update_async(password, user.password_hash)
+        if not valid:
+            logger.warning(f"Failed login attempt for user: {email}")
+            return None, "Invalid email or password."
+
+        AuthService.record_login(db, user, new_hash)
         return user, None
 
     @staticmethod
@@ -193,33 +363,40 @@ class AuthService:
             return None
 
     @staticmethod
-    def reset_password(db: Session, token: str, new_password: str) -> Tuple[bool, str]:
+    def reset_target(db: Session, token: str) -> Tuple[Optional[PasswordReset], Optional[User], Optional[str]]:
         """
-        Reset password using token.
-        Returns: (success, message)
+        Look up the reset record and user for a token.
+        Returns: (PasswordReset, User, None) or (None, None, error_message).
         """
-        try:
-            reset_record = db.query(PasswordReset).filter(
-                PasswordReset.token == token,
-                PasswordReset.used_at == None,
-            ).first()
+        reset_record = db.query(PasswordReset).filter(
+            PasswordReset.token == token,
+            PasswordReset.used_at == None,
+        ).first()
 
-            if not reset_record:
-                return False, "Invalid or expired reset token."
+        if not reset_record:
+            return None, None, "Invalid or expired reset token."
 
-            if reset_record.expires_at < datetime.utcnow():
-                return False, "Reset token has expired."
+        if reset_record.expires_at < datetime.utcnow():
+            return None, None, "Reset token has expired."
 
-            user = db.query(User).filter(
-                User.id == reset_record.user_id).first()
-            if not user:
-                return False, "User not found."
+        user = db.query(User).filter(
+            User.id == reset_record.user_id).first()
+        if not user:
+            return None, None, "User not found."
 
-            # Update password
-            user.password_hash = AuthService.hash_password(new_password)
+        return reset_record, user, None
+
+    @staticmethod
+    def apply_password_reset(db: Session, reset_record: PasswordReset, user: User, password_hash: str) -> Tuple[bool, str]:
+        """Store the new hash and mark the token used."""
+        try:
+            user.password_hash = password_hash
             reset_record.used_at = datetime.utcnow()
+            revoke_user_tokens(user)
 
             db.commit()
+            invalidate_token_state(user.id)
+            user_cache.invalidate(user.id)
             logger.info(f"Password reset successful for user: {user.email}")
             return True, "Password reset successful."
 
@@ -228,6 +405,29 @@ class AuthService:
             db.rollback()
             return False, "Password reset failed."
 
+    @staticmethod
+    def reset_password(db: Session, token: str, new_password: str) -> Tuple[bool, str]:
+        """
+        Reset password using token.
+        Returns: (success, message)
+        """
+        reset_record, user, error = AuthService.reset_target(db, token)
+        if error:
+            return False, error
+
+        return AuthService.apply_password_reset(
+            db, reset_record, user, AuthService.hash_password(new_password))
+
+    @staticmethod
+    async def reset_password_async(db: Session, token: str, new_password: str) -> Tuple[bool, str]:
+        """reset_password with the new password hashed on the hashing pool."""
+        reset_record, user, error = AuthService.reset_target(db, token)
+        if error:
+            return False, error
+
+        password_hash = await hash_password_async(new_password)
+        return AuthService.apply_password_reset(db, reset_record, user, password_hash)
+
     @staticmethod
     def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
         """Get user by ID."""
@@ -238,17 +438,126 @@ class AuthService:
         """Get user by email."""
         return db.query(User).filter(User.email == email).first()
 
+# ====== REFRESH TOKENS ======
+
+
+def hash_refresh_token(token: str) -> str:
+    """Refresh tokens are random 384-bit strings, so SHA-256 suffices at rest."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def revoke_refresh_family(db: Session, family_id: str) -> None:
+    """Revoke every live token in a family. The caller commits."""
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at == None,
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def is_concurrent_rotation(db: Session, record: RefreshToken) -> bool:
+    """
+    True if a token was rotated within the grace window and the token
+    issued in its place has not been used or revoked since.
+    """
+    used_at = db.query(RefreshToken.used_at).filter(
+        RefreshToken.id == record.id,
+        RefreshToken.revoked_at == None,
+    ).scalar()
+    if used_at is None or datetime.utcnow() - used_at > timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS):
+        return False
+
+    successor = db.query(RefreshToken.used_at, RefreshToken.revoked_at).filter(
+        RefreshToken.family_id == record.family_id,
+        RefreshToken.id > record.id,
+    ).order_by(RefreshToken.id).first()
+    return successor is not None and successor.used_at is None and successor.revoked_at is None
+
+
+# ====== TOKEN STATE ======
+
+
+def get_token_state(db: Session, user_id: int) -> Optional[Tuple[int, bool]]:
+    """(token_version, is_active) for a user, from cache when possible."""
+    state = _token_state_cache.get(user_id)
+    if state is None:
+        row = db.query(User.token_version, User.is_active).filter(
+            User.id == user_id).first()
+        if row is None:
+            return None
+        state = (row.token_version or 0, row.is_active)
+        _token_state_cache.set(user_id, state)
+    return state
+
+
+def token_cache_stats() -> dict:
+    """Verified-token and token-state cache counters for monitoring."""
+    return {
+        "verified_tokens": _verified_token_cache.stats(),
+        "token_state": _token_state_cache.stats(),
+    }
+
+
+def invalidate_token_state(user_id: int) -> None:
+    """Drop a user's cached token state after it changed."""
+    _token_state_cache.delete(user_id)
+
+
+def revoke_user_tokens(user: User) -> None:
+    """
+    Invalidate every token issued to a user so far. The caller commits and
+    then calls invalidate_token_state(user.id).
+    """
+    user.token_version = (user.token_version or 0) + 1
+
+
+class Principal:
+    """
+    Authenticated caller built from verified token claims. id, email and
+    role come straight from the token; the full User row is only loaded
+    when a handler touches .user or any other attribute.
+    """
+
+    def __init__(self, payload: TokenPayload, db: Session):
+        self.id = payload.sub
+        self.email = payload.email
+        self.role = payload.role
+        self.token_version = payload.ver
+        self._db = db
+        self._user: Optional[User] = None
+
+    @property
+    def user(self) -> User:
+        if self._user is None:
+            user = AuthService.get_user_by_id(self._db, self.id)
+            if not user:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found",
+                )
+            self._user = user
+        return self._user
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set above
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+
 # --- Dependencies ---
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
-async def get_current_user(
+async def get_current_principal(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> User:
-
+) -> Principal:
+    """
+    Authenticate from token claims, checking only the cached token version
+    and active flag instead of loading the user.
+    """
     token_payload = AuthService.verify_token(token)
     if not token_payload:
         raise HTTPException(
@@ -256,21 +565,40 @@ async def get_current_user(
             detail="Invalid or expired token",
         )
 
-    user = AuthService.get_user_by_id(db, token_payload.sub)
-    if not user:
+    state = get_token_state(db, token_payload.sub)
+    if state is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-    return user
 
+    token_version, is_active = state
+    if token_payload.ver != token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+        )
+    if not is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User account is inactive",
+        )
 
-async def admin_required(
-    current_user: User = Depends(get_current_user),
+    return Principal(token_payload, db)
+
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
 ) -> User:
+    """Full User row, for handlers that read or modify profile fields."""
+    return principal.user
+
+
+async def admin_required(
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
     """
     Dependency to ensure user is an admin.
-    Must be used after get_current_user.
     """
     if current_user.role != RoleEnum.ADMIN:
         logger.warning(
@@ -283,8 +611,8 @@ async def admin_required(
 
 
 async def coach_required(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
     """
     Dependency to ensure user is a coach.
     """
@@ -0,0 +1,180 @@
+# badges.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import logging
+import threading
+
+from database import Badge, UserBadge, DailyPractice, Streak
+from models import BadgeResponse
+
+logger = logging.getLogger(__name__)
+
+# Badge catalog, synced into the badges table on first use. criteria_type
+# names a counter from BADGE_COUNTERS below; a badge is earned once that
+# counter reaches criteria_value. New criteria need only a catalog entry
+# here (and a counter if none fits).
+BADGES_CONFIG = [
+    {"name": "First Step", "criteria_type": "sessions", "criteria_value": 1,
+        "description": "Complete your first practice session"},
+    {"name": "Week Warrior", "criteria_type": "streak", "criteria_value": 7,
+        "description": "Maintain a 7-day practice streak"},
+    {"name": "Month Master", "criteria_type": "streak", "criteria_value": 30,
+        "description": "Maintain a 30-day practice streak"},
+    {"name": "Century", "criteria_type": "sessions", "criteria_value": 100,
+        "description": "Complete 100 practice sessions"},
+    {"name": "Meditation Monk", "criteria_type": "sessions_meditation",
+        "criteria_value": 50, "description": "Complete 50 meditation sessions"},
+    {"name": "Yoga Yogi", "criteria_type": "sessions_yoga",
+        "criteria_value": 50, "description": "Complete 50 yoga sessions"},
+    {"name": "NLP Navigator", "criteria_type": "sessions_nlp",
+        "criteria_value": 50, "description": "Complete 50 NLP sessions"},
+]
+
+
+# ====== COUNTERS ======
+
+def practice_counters(db: Session, user_id: int) -> Dict[str, int]:
+    """
+    sessions, minutes and sessions_<practice_type> for every type, from
+    one grouped aggregate over daily_practice.
+    """
+    counters = {"sessions": 0, "minutes": 0}
+    grouped = db.query(
+        DailyPractice.practice_type,
+        func.count(DailyPractice.id),
+        func.coalesce(func.sum(DailyPractice.duration_minutes), 0),
+    ).filter(
+        DailyPractice.user_id == user_id,
+    ).group_by(DailyPractice.practice_type)
+
+    for practice_type, sessions, minutes in grouped:
+        counters[f"sessions_{practice_type}"] = sessions
+        counters["sessions"] += sessions
+        counters["minutes"] += int(minutes)
+    return counters
+
+
+def streak_counters(db: Session, user_id: int) -> Dict[str, int]:
+    """The user's overall current and longest streak."""
+    streak = db.query(Streak.current_streak, Streak.longest_streak).filter(
+        Streak.user_id == user_id,
+        Streak.practice_type == "all",
+    ).first()
+    current, longest = streak or (0, 0)
+    return {"streak": current, "longest_streak": longest}
+
+
+# Loaders run once per evaluation; each returns several counters
+BADGE_COUNTERS: List[Callable[[Session, int], Dict[str, int]]] = [
+    practice_counters,
+    streak_counters,
+]
+
+
+# ====== CATALOG ======
+
+class BadgeCatalog:
+    """Active badges, loaded from the database once per process."""
+
+    def __init__(self, config: List[dict] = BADGES_CONFIG):
+        self.config = config
+        self._badges: Optional[List[BadgeResponse]] = None
+        self._lock = threading.Lock()
+
+    def sync(self, db: Session) -> None:
+        """Insert catalog entries missing from the badges table."""
+        existing = {
+            name for (name,) in db.query(Badge.name).filter(
+                Badge.name.in_([entry["name"] for entry in self.config]))
+        }
+        missing = [entry for entry in self.config if entry["name"] not in existing]
+        if missing:
+            db.execute(insert(Badge), missing)
+            db.commit()
+            logger.info(f"Badge catalog: added {len(missing)} badges")
+
+    def get(self, db: Session) -> List[BadgeResponse]:
+        """Active badges, syncing and loading them on first call."""
+        if self._badges is not None:
+            return self._badges
+        with self._lock:
+            if self._badges is None:
+                self.sync(db)
+                self._badges = [
+                    BadgeResponse(
+                        id=badge.id,
+                        name=badge.name,
+                        description=badge.description,
+                        icon_url=badge.icon_url,
+                        criteria_type=badge.criteria_type,
+                        criteria_value=badge.criteria_value,
+                    )
+                    for badge in db.query(Badge).filter(Badge.is_active == True).order_by(Badge.id)
+                ]
+            return self._badges
+
+    def by_id(self, db: Session) -> Dict[int, BadgeResponse]:
+        return {badge.id: badge for badge in self.get(db)}
+
+    def reload(self) -> None:
+        """Drop the loaded catalog; the next call reads the table again."""
+        with self._lock:
+            self._badges = None
+
+
+badge_catalog = BadgeCatalog()
+
+
+# ====== EVALUATION ======
+
+def earned_badges(catalog: List[BadgeResponse], counters: Dict[str, int], earned_ids) -> List[BadgeResponse]:
+    """Badges whose criteria the counters meet and the user does not hold yet."""
+    return [
+        badge for badge in catalog
+        if badge.id not in earned_ids
+        and counters.get(badge.criteria_type, 0) >= badge.criteria_value
+    ]
+
+
+def award_badges(db: Session, user_id: int) -> List[BadgeResponse]:
+    """
+    Evaluate every active badge for a user and insert the new ones in bulk.
+    Costs one earned-ids query plus one query per counter loader,
+    regardless of how many badges exist. Commits; returns the new badges.
+    """
+    catalog = badge_catalog.get(db)
+    earned_ids = {
+        badge_id for (badge_id,) in db.query(UserBadge.badge_id).filter(
+            UserBadge.user_id == user_id)
+    }
+    if all(badge.id in earned_ids for badge in catalog):
+        return []
+
+    counters = {}
+    for loader in BADGE_COUNTERS:
+        counters.update(loader(db, user_id))
+
+    new_badges = earned_badges(catalog, counters, earned_ids)
+    if not new_badges:
+        return []
+
+    now = datetime.utcnow()
+    try:
+        db.execute(insert(UserBadge), [
+            {"user_id": user_id, "badge_id": badge.id,
+             "earned_value": badge.criteria_value, "earned_at": now}
+            for badge in new_badges
+        ])
+        db.commit()
+    except IntegrityError:
+        # A concurrent log awarded them first
+        db.rollback()
+        return []
+
+    for badge in new_badges:
+        logger.info(f"Badge awarded: {badge.name} to user {user_id}")
+    return new_badges
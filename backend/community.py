@@ -13,7 +13,6 @@ import secrets
 # Import all database TABLES from database.py
 from database import (
     get_db,
-    User,
     ForumCategory,
     ForumThread,
     ForumPost,
@@ -31,7 +30,8 @@ from models import (
     ForumPostResponse,
     ProgressShareResponse,
 )
-from auth import get_current_user
+from auth import get_current_principal, Principal
+from user_cache import user_cache
 
 # --- End of Fix ---
 
@@ -76,7 +76,7 @@ def initialize_categories(db: Session):
 
 @router.get("/categories", response_model=List[ForumCategoryResponse])
 async def get_forum_categories(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get all active forum categories (CS-01)."""
@@ -109,7 +109,7 @@ async def get_forum_categories(
 @router.post("/threads", response_model=ForumThreadResponse, status_code=status.HTTP_201_CREATED)
 async def create_forum_thread(
     thread_data: ForumThreadCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Create a new forum thread (CS-01)."""
@@ -160,7 +160,7 @@ async def get_category_threads(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     sort_by: str = Query("recent", pattern="^(recent|popular|replies)$"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get threads from a category (CS-01)."""
@@ -186,7 +186,7 @@ async def get_category_threads(
 @router.get("/threads/{thread_id}", response_model=ForumThreadResponse)
 async def get_thread(
     thread_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get thread details and increment view count (CS-01)."""
@@ -216,7 +216,7 @@ async def get_thread(
 @router.post("/posts", response_model=ForumPostResponse, status_code=status.HTTP_201_CREATED)
 async def create_forum_post(
     post_data: ForumPostCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Create a new forum post/reply (CS-01)."""
@@ -269,7 +269,7 @@ async def get_thread_posts(
     thread_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get posts for a thread (CS-01)."""
@@ -288,7 +288,7 @@ async def get_thread_posts(
 @router.post("/posts/{post_id}/like")
 async def like_post(
     post_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Like or unlike a post (CS-01)."""
@@ -340,7 +340,7 @@ async def like_post(
 async def share_badge(
     badge_id: int,
     is_public: bool = True,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Share a badge achievement (CS-02)."""
@@ -378,7 +378,7 @@ async def share_badge(
 async def share_streak(
     streak_days: int,
     is_public: bool = True,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Share a streak achievement (CS-02)."""
@@ -443,7 +443,7 @@ async def get_shared_progress(
     share.view_count = (share.view_count or 0) + 1
     db.commit()
 
-    user = db.query(User).filter(User.id == share.user_id).first()
+    user = user_cache.get(db, share.user_id)
 
     return {
         "shared_by": user.first_name if (user and user.first_name) else "Anonymous",
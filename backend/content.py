@@ -9,18 +9,17 @@ from datetime import datetime
 # --- Corrected Imports ---
 from database import (
     get_db,
-    User,
     Content,
     ContentType,
-    AssessmentResult,
-    PaymentLog,
-    UserTracking,
 )
 # Import Pydantic schemas from models.py (your schema file)
 from models import ContentResponse
-from auth import get_current_user
+from async_db import run_db
+from auth import get_current_principal, Principal
+from scoring import get_user_scores
+from tracking import track_event
 # Import from your assessment_data.py file
-from assessment_data import DOMAIN_FEEDBACK, LIFE_DOMAINS
+from assessment_data import DOMAIN_FEEDBACK
 
 logger = logging.getLogger(__name__)
 
@@ -29,35 +28,9 @@ router = APIRouter(prefix="/api/v1/content", tags=["Content Delivery"])
 # ====== HELPER FUNCTIONS ======
 
 
-def check_level_access(db: Session, user_id: int, level: int) -> bool:
-    """Check if user has paid for a level."""
-    if level == 1:
-        return True
-
-    payment = db.query(PaymentLog).filter(
-        PaymentLog.user_id == user_id,
-        PaymentLog.service_type == f"level_{level}",
-        PaymentLog.status == "completed",
-    ).first()
-
-    return payment is not None
-
-
 def get_user_domain_scores(db: Session, user_id: int) -> dict:
     """Get cumulative domain scores for user."""
-    domain_scores = {}
-
-    for domain in LIFE_DOMAINS:
-        results = db.query(AssessmentResult).filter(
-            AssessmentResult.user_id == user_id,
-            AssessmentResult.domain == domain,
-        ).all()
-
-        points_map = {"A": 4, "B": 3, "C": 2, "D": 1}
-        cumulative_score = sum([points_map.get(r.answer, 0) for r in results])
-        domain_scores[domain] = cumulative_score
-
-    return domain_scores
+    return get_user_scores(db, user_id)["domain_scores"]
 
 
 def get_domain_feedback_category(score: int) -> str:
@@ -70,11 +43,70 @@ def get_domain_feedback_category(score: int) -> str:
         return "high"
 
 
+def recommend_content(db: Session, user_id: int) -> Optional[dict]:
+    """Content for the user's three lowest-scoring domains, or None if unassessed."""
+    domain_scores = get_user_domain_scores(db, user_id)
+    if not any(domain_scores.values()):
+        return None
+
+    assessed_domains = {d: s for d, s in domain_scores.items() if s > 0}
+    lowest_domains = sorted(assessed_domains, key=assessed_domains.get)[:3]
+
+    recommended_content = db.query(Content).filter(
+        Content.target_domain.in_(lowest_domains),
+        Content.is_published == True,
+    ).order_by(Content.difficulty_level).limit(9).all()  # Get 9 recommendations max
+
+    return {
+        "lowest_domains": lowest_domains,
+        "content": [ContentResponse.model_validate(c) for c in recommended_content],
+    }
+
+
+def query_published_content(
+    db: Session,
+    content_type: Optional[ContentType],
+    difficulty: Optional[str],
+    skip: int,
+    limit: int,
+) -> List[ContentResponse]:
+    """One page of published content, newest first."""
+    query = db.query(Content).filter(Content.is_published == True)
+
+    if content_type:
+        query = query.filter(Content.content_type == content_type)
+
+    if difficulty:
+        query = query.filter(Content.difficulty_level == difficulty)
+
+    content_list = query.order_by(
+        Content.created_at.desc()).offset(skip).limit(limit).all()
+    return [ContentResponse.model_validate(c) for c in content_list]
+
+
+def record_content_view(db: Session, content_id: int) -> Optional[ContentResponse]:
+    """Increment a published item's view count and return it, or None."""
+    try:
+        content = db.query(Content).filter(
+            Content.id == content_id,
+            Content.is_published == True,
+        ).first()
+        if not content:
+            return None
+
+        content.view_count = (content.view_count or 0) + 1
+        db.commit()
+        return ContentResponse.model_validate(content)
+    except Exception:
+        db.rollback()
+        raise
+
+
 # ====== CONTENT RECOMMENDATIONS (PR-01, PR-02, PR-03) ======
 
 @router.get("/recommendations", response_model=List[ContentResponse])
 async def get_personalized_recommendations(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -84,39 +116,22 @@ async def get_personalized_recommendations(
     logger.info(f"Recommendations requested by user {current_user.id}")
 
     try:
-        # 1. Get user's domain scores
-        domain_scores = get_user_domain_scores(db, current_user.id)
+        recommendations = await run_db(db, recommend_content, current_user.id)
 
-        if not any(domain_scores.values()):
+        if recommendations is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Complete Level 1 assessment to get recommendations.",
             )
 
-        # 2. Find the top 3 lowest-scoring domains
-        assessed_domains = {d: s for d, s in domain_scores.items() if s > 0}
-        lowest_domains = sorted(assessed_domains, key=assessed_domains.get)[:3]
-
-        # 3. Get content for those domains
-        recommended_content = db.query(Content).filter(
-            Content.target_domain.in_(lowest_domains),
-            Content.is_published == True,
-        ).order_by(Content.difficulty_level).limit(9).all()  # Get 9 recommendations max
-
-        # 4. Log event
-        tracking = UserTracking(
-            user_id=current_user.id,
-            event_type="recommendations_viewed",
-            event_data={"lowest_domains": lowest_domains},
-        )
-        db.add(tracking)
-        db.commit()
+        track_event(current_user.id, "recommendations_viewed",
+                    {"lowest_domains": recommendations["lowest_domains"]})
 
-        # --- FIX: Return the list of content directly ---
-        return [ContentResponse.model_validate(c) for c in recommended_content]
+        return recommendations["content"]
 
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()  # Rollback in case of error
         logger.error(f"Error fetching recommendations: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -132,7 +147,7 @@ async def list_all_content(
     difficulty: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -141,32 +156,18 @@ async def list_all_content(
     logger.info(f"Content list requested by user {current_user.id}")
 
     try:
-        query = db.query(Content).filter(Content.is_published == True)
-
-        if content_type:
-            query = query.filter(Content.content_type == content_type)
-
-        if difficulty:
-            query = query.filter(Content.difficulty_level == difficulty)
-
-        content_list = query.order_by(
-            Content.created_at.desc()).offset(skip).limit(limit).all()
+        content_list = await run_db(
+            db, query_published_content, content_type, difficulty, skip, limit)
 
         # Log event
-        tracking = UserTracking(
-            user_id=current_user.id,
-            event_type="content_browsed",
-            event_data={"type": content_type.value if content_type else "all", "count": len(
-                content_list)},
-        )
-        db.add(tracking)
-        db.commit()
+        track_event(current_user.id, "content_browsed", {
+            "type": content_type.value if content_type else "all",
+            "count": len(content_list),
+        })
 
-        # --- FIX: Return the list directly ---
-        return [ContentResponse.model_validate(c) for c in content_list]
+        return content_list
 
     except Exception as e:
-        db.rollback()  # Rollback in case of error
         logger.error(f"Error listing content: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -177,7 +178,7 @@ async def list_all_content(
 @router.get("/media/{content_id}", response_model=ContentResponse)
 async def get_content_details(
     content_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -187,10 +188,7 @@ async def get_content_details(
         f"Content details requested: {content_id} by user {current_user.id}")
 
     try:
-        content = db.query(Content).filter(
-            Content.id == content_id,
-            Content.is_published == True,
-        ).first()
+        content = await run_db(db, record_content_view, content_id)
 
         if not content:
             raise HTTPException(
@@ -198,27 +196,17 @@ async def get_content_details(
                 detail="Content not found",
             )
 
-        # Increment view count
-        content.view_count = (content.view_count or 0) + 1
-
         # Log event
-        tracking = UserTracking(
-            user_id=current_user.id,
-            event_type="content_viewed",
-            event_data={"content_id": content_id,
-                        "type": content.content_type.value},
-        )
-        db.add(tracking)
-
-        # Commit both changes at once
-        db.commit()
+        track_event(current_user.id, "content_viewed", {
+            "content_id": content_id,
+            "type": content.content_type.value,
+        })
 
-        return ContentResponse.model_validate(content)
+        return content
 
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()  # Rollback in case of error
         logger.error(f"Error fetching content: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -231,7 +219,7 @@ async def get_content_by_type(
     content_type: ContentType,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -264,7 +252,7 @@ async def get_content_by_type(
 async def rate_content(
     content_id: int,
     rating: float = Query(..., ge=0.5, le=5.0),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -4,6 +4,8 @@ from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from sqlalchemy import (
     create_engine,
+    inspect,
+    text,
     Column,
     Integer,
     String,
@@ -17,6 +19,7 @@ from sqlalchemy import (
     Date,
     UniqueConstraint,
     ForeignKey,
+    Index,
 )
 from datetime import datetime
 from pathlib import Path
@@ -26,6 +29,8 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
+from db_pool import pool_options, configure_engine
+
 
 logger = logging.getLogger(__name__)
 
@@ -48,11 +53,11 @@ else:
     DATABASE_URL = raw_db_url
     connect_args = {}
 
-# Create the engine
+# Create the engine; pool sizing and SQLite pragmas come from db_pool
 try:
-    engine = create_engine(
-        DATABASE_URL, connect_args=connect_args, pool_pre_ping=True
-    )
+    engine = configure_engine(create_engine(
+        DATABASE_URL, connect_args=connect_args, **pool_options(DATABASE_URL)
+    ))
 except OperationalError as e:
     logger.error("Database connection failed: %s", e)
     raise
@@ -104,6 +109,8 @@ class User(Base):
     # Account status
     is_active = Column(Boolean, default=True, nullable=False)
     is_email_verified = Column(Boolean, default=False, nullable=False)
+    # Bumped to invalidate all outstanding tokens (password reset, suspension)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
 
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -121,7 +128,7 @@ class User(Base):
     badges = relationship("UserBadge", back_populates="owner")
     threads = relationship("ForumThread", back_populates="owner")
     posts = relationship("ForumPost", back_populates="owner")
-    streaks = relationship("Streak", back_populates="owner", uselist=False)
+    streaks = relationship("Streak", back_populates="owner")
 
     def __repr__(self):
         return f"<User(id={self.id}, email={self.email}, role={self.role})>"
@@ -154,6 +161,27 @@ class PasswordReset(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
+class RefreshToken(Base):
+    """
+    Rotating refresh tokens, stored as SHA-256 hashes. Every token issued
+    from one login shares a family_id so a replayed token can revoke the
+    whole chain.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"),
+                     index=True, nullable=False)
+    family_id = Column(String(64), index=True, nullable=False)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    # users.token_version at issue time; a later bump invalidates the token
+    token_version = Column(Integer, default=0, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class ContentType(str, enum.Enum):
     """Content types for CMS."""
     NLP = "nlp"
@@ -207,10 +235,23 @@ class AssessmentResult(Base):
     overall_score = Column(Integer, nullable=True)
     wellness_stage = Column(String(50), nullable=True)
     answer = Column(String(1), nullable=False)
+    # Position in ASSESSMENT_QUESTIONS[level]; replaces question_text,
+    # which is only kept for rows written before the switch.
+    question_index = Column(Integer, nullable=True)
     question_text = Column(Text, nullable=True)
+    # AssessmentSubmission.attempt this row belongs to
+    attempt = Column(Integer, nullable=True)
     completed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    # Keyset pagination over a user's history (see pagination.py)
+    __table_args__ = (
+        Index("ix_assessment_results_user_completed",
+              "user_id", "completed_at", "id"),
+        UniqueConstraint("user_id", "level", "attempt", "question_index",
+                         name="unique_result_attempt_question"),
+    )
+
     owner = relationship("User", back_populates="results")
 
     def __repr__(self):
@@ -220,6 +261,68 @@ class AssessmentResult(Base):
         )
 
 
+class AssessmentSubmission(Base):
+    """One accepted submission per (user, level, attempt) (AS-02)."""
+    __tablename__ = "assessment_submissions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"),
+                     index=True, nullable=False)
+    level = Column(Integer, nullable=False)
+    attempt = Column(Integer, nullable=False)
+    idempotency_key = Column(String(255), nullable=True)
+    answers_digest = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'level', 'attempt',
+                         name='unique_user_level_attempt'),
+        UniqueConstraint('user_id', 'idempotency_key',
+                         name='unique_user_idempotency_key'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<AssessmentSubmission(user_id={self.user_id}, "
+            f"level={self.level}, attempt={self.attempt})>"
+        )
+
+
+class UserScoreSnapshot(Base):
+    """Cumulative assessment scores per user, kept current on submit (AS-03)."""
+    __tablename__ = "user_score_snapshot"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    # One column per LIFE_DOMAINS entry (see scoring.DOMAIN_COLUMNS)
+    career_vocation = Column(Integer, default=0, nullable=False)
+    financial_well_being = Column(Integer, default=0, nullable=False)
+    physical_health = Column(Integer, default=0, nullable=False)
+    emotional_well_being = Column(Integer, default=0, nullable=False)
+    family = Column(Integer, default=0, nullable=False)
+    friends = Column(Integer, default=0, nullable=False)
+    relationships_love = Column(Integer, default=0, nullable=False)
+    community_giving = Column(Integer, default=0, nullable=False)
+    fun_recreation = Column(Integer, default=0, nullable=False)
+    physical_environment = Column(Integer, default=0, nullable=False)
+    personal_growth = Column(Integer, default=0, nullable=False)
+    spirituality = Column(Integer, default=0, nullable=False)
+
+    overall_score = Column(Integer, default=0, nullable=False)
+    wellness_stage = Column(String(50), nullable=True)
+    # Bit (level - 1) is set once any answer for that level is stored
+    completed_levels = Column(Integer, default=0, nullable=False)
+    total_answers = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow,
+                        onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<UserScoreSnapshot(user_id={self.user_id}, "
+            f"overall={self.overall_score})>"
+        )
+
+
 class PaymentLog(Base):
     """Track all payments and transactions (Payment tracking)."""
     __tablename__ = "payment_logs"
@@ -253,6 +356,22 @@ class PaymentLog(Base):
         )
 
 
+class UserEntitlement(Base):
+    """Paid assessment levels unlocked per user (derived from payments)."""
+    __tablename__ = "user_entitlements"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    level = Column(Integer, primary_key=True)
+    payment_id = Column(Integer, ForeignKey("payment_logs.id"), nullable=True)
+    granted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<UserEntitlement(user_id={self.user_id}, "
+            f"level={self.level})>"
+        )
+
+
 class UserTracking(Base):
     """Track user engagement and analytics (TA-01, AD-02)."""
     __tablename__ = "user_tracking"
@@ -349,6 +468,29 @@ class DailyPractice(Base):
         )
 
 
+class UserDailyActivity(Base):
+    """Per-user daily practice rollup, kept current on practice log (TA-01)."""
+    __tablename__ = "user_daily_activity"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    activity_date = Column(Date, primary_key=True)
+    # One daily_practice row per practice type per day
+    sessions = Column(Integer, default=0, nullable=False)
+    minutes = Column(Integer, default=0, nullable=False)
+    # One column per practice type (see activity.PRACTICE_TYPE_COLUMNS)
+    meditation_sessions = Column(Integer, default=0, nullable=False)
+    yoga_sessions = Column(Integer, default=0, nullable=False)
+    nlp_sessions = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow,
+                        onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<UserDailyActivity(user_id={self.user_id}, "
+            f"date={self.activity_date}, sessions={self.sessions})>"
+        )
+
+
 class Badge(Base):
     """Achievement badges for gamification (TA-03)."""
     __tablename__ = "badges"
@@ -380,6 +522,9 @@ class UserBadge(Base):
     earned_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     earned_value = Column(Integer, nullable=True)
 
+    __table_args__ = (UniqueConstraint(
+        'user_id', 'badge_id', name='unique_user_badge'),)
+
     owner = relationship("User", back_populates="badges")
     badge = relationship("Badge", back_populates="user_badges")
 
@@ -393,7 +538,7 @@ class Streak(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"),
-                     index=True, nullable=False, unique=True)
+                     index=True, nullable=False)
     current_streak = Column(Integer, default=0, nullable=False)
     longest_streak = Column(Integer, default=0, nullable=False)
     practice_type = Column(String(50), default="all", nullable=False)
@@ -403,6 +548,10 @@ class Streak(Base):
     updated_at = Column(DateTime, default=datetime.utcnow,
                         onupdate=datetime.utcnow, nullable=False)
 
+    # One overall ("all") row plus one per practice type
+    __table_args__ = (UniqueConstraint(
+        'user_id', 'practice_type', name='unique_user_streak_type'),)
+
     owner = relationship("User", back_populates="streaks", uselist=False)
 
     def __repr__(self):
@@ -569,3 +718,117 @@ def init_db(create_tables: bool = True) -> None:
         logger.info("Database tables created/verified")
     except Exception as e:
         logger.error("Could not create database tables: %s", e)
+        return
+
+    try:
+        migrate_schema(engine)
+    except Exception as e:
+        logger.error("Could not migrate database schema: %s", e)
+
+
+# --- 4. SCHEMA MIGRATIONS ---
+# create_all only creates missing tables. Columns and indexes added to
+# tables that already exist are applied here. Every step checks the live
+# schema first, so migrate_schema is safe to run on each startup.
+
+# (model, column name) added after the table was first created
+ADDED_COLUMNS = [
+    (User, "token_version"),
+    (AssessmentResult, "question_index"),
+    (AssessmentResult, "attempt"),
+]
+
+# (model, index name) for non-unique indexes added to existing tables
+ADDED_INDEXES = [
+    (AssessmentResult, "ix_assessment_results_user_completed"),
+]
+
+
+# (model, constraint name, remove duplicates first) for unique constraints
+# added to existing tables; applied as a unique index of the same name.
+# Duplicates keep the row with the lowest id.
+ADDED_UNIQUE_CONSTRAINTS = [
+    # Rows written before attempts existed have NULL attempt/question_index,
+    # which never collide
+    (AssessmentResult, "unique_result_attempt_question", False),
+    # Concurrent awards could insert the same badge twice
+    (UserBadge, "unique_user_badge", True),
+    # Replaces the unique index on streaks.user_id dropped below
+    (Streak, "unique_user_streak_type", False),
+]
+
+# (model, index name) for indexes that used to be unique; they are
+# recreated as the model's plain index before the constraints above
+RELAXED_UNIQUE_INDEXES = [
+    # One row per user blocked the per-practice-type streaks
+    (Streak, "ix_streaks_user_id"),
+]
+
+
+def add_column_ddl(table: str, column: Column, dialect) -> str:
+    """ALTER TABLE ... ADD COLUMN for a model column (portable subset)."""
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    return ddl
+
+
+def migrate_schema(bind) -> list:
+    """Bring existing tables up to the models; returns the steps applied."""
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    applied = []
+
+    with bind.begin() as conn:
+        for model, name in ADDED_COLUMNS:
+            table = model.__tablename__
+            if table not in tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            if name not in existing:
+                conn.execute(text(add_column_ddl(
+                    table, model.__table__.c[name], bind.dialect)))
+                applied.append(f"{table}.{name}")
+
+        for model, name in ADDED_INDEXES:
+            table = model.__tablename__
+            if table not in tables:
+                continue
+            if name not in {index["name"] for index in inspector.get_indexes(table)}:
+                index = next(i for i in model.__table__.indexes if i.name == name)
+                index.create(conn)
+                applied.append(name)
+
+        for model, name in RELAXED_UNIQUE_INDEXES:
+            table = model.__tablename__
+            if table not in tables:
+                continue
+            if any(index["name"] == name and index["unique"]
+                   for index in inspector.get_indexes(table)):
+                conn.execute(text(f"DROP INDEX {name}"))
+                index = next(i for i in model.__table__.indexes if i.name == name)
+                index.create(conn)
+                applied.append(f"{name} (no longer unique)")
+
+        for model, name, dedupe in ADDED_UNIQUE_CONSTRAINTS:
+            table = model.__tablename__
+            if table not in tables:
+                continue
+            existing = {c["name"] for c in inspector.get_unique_constraints(table)}
+            existing |= {index["name"] for index in inspector.get_indexes(table)}
+            if name in existing:
+                continue
+            constraint = next(c for c in model.__table__.constraints if c.name == name)
+            columns = ", ".join(column.name for column in constraint.columns)
+            if dedupe:
+                conn.execute(text(
+                    f"DELETE FROM {table} WHERE id NOT IN "
+                    f"(SELECT MIN(id) FROM {table} GROUP BY {columns})"))
+            conn.execute(text(f"CREATE UNIQUE INDEX {name} ON {table} ({columns})"))
+            applied.append(name)
+
+    for step in applied:
+        logger.info("Schema migration applied: %s", step)
+    return applied
@@ -0,0 +1,132 @@
+# entitlements.py
+
+from sqlalchemy.orm import Session
+from typing import Optional
+import logging
+import os
+
+from database import PaymentLog, UserEntitlement
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+FREE_LEVELS = frozenset({1})
+LEVEL_SERVICE_PREFIX = "level_"
+
+# Per-user set of unlocked paid levels. Each worker process holds its own
+# copy; grants and revocations in this process invalidate it immediately,
+# other workers pick them up within the TTL.
+_entitlement_cache = TTLCache(
+    maxsize=int(os.getenv("ENTITLEMENT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("ENTITLEMENT_CACHE_TTL_SECONDS", "300")),
+    name="entitlements",
+)
+
+
+def level_from_service_type(service_type: Optional[str]) -> Optional[int]:
+    """Map a payment service_type such as 'level_2' to its level."""
+    if not service_type or not service_type.startswith(LEVEL_SERVICE_PREFIX):
+        return None
+    try:
+        return int(service_type[len(LEVEL_SERVICE_PREFIX):])
+    except ValueError:
+        return None
+
+
+def load_unlocked_levels(db: Session, user_id: int) -> frozenset:
+    """Read a user's paid levels from user_entitlements and cache them."""
+    levels = frozenset(
+        row[0] for row in db.query(UserEntitlement.level).filter(
+            UserEntitlement.user_id == user_id,
+        )
+    )
+    _entitlement_cache.set(user_id, levels)
+    return levels
+
+
+def get_unlocked_levels(db: Session, user_id: int) -> frozenset:
+    """Get a user's paid levels, from cache when possible."""
+    levels = _entitlement_cache.get(user_id)
+    if levels is None:
+        levels = load_unlocked_levels(db, user_id)
+    return levels
+
+
+def check_level_access(db: Session, user_id: int, level: int) -> bool:
+    """
+    Check if user has paid for and unlocked a level.
+    A cached denial is re-checked against the table once, so a payment
+    completed on another worker is honoured straight away.
+    """
+    if level in FREE_LEVELS:
+        return True
+
+    if level in get_unlocked_levels(db, user_id):
+        return True
+
+    return level in load_unlocked_levels(db, user_id)
+
+
+def invalidate_entitlements(user_id: int) -> None:
+    """Drop a user's cached entitlements."""
+    _entitlement_cache.delete(user_id)
+
+
+def grant_level(db: Session, user_id: int, level: int, payment_id: Optional[int] = None) -> None:
+    """
+    Record an unlocked level. The caller commits and then calls
+    invalidate_entitlements(user_id).
+    """
+    if db.get(UserEntitlement, (user_id, level)) is None:
+        db.add(UserEntitlement(
+            user_id=user_id, level=level, payment_id=payment_id))
+
+
+def revoke_level(db: Session, user_id: int, level: int) -> None:
+    """
+    Remove an unlocked level (e.g. after a refund). The caller commits and
+    then calls invalidate_entitlements(user_id).
+    """
+    db.query(UserEntitlement).filter(
+        UserEntitlement.user_id == user_id,
+        UserEntitlement.level == level,
+    ).delete(synchronize_session=False)
+
+
+def sync_entitlements_from_payments(db: Session) -> int:
+    """
+    Create entitlements for completed level payments that have none yet.
+    Safe to run repeatedly; used on startup to cover older payments.
+    Returns the number of entitlements created.
+    """
+    existing = {
+        (user_id, level)
+        for user_id, level in db.query(UserEntitlement.user_id, UserEntitlement.level)
+    }
+
+    created = 0
+    payments = db.query(
+        PaymentLog.id, PaymentLog.user_id, PaymentLog.service_type,
+    ).filter(
+        PaymentLog.service_type.like(f"{LEVEL_SERVICE_PREFIX}%"),
+        PaymentLog.status == "completed",
+    )
+    for payment_id, user_id, service_type in payments:
+        level = level_from_service_type(service_type)
+        if level is None or (user_id, level) in existing:
+            continue
+        db.add(UserEntitlement(
+            user_id=user_id, level=level, payment_id=payment_id))
+        existing.add((user_id, level))
+        created += 1
+
+    db.commit()
+    _entitlement_cache.clear()
+    if created:
+        logger.info("Entitlements created from payments: %s", created)
+    return created
+
+
+def entitlement_cache_stats() -> dict:
+    """Cache counters for monitoring."""
+    return _entitlement_cache.stats()
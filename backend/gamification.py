@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import and_
 from datetime import datetime, timedelta, date
 from typing import List, Optional
 import logging
@@ -10,9 +10,7 @@ import logging
 # --- FIX 1: Corrected Imports ---
 from database import (
     get_db,
-    User,
     DailyPractice,
-    Badge,
     UserBadge,
     Streak,
 )
@@ -25,8 +23,14 @@ from models import (
     StreakResponse,
     UserProgressResponse,
     LeaderboardEntryResponse,
+    LeaderboardPositionResponse,
 )
-from auth import get_current_user
+from auth import get_current_principal, Principal
+from user_cache import user_cache
+from activity import record_daily_activity, daily_sessions, activity_totals
+from badges import badge_catalog, award_badges
+from leaderboard import leaderboard
+from streaks import update_streak, local_today
 # (Removed the unused import block from models.py)
 # --- End of Fix ---
 
@@ -37,141 +41,16 @@ router = APIRouter(prefix="/api/v1/gamification",
 
 # ====== CONSTANTS ======
 
-BADGES_CONFIG = [
-    {"name": "First Step", "criteria_type": "sessions", "criteria_value": 1,
-        "description": "Complete your first practice session"},
-    {"name": "Week Warrior", "criteria_type": "streak", "criteria_value": 7,
-        "description": "Maintain a 7-day practice streak"},
-    {"name": "Month Master", "criteria_type": "streak", "criteria_value": 30,
-        "description": "Maintain a 30-day practice streak"},
-    {"name": "Century", "criteria_type": "sessions", "criteria_value": 100,
-        "description": "Complete 100 practice sessions"},
-    {"name": "Meditation Monk", "criteria_type": "sessions_meditation",
-        "criteria_value": 50, "description": "Complete 50 meditation sessions"},
-    {"name": "Yoga Yogi", "criteria_type": "sessions_yoga",
-        "criteria_value": 50, "description": "Complete 50 yoga sessions"},
-    {"name": "NLP Navigator", "criteria_type": "sessions_nlp",
-        "criteria_value": 50, "description": "Complete 50 NLP sessions"},
-]
+PROGRESS_WEEK_DAYS = 7
+PROGRESS_MONTH_DAYS = 31
 
 
 # ====== HELPER FUNCTIONS ======
 
-def initialize_badges(db: Session):
-    """Initialize all badges in the database."""
-    for badge_config in BADGES_CONFIG:
-        existing = db.query(Badge).filter(
-            Badge.name == badge_config["name"]).first()
-        if not existing:
-            badge = Badge(
-                name=badge_config["name"],
-                description=badge_config["description"],
-                criteria_type=badge_config["criteria_type"],
-                criteria_value=badge_config["criteria_value"],
-            )
-            db.add(badge)
-    db.commit()
-
-
-def check_and_award_badges(db: Session, user_id: int):
-    """Check if user has earned any new badges."""
-    # Initialize badges if not already done
-    initialize_badges(db)
-
-    # Get all badges
-    all_badges = db.query(Badge).filter(Badge.is_active == True).all()
-
-    for badge in all_badges:
-        # Check if user already has this badge
-        existing = db.query(UserBadge).filter(
-            UserBadge.user_id == user_id,
-            UserBadge.badge_id == badge.id,
-        ).first()
-
-        if existing:
-            continue
-
-        # Check criteria
-        criteria_met = False
-        criteria_value = badge.criteria_value
-
-        if badge.criteria_type == "sessions":
-            session_count = db.query(DailyPractice).filter(
-                DailyPractice.user_id == user_id,
-            ).count()
-            if session_count >= criteria_value:
-                criteria_met = True
-
-        elif badge.criteria_type.startswith("sessions_"):
-            practice_type = badge.criteria_type.split(
-                "_")[1]  # e.g., "meditation"
-            session_count = db.query(DailyPractice).filter(
-                DailyPractice.user_id == user_id,
-                DailyPractice.practice_type == practice_type
-            ).count()
-            if session_count >= criteria_value:
-                criteria_met = True
-
-        elif badge.criteria_type == "streak":
-            streak = db.query(Streak).filter(
-                Streak.user_id == user_id,
-                Streak.practice_type == "all"
-            ).first()
-            if streak and streak.current_streak >= criteria_value:
-                criteria_met = True
-
-        if criteria_met:
-            user_badge = UserBadge(
-                user_id=user_id,
-                badge_id=badge.id,
-                earned_value=criteria_value,
-            )
-            db.add(user_badge)
-            logger.info(f"Badge awarded: {badge.name} to user {user_id}")
-
-    db.commit()
-
-
-def update_streak(db: Session, user_id: int, practice_type: str = "all"):
-    """Update user's streak based on recent practices."""
-    today = date.today()
-    yesterday = today - timedelta(days=1)
-
-    # Get or create streak record
-    streak = db.query(Streak).filter(
-        Streak.user_id == user_id,
-        Streak.practice_type == practice_type,
-    ).first()
-
-    if not streak:
-        streak = Streak(
-            user_id=user_id,
-            practice_type=practice_type,
-            current_streak=0,
-            longest_streak=0
-        )
-        db.add(streak)
-
-    # Check if a practice was already logged *today*
-    if streak.last_practice_date == today:
-        return  # Streak already updated for today
-
-    # Check last practice was yesterday
-    if streak.last_practice_date == yesterday:
-        # Continue streak
-        streak.current_streak += 1
-    else:
-        # Streak broken or first practice
-        streak.current_streak = 1
-        streak.streak_started_at = today
-
-    streak.last_practice_date = today
-
-    # Update longest streak
-    if streak.current_streak > streak.longest_streak:
-        streak.longest_streak = streak.current_streak
-
-    db.commit()
+def user_today(db: Session, user_id: int) -> date:
+    """The current day in the user's profile timezone."""
+    user = user_cache.get(db, user_id)
+    return local_today(user.timezone if user else None)
 
 
 # ====== PRACTICE LOGGING ENDPOINTS ======
@@ -179,7 +58,7 @@ def update_streak(db: Session, user_id: int, practice_type: str = "all"):
 @router.post("/practice/log", response_model=DailyPracticeResponse, status_code=status.HTTP_201_CREATED)
 async def log_daily_practice(
     practice_data: DailyPracticeCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -189,7 +68,7 @@ async def log_daily_practice(
         f"Practice logged: {practice_data.practice_type} by user {current_user.id}")
 
     try:
-        today = date.today()
+        today = user_today(db, current_user.id)
 
         # Check if this specific practice type was already logged today
         existing_practice = db.query(DailyPractice).filter(
@@ -218,15 +97,28 @@ async def log_daily_practice(
             )
             db.add(practice)
 
+        record_daily_activity(
+            db, current_user.id, today, practice_data.practice_type,
+            practice_data.duration_minutes, new_session=existing_practice is None)
         db.commit()
 
         # Update streaks (only once per day per type)
         if not existing_practice:
-            update_streak(db, current_user.id, "all")
-            update_streak(db, current_user.id, practice_data.practice_type)
+            overall = update_streak(db, current_user.id, "all", today)
+            update_streak(db, current_user.id, practice_data.practice_type, today)
+            current_streak = overall.current_streak
+        else:
+            current_streak = db.query(Streak.current_streak).filter(
+                Streak.user_id == current_user.id,
+                Streak.practice_type == "all",
+            ).scalar() or 0
+
+        leaderboard.record_practice(
+            current_user.id, practice_data.duration_minutes,
+            new_session=existing_practice is None, current_streak=current_streak)
 
         # Check for new badges
-        check_and_award_badges(db, current_user.id)
+        award_badges(db, current_user.id)
 
         db.refresh(practice)
         # --- FIX 2: Use .model_validate() for Pydantic v2 ---
@@ -245,13 +137,13 @@ async def log_daily_practice(
 async def get_practice_history(
     practice_type: Optional[str] = None,
     days: int = Query(30, ge=1, le=365),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get user's practice history for last N days."""
     logger.info(f"Practice history requested by user {current_user.id}")
 
-    cutoff_date = date.today() - timedelta(days=days)
+    cutoff_date = user_today(db, current_user.id) - timedelta(days=days)
 
     query = db.query(DailyPractice).filter(
         DailyPractice.user_id == current_user.id,
@@ -272,7 +164,7 @@ async def get_practice_history(
 @router.get("/streak", response_model=StreakResponse)
 async def get_user_streak(
     practice_type: str = Query("all", pattern="^(all|meditation|yoga|nlp)$"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get user's current and longest streak."""
@@ -303,27 +195,22 @@ async def get_user_streak(
 
 @router.get("/badges", response_model=List[UserBadgeResponse])
 async def get_user_badges(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get all badges earned by user."""
     logger.info(f"Badges requested by user {current_user.id}")
 
-    user_badges = db.query(UserBadge).filter(
+    user_badges = db.query(UserBadge.badge_id, UserBadge.earned_at).filter(
         UserBadge.user_id == current_user.id,
     ).order_by(UserBadge.earned_at.desc()).all()
 
-    result = []
-    for ub in user_badges:
-        badge = db.query(Badge).filter(Badge.id == ub.badge_id).first()
-        if badge:
-            result.append({
-                # --- FIX 2: Use .model_validate() for Pydantic v2 ---
-                "badge": BadgeResponse.model_validate(badge),
-                "earned_at": ub.earned_at,
-            })
-
-    return result
+    badges = badge_catalog.by_id(db)
+    return [
+        {"badge": badges[badge_id], "earned_at": earned_at}
+        for badge_id, earned_at in user_badges
+        if badge_id in badges
+    ]
 
 
 @router.get("/badges/available", response_model=List[BadgeResponse])
@@ -331,17 +218,14 @@ async def get_available_badges(
     db: Session = Depends(get_db),
 ):
     """Get all available badges in the system."""
-    initialize_badges(db)
-    badges = db.query(Badge).filter(Badge.is_active == True).all()
-    # --- FIX 2: Use .model_validate() for Pydantic v2 ---
-    return [BadgeResponse.model_validate(b) for b in badges]
+    return badge_catalog.get(db)
 
 
 # ====== PROGRESS ENDPOINTS ======
 
 @router.get("/progress", response_model=UserProgressResponse)
 async def get_user_progress(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -355,47 +239,25 @@ async def get_user_progress(
         Streak.practice_type == "all",
     ).first() or Streak(user_id=current_user.id, practice_type="all", current_streak=0, longest_streak=0)
 
-    # Total sessions
-    total_sessions = db.query(DailyPractice).filter(
-        DailyPractice.user_id == current_user.id,
-    ).count()
-
-    # Total minutes
-    total_minutes = db.query(func.sum(DailyPractice.duration_minutes)).filter(
-        DailyPractice.user_id == current_user.id,
-    ).scalar() or 0
+    # Lifetime totals and the per-day counts both come from the daily rollup
+    totals = activity_totals(db, current_user.id)
 
     # Badges earned
     badges_earned = db.query(UserBadge).filter(
         UserBadge.user_id == current_user.id,
     ).count()
 
-    # Weekly progress (last 7 days)
-    weekly_progress = []
-    for i in range(6, -1, -1):
-        day = date.today() - timedelta(days=i)
-        count = db.query(DailyPractice).filter(
-            DailyPractice.user_id == current_user.id,
-            DailyPractice.logged_date == day,
-        ).count()
-        weekly_progress.append(count)
-
-    # Monthly progress (last 31 days)
-    monthly_progress = []
-    for i in range(30, -1, -1):
-        day = date.today() - timedelta(days=i)
-        count = db.query(DailyPractice).filter(
-            DailyPractice.user_id == current_user.id,
-            DailyPractice.logged_date == day,
-        ).count()
-        monthly_progress.append(count)
+    # Last 31 days in one range query; the week is its tail
+    monthly_progress = daily_sessions(
+        db, current_user.id, PROGRESS_MONTH_DAYS, today=user_today(db, current_user.id))
+    weekly_progress = monthly_progress[-PROGRESS_WEEK_DAYS:]
 
     return UserProgressResponse(
         current_streak=streak.current_streak,
         longest_streak=streak.longest_streak,
-        total_sessions=total_sessions,
+        total_sessions=totals["sessions"],
         badges_earned=badges_earned,
-        total_minutes=int(total_minutes),
+        total_minutes=totals["minutes"],
         weekly_progress=weekly_progress,
         monthly_progress=monthly_progress,
     )
@@ -403,58 +265,70 @@ async def get_user_progress(
 
 # ====== LEADERBOARD ENDPOINTS ======
 
+def leaderboard_entries(db: Session, standings) -> List[LeaderboardEntryResponse]:
+    """Attach display names (from the user cache) to ranked standings."""
+    users = user_cache.get_many(db, [user_id for _, user_id, _ in standings])
+    return [
+        LeaderboardEntryResponse(
+            rank=rank,
+            user_name=users[user_id].display_name,
+            current_streak=streak,
+            total_sessions=sessions,
+            total_minutes=minutes,
+        )
+        for rank, user_id, (streak, sessions, minutes) in standings
+        if user_id in users
+    ]
+
+
 @router.get("/leaderboard", response_model=List[LeaderboardEntryResponse])
 async def get_leaderboard(
     period: str = Query("all", pattern="^(all|week|month)$"),
     limit: int = Query(10, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    """Get leaderboard based on streaks and sessions."""
+    """
+    Get the leaderboard. "all" ranks by current streak; "week" and "month"
+    rank by sessions and minutes logged in that window. Served from the
+    precomputed standings, so a read costs no ranking queries.
+    """
     logger.info(f"Leaderboard requested: {period} by user {current_user.id}")
 
-    cutoff = None
-    if period == "week":
-        cutoff = date.today() - timedelta(days=7)
-    elif period == "month":
-        cutoff = date.today() - timedelta(days=30)
-
-    # Get top users by current streak
-    query = db.query(Streak).filter(Streak.practice_type == "all").order_by(
-        Streak.current_streak.desc(),
-    ).limit(limit).all()
-
-    leaderboard = []
-    for rank, streak in enumerate(query, 1):
-        user = db.query(User).filter(User.id == streak.user_id).first()
-        if user:
-            # Get total sessions
-            sessions_query = db.query(DailyPractice).filter(
-                DailyPractice.user_id == streak.user_id,
-            )
+    try:
+        return leaderboard_entries(db, leaderboard.top(period, limit))
 
-            # Get total minutes
-            minutes_query = db.query(func.sum(DailyPractice.duration_minutes)).filter(
-                DailyPractice.user_id == streak.user_id,
-            )
+    except Exception as e:
+        logger.error(f"Leaderboard error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to load leaderboard",
+        )
 
-            if cutoff:
-                sessions_query = sessions_query.filter(
-                    DailyPractice.logged_date >= cutoff)
-                minutes_query = minutes_query.filter(
-                    DailyPractice.logged_date >= cutoff)
-
-            session_count = sessions_query.count()
-            total_minutes = minutes_query.scalar() or 0
-
-            leaderboard.append(
-                LeaderboardEntryResponse(
-                    rank=rank,
-                    user_name=user.first_name or user.email.split("@")[0],
-                    current_streak=streak.current_streak,
-                    total_sessions=session_count,
-                    total_minutes=int(total_minutes),
-                )
-            )
 
-    return leaderboard
+@router.get("/leaderboard/me", response_model=LeaderboardPositionResponse)
+async def get_my_leaderboard_position(
+    period: str = Query("all", pattern="^(all|week|month)$"),
+    around: int = Query(2, ge=0, le=25),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    """Get the caller's rank and percentile, with `around` places either side."""
+    logger.info(f"Leaderboard position requested: {period} by user {current_user.id}")
+
+    try:
+        position = leaderboard.around(period, current_user.id, around)
+        return LeaderboardPositionResponse(
+            period=period,
+            rank=position["rank"],
+            total_ranked=position["total_ranked"],
+            percentile=position["percentile"],
+            entries=leaderboard_entries(db, position["entries"]),
+        )
+
+    except Exception as e:
+        logger.error(f"Leaderboard position error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to load leaderboard position",
+        )
@@ -0,0 +1,146 @@
+# hashing.py
+
+from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from typing import Optional, Tuple
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Argon2id cost profile. Defaults are passlib's (t=3, m=64 MiB, p=4), which
+# run in roughly 50-300 ms per hash depending on the CPU; re-run the
+# benchmark below on production hardware before changing them. Hashes made
+# with an older profile are upgraded on the next successful login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# argon2-cffi releases the GIL while hashing, so a thread pool scales with
+# cores. Jobs beyond the queue limit are rejected with 503 instead of
+# piling up behind the workers.
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", str(HASH_WORKERS * 8)))
+HASH_RETRY_AFTER_SECONDS = 1
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+_pending = 0
+_pending_lock = threading.Lock()
+_rejected = 0
+
+
+# Stored for accounts that must not log in with a password until one is
+# set (provisioned or anonymized users); matches no Argon2 hash
+UNUSABLE_PASSWORD_HASH = "!"
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the configured Argon2 profile (blocking)."""
+    return pwd_context.hash(password)
+
+
+def verify_and_update(plain_password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password (blocking). Returns (valid, new_hash), where new_hash
+    is set when the stored hash uses an outdated cost profile.
+    """
+    if password_hash == UNUSABLE_PASSWORD_HASH:
+        return False, None
+    try:
+        return pwd_context.verify_and_update(plain_password, password_hash)
+    except Exception as e:
+        logger.error(f"Password verification error: {e}")
+        return False, None
+
+
+async def _run_in_pool(func, *args):
+    """Run a hashing call on the worker pool, enforcing the queue limit."""
+    global _pending, _rejected
+    with _pending_lock:
+        if _pending >= HASH_QUEUE_LIMIT:
+            _rejected += 1
+            logger.warning(f"Password hash queue full ({_pending} pending)")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry shortly",
+                headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+            )
+        _pending += 1
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the worker pool."""
+    return await _run_in_pool(hash_password, password)
+
+
+async def verify_and_update_async(plain_password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the worker pool; see verify_and_update."""
+    return await _run_in_pool(verify_and_update, plain_password, password_hash)
+
+
+def hashing_pool_stats() -> dict:
+    """Pool size and queue counters for monitoring."""
+    with _pending_lock:
+        return {
+            "workers": HASH_WORKERS,
+            "queue_limit": HASH_QUEUE_LIMIT,
+            "pending": _pending,
+            "rejected": _rejected,
+        }
+
+
+def benchmark(rounds: int = 5) -> None:
+    """Print per-hash timings for the configured and neighbouring profiles."""
+    profiles = [
+        (ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM),
+        (2, 19456, 1),   # OWASP minimum for argon2id
+        (2, 65536, 4),
+        (3, 65536, 4),
+        (4, 131072, 4),
+    ]
+    print(f"workers={HASH_WORKERS} queue_limit={HASH_QUEUE_LIMIT}")
+    for time_cost, memory_cost, parallelism in profiles:
+        context = CryptContext(
+            schemes=["argon2"],
+            argon2__rounds=time_cost,
+            argon2__memory_cost=memory_cost,
+            argon2__parallelism=parallelism,
+        )
+        start = time.perf_counter()
+        for _ in range(rounds):
+            context.hash("benchmark-password")
+        per_hash = (time.perf_counter() - start) / rounds * 1000
+        print(f"t={time_cost} m={memory_cost} p={parallelism}: {per_hash:.1f} ms/hash")
+
+    # Throughput of the pool with every worker busy
+    jobs = HASH_WORKERS * rounds
+    start = time.perf_counter()
+    list(_executor.map(hash_password, ["benchmark-password"] * jobs))
+    elapsed = time.perf_counter() - start
+    print(f"pool: {jobs / elapsed:.1f} hashes/s with the configured profile")
+
+
+if __name__ == "__main__":
+    import sys
+
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,297 @@
+# leaderboard.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+import bisect
+import logging
+import os
+import threading
+import time
+
+from database import SessionLocal, Streak, UserDailyActivity
+from streaks import local_today
+
+logger = logging.getLogger(__name__)
+
+# Standings are rebuilt from the database by a background thread this often
+# (and whenever the day rolls over, since that moves the week/month
+# windows). In between, practice logs in this process update them in place;
+# other workers pick those up at their next rebase.
+LEADERBOARD_REBASE_SECONDS = float(os.getenv("LEADERBOARD_REBASE_SECONDS", "60"))
+# How often the rebase thread checks whether the standings are stale
+REBASE_POLL_INTERVAL = 1.0
+
+# Window length in days, counting today; "all" has no cutoff
+LEADERBOARD_PERIOD_DAYS = {"week": 7, "month": 30}
+LEADERBOARD_PERIODS = ["all", "week", "month"]
+
+# (current_streak, sessions, minutes) for one user within one window
+Standing = Tuple[int, int, int]
+
+
+def rank_by_streak(user_id: int, standing: Standing) -> tuple:
+    """All-time order: current streak, then sessions, then minutes."""
+    streak, sessions, minutes = standing
+    return (-streak, -sessions, -minutes, user_id)
+
+
+def rank_by_sessions(user_id: int, standing: Standing) -> tuple:
+    """Window order: sessions in the window, then minutes, then streak."""
+    streak, sessions, minutes = standing
+    return (-sessions, -minutes, -streak, user_id)
+
+
+# ====== RANKED BOARD ======
+
+class RankedBoard:
+    """
+    One window's standings, kept in a list sorted by rank key. Rank
+    lookups are a bisect (O(log n)); an update is a bisect plus a list
+    insert/delete.
+    """
+
+    def __init__(self, key: Callable[[int, Standing], tuple]):
+        self.key = key
+        self._keys: List[tuple] = []
+        self._standings: Dict[int, Standing] = {}
+
+    def __len__(self) -> int:
+        return len(self._standings)
+
+    def load(self, standings: Dict[int, Standing]) -> None:
+        """Replace every standing at once."""
+        self._standings = dict(standings)
+        self._keys = sorted(self.key(user_id, standing)
+                            for user_id, standing in self._standings.items())
+
+    def get(self, user_id: int) -> Optional[Standing]:
+        return self._standings.get(user_id)
+
+    def upsert(self, user_id: int, standing: Standing) -> None:
+        old = self._standings.get(user_id)
+        if old is not None:
+            index = bisect.bisect_left(self._keys, self.key(user_id, old))
+            del self._keys[index]
+        self._standings[user_id] = standing
+        bisect.insort(self._keys, self.key(user_id, standing))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based position of a user, or None if they are not ranked."""
+        standing = self._standings.get(user_id)
+        if standing is None:
+            return None
+        return bisect.bisect_left(self._keys, self.key(user_id, standing)) + 1
+
+    def slice(self, start: int, stop: int) -> List[Tuple[int, int, Standing]]:
+        """(rank, user_id, standing) for 0-based positions start..stop-1."""
+        start = max(0, start)
+        return [
+            (start + offset + 1, key[-1], self._standings[key[-1]])
+            for offset, key in enumerate(self._keys[start:stop])
+        ]
+
+
+# ====== LEADERBOARD ======
+
+class Leaderboard:
+    """
+    Precomputed all/week/month standings, refreshed in place and rebased
+    periodically by a background thread. Reads never query the ranking
+    tables; while a rebase runs they are served from the previous boards.
+    """
+
+    def __init__(self, session_factory=SessionLocal, rebase_seconds: float = LEADERBOARD_REBASE_SECONDS):
+        self.session_factory = session_factory
+        self.rebase_seconds = rebase_seconds
+        self.boards = {
+            "all": RankedBoard(rank_by_streak),
+            "week": RankedBoard(rank_by_sessions),
+            "month": RankedBoard(rank_by_sessions),
+        }
+        self._lock = threading.Lock()
+        self._based_at: Optional[float] = None
+        self._based_on: Optional[date] = None
+        self._rebasing = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.rebases = 0
+        self.failed_rebases = 0
+        self.incremental_updates = 0
+
+    def is_stale(self, today: date) -> bool:
+        return (
+            self._based_at is None
+            or self._based_on != today
+            or time.monotonic() - self._based_at >= self.rebase_seconds
+        )
+
+    def rebase(self, db: Session, today: Optional[date] = None) -> None:
+        """
+        Rebuild every window from the streaks table and the daily activity
+        rollup: two queries, however many users there are. Activity is
+        keyed by each user's local day, so windows end on today in
+        DEFAULT_TIMEZONE rather than the server's clock.
+        """
+        today = today or local_today(None)
+        started = time.perf_counter()
+        cutoffs = {
+            period: today - timedelta(days=days - 1)
+            for period, days in LEADERBOARD_PERIOD_DAYS.items()
+        }
+
+        streaks = dict(db.query(Streak.user_id, Streak.current_streak).filter(
+            Streak.practice_type == "all",
+        ))
+
+        columns = [
+            func.coalesce(func.sum(UserDailyActivity.sessions), 0),
+            func.coalesce(func.sum(UserDailyActivity.minutes), 0),
+        ]
+        for period in LEADERBOARD_PERIOD_DAYS:
+            in_window = UserDailyActivity.activity_date >= cutoffs[period]
+            columns += [
+                func.coalesce(func.sum(case((in_window, UserDailyActivity.sessions), else_=0)), 0),
+                func.coalesce(func.sum(case((in_window, UserDailyActivity.minutes), else_=0)), 0),
+            ]
+        totals = db.query(UserDailyActivity.user_id, *columns).group_by(
+            UserDailyActivity.user_id)
+
+        standings = {period: {} for period in LEADERBOARD_PERIODS}
+        for user_id, *sums in totals:
+            streak = streaks.get(user_id, 0)
+            for index, period in enumerate(LEADERBOARD_PERIODS):
+                sessions, minutes = int(sums[2 * index]), int(sums[2 * index + 1])
+                if period == "all" or sessions:
+                    standings[period][user_id] = (streak, sessions, minutes)
+        for user_id, streak in streaks.items():
+            standings["all"].setdefault(user_id, (streak, 0, 0))
+
+        with self._lock:
+            for period, board in self.boards.items():
+                board.load(standings[period])
+            self._based_at = time.monotonic()
+            self._based_on = today
+            self.rebases += 1
+
+        logger.info(
+            "Leaderboard rebased: %s users in %.1f ms",
+            len(standings["all"]), (time.perf_counter() - started) * 1000)
+
+    def refresh(self) -> bool:
+        """
+        Rebase from a new session if the standings are stale. Returns
+        False without waiting when they are fresh or another rebase is
+        running. Raises if the rebase fails.
+        """
+        if not self._rebasing.acquire(blocking=False):
+            return False
+        try:
+            today = local_today(None)
+            if not self.is_stale(today):
+                return False
+            db = self.session_factory()
+            try:
+                self.rebase(db, today)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            return True
+        finally:
+            self._rebasing.release()
+
+    def start(self) -> None:
+        """Start the background rebase thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="leaderboard-rebase", daemon=True)
+        self._thread.start()
+        logger.info("Leaderboard rebase thread started")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the rebase thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        wait = 0.0
+        while not self._stop.wait(wait):
+            wait = REBASE_POLL_INTERVAL
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the previous boards; try again a period later
+                self.failed_rebases += 1
+                logger.error("Leaderboard rebase failed: %s", e)
+                wait = self.rebase_seconds
+
+    def record_practice(
+        self,
+        user_id: int,
+        minutes: Optional[int],
+        new_session: bool,
+        current_streak: int,
+    ) -> None:
+        """
+        Apply one committed practice log for today to every window.
+        Skipped until the first rebase, which will include it anyway.
+        """
+        with self._lock:
+            if self._based_at is None:
+                return
+            for board in self.boards.values():
+                streak, sessions, total = board.get(user_id) or (0, 0, 0)
+                board.upsert(user_id, (
+                    current_streak,
+                    sessions + (1 if new_session else 0),
+                    total + (minutes or 0),
+                ))
+            self.incremental_updates += 1
+
+    def top(self, period: str, limit: int) -> List[Tuple[int, int, Standing]]:
+        """(rank, user_id, standing) for the first `limit` places."""
+        with self._lock:
+            return self.boards[period].slice(0, limit)
+
+    def rank(self, period: str, user_id: int) -> Optional[int]:
+        with self._lock:
+            return self.boards[period].rank(user_id)
+
+    def around(self, period: str, user_id: int, k: int) -> dict:
+        """
+        A user's rank and percentile plus the k places above and below,
+        from one bisect and a slice of the sorted board.
+        """
+        with self._lock:
+            board = self.boards[period]
+            total = len(board)
+            rank = board.rank(user_id)
+            if rank is None:
+                return {"rank": None, "total_ranked": total, "percentile": None, "entries": []}
+            return {
+                "rank": rank,
+                "total_ranked": total,
+                "percentile": round(100 * (total - rank + 1) / total, 1),
+                "entries": board.slice(rank - 1 - k, rank + k),
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": {period: len(board) for period, board in self.boards.items()},
+                "rebases": self.rebases,
+                "failed_rebases": self.failed_rebases,
+                "incremental_updates": self.incremental_updates,
+                "age_seconds": round(time.monotonic() - self._based_at, 1)
+                if self._based_at is not None else None,
+            }
+
+
+leaderboard = Leaderboard()
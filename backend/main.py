@@ -18,7 +18,15 @@ from gamification import router as gamification_router
 from community import router as community_router
 
 # Import DB Tables (User) and connection functions (get_db, init_db)
-from database import get_db, User, init_db
+from database import get_db, User, init_db, SessionLocal, engine
+from async_db import dispose_async_engine
+from entitlements import sync_entitlements_from_payments
+from leaderboard import leaderboard
+from tracking import tracker
+from user_import import shutdown_hash_pool
+from maintenance import scheduler as maintenance_scheduler, MAINTENANCE_ENABLED
+from user_cache import user_cache
+from ratelimit import enforce_rate_limit, client_ip
 
 # --- FIX 1: Consolidated all schema imports to 'models.py' ---
 # Removed the duplicate import from 'schemas.py'
@@ -29,7 +37,8 @@ from models import (
     UserResponse,
     PasswordResetRequest,
     PasswordReset as PasswordResetModel,
-    UserProfile
+    UserProfile,
+    RefreshTokenRequest,
 )
 # (TokenPayload is not used in main.py, so it's not imported here)
 # --- End of Fix 1 ---
@@ -37,6 +46,7 @@ from models import (
 from auth import (
     AuthService,
     ACCESS_TOKEN_EXPIRE_MINUTES,
+    REFRESH_TOKEN_EXPIRE_DAYS,
     get_current_user,
 )
 
@@ -103,6 +113,23 @@ async def general_exception_handler(request: Request, exc: Exception):
 # ====== AUTHENTICATION ENDPOINTS ======
 
 
+def token_response(user: User, refresh_token: str) -> TokenResponse:
+    """Build the register/login/refresh response with a fresh access token."""
+    access_token, _ = AuthService.create_access_token(
+        user,
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    return TokenResponse(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        refresh_token=refresh_token,
+        refresh_expires_in=REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600,
+        # --- FIX 2: Use .model_validate() for Pydantic v2 ---
+        user=UserResponse.model_validate(user),
+    )
+
+
 @app.post(
     "/api/v1/auth/register",
     response_model=TokenResponse,
@@ -110,11 +137,13 @@ async def general_exception_handler(request: Request, exc: Exception):
 )
 async def register(
     user_data: UserCreate,
+    request: Request,
     db: Session = Depends(get_db),
 ):
     """
     Register a new user (UM-01, UM-02).
     """
+    enforce_rate_limit("register_ip", client_ip(request))
     logger.info("Registration attempt: %s", user_data.email)
 
     if not (
@@ -127,39 +156,36 @@ async def register(
             detail="You must accept all terms and policies to register",
         )
 
-    new_user, error = AuthService.create_user(db, user_data)
+    new_user, error = await AuthService.create_user_async(db, user_data)
     if error:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=error,
         )
 
-    access_token, _ = AuthService.create_access_token(
-        new_user,
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
-    )
+    refresh_token, _ = AuthService.issue_refresh_token(db, new_user)
     logger.info("User registered successfully: %s", new_user.email)
 
-    return TokenResponse(
-        access_token=access_token,
-        token_type="bearer",
-        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        # --- FIX 2: Use .model_validate() for Pydantic v2 ---
-        user=UserResponse.model_validate(new_user),
-    )
+    return token_response(new_user, refresh_token)
 
 
 @app.post("/api/v1/auth/login", response_model=TokenResponse)
 async def login(
     credentials: UserLogin,
+    request: Request,
     db: Session = Depends(get_db),
 ):
     """
     Login user with email and password (UM-01).
     """
+    ip = client_ip(request)
+    enforce_rate_limit("login_ip", ip)
+    # Per account and caller: keyed on the email alone, anyone could lock
+    # an account out by sending a few requests for it
+    enforce_rate_limit("login_email", f"{credentials.email.lower()}|{ip}")
     logger.info("Login attempt: %s", credentials.email)
 
-    user, error = AuthService.authenticate_user(
+    user, error = await AuthService.authenticate_user_async(
         db, credentials.email, credentials.password
     )
     if error:
@@ -168,29 +194,53 @@ async def login(
             detail=error,
         )
 
-    access_token, _ = AuthService.create_access_token(
-        user,
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
-    )
+    refresh_token, _ = AuthService.issue_refresh_token(db, user)
     logger.info("User logged in successfully: %s", user.email)
 
-    return TokenResponse(
-        access_token=access_token,
-        token_type="bearer",
-        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        # --- FIX 2: Use .model_validate() for Pydantic v2 ---
-        user=UserResponse.model_validate(user),
-    )
+    return token_response(user, refresh_token)
+
+
+@app.post("/api/v1/auth/refresh", response_model=TokenResponse)
+async def refresh_access_token(
+    body: RefreshTokenRequest,
+    db: Session = Depends(get_db),
+):
+    """
+    Exchange a refresh token for a new access token and a rotated
+    refresh token.
+    """
+    user, refresh_token, error = AuthService.rotate_refresh_token(
+        db, body.refresh_token)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=error,
+        )
+
+    return token_response(user, refresh_token)
+
+
+@app.post("/api/v1/auth/logout")
+async def logout(
+    body: RefreshTokenRequest,
+    db: Session = Depends(get_db),
+):
+    """Revoke a refresh token and every token rotated from it."""
+    AuthService.revoke_refresh_token(db, body.refresh_token)
+    return {"message": "Logged out"}
 
 
 @app.post("/api/v1/auth/password-reset-request")
 async def request_password_reset(
     request_data: PasswordResetRequest,
+    request: Request,
     db: Session = Depends(get_db),
 ):
     """
     Request password reset (UM-03).
     """
+    enforce_rate_limit("reset_ip", client_ip(request))
+    enforce_rate_limit("reset_email", request_data.email.lower())
     logger.info("Password reset request: %s", request_data.email)
     user = AuthService.get_user_by_email(db, request_data.email)
 
@@ -214,7 +264,7 @@ async def reset_password(
     Reset password using token (UM-03).
     """
     logger.info("Password reset attempt")
-    success, message = AuthService.reset_password(
+    success, message = await AuthService.reset_password_async(
         db, reset_data.token, reset_data.new_password)
     if not success:
         raise HTTPException(
@@ -256,6 +306,7 @@ async def update_user_profile(
             setattr(current_user, key, value)
 
         db.commit()
+        user_cache.invalidate(current_user.id)
         db.refresh(current_user)
         logger.info("Profile updated for user: %s", current_user.email)
 
@@ -297,11 +348,40 @@ async def startup_event():
     # Initialize DB tables (will log but not raise on failure)
     init_db()
 
+    # Cover level payments completed before user_entitlements existed
+    db = SessionLocal()
+    try:
+        sync_entitlements_from_payments(db)
+    except Exception as e:
+        db.rollback()
+        logger.error("Could not sync entitlements: %s", e)
+    finally:
+        db.close()
+
+    # Build the leaderboard standings now rather than on the first request;
+    # the rebase thread keeps them current from here on
+    try:
+        leaderboard.refresh()
+    except Exception as e:
+        logger.error("Could not build leaderboard: %s", e)
+
+    tracker.start()
+    leaderboard.start()
+    if MAINTENANCE_ENABLED:
+        maintenance_scheduler.start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown tasks."""
     logger.info("MindfulPath API shutting down...")
+    maintenance_scheduler.stop()
+    leaderboard.stop()
+    shutdown_hash_pool()
+    # Write any tracking events still queued
+    tracker.stop()
+    await dispose_async_engine()
+    engine.dispose()
 
 
 if __name__ == "__main__":
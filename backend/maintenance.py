@@ -0,0 +1,259 @@
+# maintenance.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import or_, text
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+import logging
+import os
+import threading
+import time
+
+from database import (
+    engine,
+    SessionLocal,
+    User,
+    PasswordReset,
+    RefreshToken,
+    AssessmentResult,
+    AssessmentSubmission,
+    UserScoreSnapshot,
+    UserTracking,
+    DailyPractice,
+    UserDailyActivity,
+    Streak,
+    ProgressShare,
+)
+from auth import revoke_user_tokens, invalidate_token_state
+from user_cache import user_cache
+from hashing import UNUSABLE_PASSWORD_HASH
+
+logger = logging.getLogger(__name__)
+
+# Off by default: every worker that enables it competes for
+# MAINTENANCE_LOCK_KEY, and only the holder runs a pass
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "false").lower() == "true"
+MAINTENANCE_LOCK_KEY = int(os.getenv("MAINTENANCE_LOCK_KEY", "7240017"))
+MAINTENANCE_INTERVAL_SECONDS = float(
+    os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+# First run comes this long after startup so it does not slow boot
+STARTUP_DELAY_SECONDS = 60.0
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", "1000"))
+# How long used/expired tokens are kept for auditing before deletion
+RESET_TOKEN_RETENTION_HOURS = int(os.getenv("RESET_TOKEN_RETENTION_HOURS", "24"))
+REFRESH_TOKEN_RETENTION_DAYS = int(os.getenv("REFRESH_TOKEN_RETENTION_DAYS", "7"))
+
+# Personal data removed once a user's data_retention_until has passed.
+# Consent logs, payments, entitlements and forum content are kept; the
+# user row itself is anonymized rather than deleted.
+RETENTION_PURGE_MODELS = [
+    UserTracking,
+    PasswordReset,
+    RefreshToken,
+    AssessmentResult,
+    AssessmentSubmission,
+    UserScoreSnapshot,
+    DailyPractice,
+    UserDailyActivity,
+    Streak,
+    ProgressShare,
+]
+
+
+# ====== JOBS ======
+
+def delete_in_batches(db: Session, model, condition, batch_size: int = MAINTENANCE_BATCH_SIZE) -> int:
+    """Delete matching rows batch_size at a time, committing per batch."""
+    total = 0
+    while True:
+        ids = [row[0] for row in db.query(model.id).filter(
+            condition).limit(batch_size)]
+        if not ids:
+            return total
+        db.query(model).filter(model.id.in_(ids)).delete(
+            synchronize_session=False)
+        db.commit()
+        total += len(ids)
+
+
+def prune_password_resets(db: Session) -> int:
+    """Delete reset tokens used or expired more than the retention ago."""
+    cutoff = datetime.utcnow() - timedelta(hours=RESET_TOKEN_RETENTION_HOURS)
+    return delete_in_batches(db, PasswordReset, or_(
+        PasswordReset.used_at < cutoff,
+        PasswordReset.expires_at < cutoff,
+    ))
+
+
+def prune_refresh_tokens(db: Session) -> int:
+    """Delete refresh tokens rotated, revoked or expired past the retention."""
+    cutoff = datetime.utcnow() - timedelta(days=REFRESH_TOKEN_RETENTION_DAYS)
+    return delete_in_batches(db, RefreshToken, or_(
+        RefreshToken.used_at < cutoff,
+        RefreshToken.revoked_at < cutoff,
+        RefreshToken.expires_at < cutoff,
+    ))
+
+
+def anonymize_user(db: Session, user: User) -> None:
+    """Strip a user's personal data and disable the account. The caller commits."""
+    for model in RETENTION_PURGE_MODELS:
+        db.query(model).filter(model.user_id == user.id).delete(
+            synchronize_session=False)
+
+    user.email = f"deleted-user-{user.id}@deleted.invalid"
+    user.password_hash = UNUSABLE_PASSWORD_HASH
+    user.first_name = None
+    user.last_name = None
+    user.age = None
+    user.gender = None
+    user.country = None
+    user.timezone = None
+    user.is_active = False
+    user.data_retention_until = None
+    revoke_user_tokens(user)
+
+
+def enforce_data_retention(db: Session, batch_size: int = MAINTENANCE_BATCH_SIZE) -> int:
+    """Anonymize every user whose data_retention_until has passed."""
+    total = 0
+    while True:
+        users = db.query(User).filter(
+            User.data_retention_until <= datetime.utcnow(),
+        ).limit(batch_size).all()
+        if not users:
+            return total
+
+        for user in users:
+            anonymize_user(db, user)
+        db.commit()
+
+        for user in users:
+            invalidate_token_state(user.id)
+            user_cache.invalidate(user.id)
+        total += len(users)
+        logger.info("Data retention: anonymized %s users", len(users))
+
+
+MAINTENANCE_JOBS: List[Callable[[Session], int]] = [
+    prune_password_resets,
+    prune_refresh_tokens,
+    enforce_data_retention,
+]
+
+
+# ====== SCHEDULER ======
+
+@contextmanager
+def leader_lock(key: int, bind=engine):
+    """
+    Hold a Postgres session advisory lock while the block runs; yields
+    False when another process already holds it. Other databases (the
+    single-host SQLite fallback) always yield True.
+    """
+    if bind.dialect.name != "postgresql":
+        yield True
+        return
+
+    with bind.connect() as conn:
+        acquired = conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar()
+        conn.commit()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                conn.commit()
+
+
+class MaintenanceScheduler:
+    """Background thread that runs MAINTENANCE_JOBS every interval seconds."""
+
+    def __init__(self, jobs=MAINTENANCE_JOBS, interval: float = MAINTENANCE_INTERVAL_SECONDS,
+                 session_factory=SessionLocal, lock_key: int = MAINTENANCE_LOCK_KEY):
+        self.jobs = jobs
+        self.interval = interval
+        self.session_factory = session_factory
+        self.lock_key = lock_key
+        self.skipped_runs = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.job_stats = {
+            job.__name__: {"runs": 0, "rows": 0, "last_rows": 0,
+                           "last_run": None, "last_error": None}
+            for job in jobs
+        }
+
+    def run_once(self) -> dict:
+        """
+        Run every job once, unless another process holds the maintenance
+        lock; returns rows affected per job.
+        """
+        with leader_lock(self.lock_key) as acquired:
+            if not acquired:
+                self.skipped_runs += 1
+                logger.info("Maintenance pass skipped: another process holds the lock")
+                return {}
+            return self._run_jobs()
+
+    def _run_jobs(self) -> dict:
+        results = {}
+        for job in self.jobs:
+            stats = self.job_stats[job.__name__]
+            db = self.session_factory()
+            started = time.monotonic()
+            try:
+                rows = job(db)
+                stats["last_error"] = None
+            except Exception as e:
+                db.rollback()
+                rows = 0
+                stats["last_error"] = str(e)
+                logger.error("Maintenance job %s failed: %s", job.__name__, e)
+            finally:
+                db.close()
+
+            stats["runs"] += 1
+            stats["rows"] += rows
+            stats["last_rows"] = rows
+            stats["last_run"] = datetime.utcnow().isoformat()
+            results[job.__name__] = rows
+            if rows:
+                logger.info("Maintenance %s: %s rows in %.2fs", job.__name__,
+                            rows, time.monotonic() - started)
+        return results
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+        logger.info("Maintenance scheduler started (every %ss)", self.interval)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        delay = min(STARTUP_DELAY_SECONDS, self.interval)
+        while not self._stop.wait(delay):
+            self.run_once()
+            delay = self.interval
+
+    def stats(self) -> dict:
+        return {"interval": self.interval, "skipped_runs": self.skipped_runs,
+                "jobs": self.job_stats}
+
+
+scheduler = MaintenanceScheduler()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(scheduler.run_once())
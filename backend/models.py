@@ -53,6 +53,19 @@ class UserCreate(BaseModel):
         return v
 
 
+class ImportedUser(UserCreate):
+    """
+    UserCreate for bulk import. The password is optional: users provisioned
+    without one get an unusable hash and set it through password reset.
+    """
+    password: Optional[str] = Field(None, min_length=8, max_length=255)
+
+    @field_validator('password')
+    def validate_password(cls, v):
+        """Enforce password strength when one is given."""
+        return v if v is None else UserCreate.validate_password(v)
+
+
 class UserLogin(BaseModel):
     """Schema for user login."""
     email: EmailStr
@@ -75,19 +88,53 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+class UserSnapshot(BaseModel):
+    """Immutable, cacheable copy of a user row (no password hash)."""
+    id: int
+    email: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    role: RoleEnum
+    is_active: bool
+    is_email_verified: bool
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    country: Optional[str] = None
+    timezone: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    last_login: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
+    @property
+    def display_name(self) -> str:
+        return self.first_name or self.email.split("@")[0]
+
+
 class TokenResponse(BaseModel):
     """Schema for JWT token response."""
     access_token: str
     token_type: str = "bearer"
     expires_in: int
+    refresh_token: Optional[str] = None
+    refresh_expires_in: Optional[int] = None
     user: UserResponse
 
 
+class RefreshTokenRequest(BaseModel):
+    """Schema for exchanging or revoking a refresh token."""
+    refresh_token: str = Field(..., min_length=1, max_length=255)
+
+
 class TokenPayload(BaseModel):
     """Schema for JWT token payload."""
     sub: int  # user_id
     email: str
     role: RoleEnum
+    ver: int = 0  # token_version; tokens issued before it existed carry none
     iat: datetime
     exp: datetime
 
@@ -192,6 +239,7 @@ class AssessmentResultResponse(BaseModel):
     overall_score: Optional[int]
     wellness_stage: Optional[str]
     answer: str
+    question_index: Optional[int] = None
     completed_at: datetime
 
     class Config:
@@ -340,6 +388,15 @@ class LeaderboardEntryResponse(BaseModel):
     total_minutes: int
 
 
+class LeaderboardPositionResponse(BaseModel):
+    """Schema for the caller's leaderboard position."""
+    period: str
+    rank: Optional[int] = None  # None until the caller has practiced in the window
+    total_ranked: int
+    percentile: Optional[float] = None  # Share of ranked users at or below the caller
+    entries: List[LeaderboardEntryResponse]  # The caller and up to K places either side
+
+
 class ForumCategoryResponse(BaseModel):
     """Schema for forum category response."""
     id: int
@@ -0,0 +1,83 @@
+# pagination.py
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, and_
+from datetime import datetime
+from typing import Optional, Tuple
+import base64
+import logging
+
+from database import AssessmentResult
+from models import AssessmentResultResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(completed_at: datetime, row_id: int) -> str:
+    """Encode a (completed_at, id) keyset position as an opaque string."""
+    raw = f"{completed_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor from encode_cursor, raising 400 if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        completed_at, row_id = base64.urlsafe_b64decode(
+            padded).decode("utf-8").split("|")
+        return datetime.fromisoformat(completed_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def keyset_results(query, cursor: Optional[str]):
+    """Order assessment results by (completed_at, id), after the cursor."""
+    if cursor:
+        completed_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            AssessmentResult.completed_at > completed_at,
+            and_(AssessmentResult.completed_at == completed_at,
+                 AssessmentResult.id > row_id),
+        ))
+    return query.order_by(AssessmentResult.completed_at, AssessmentResult.id)
+
+
+def fetch_results_page(query, cursor: Optional[str], limit: int) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one keyset page of assessment results.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    rows = keyset_results(query, cursor).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.completed_at, last.id)
+
+    return rows, next_cursor
+
+
+def stream_results_ndjson(query, cursor: Optional[str], limit: Optional[int] = None) -> StreamingResponse:
+    """
+    Stream assessment results as NDJSON, one JSON object per line.
+    Rows come from a server-side cursor in STREAM_CHUNK_SIZE batches.
+    """
+    query = keyset_results(query, cursor)
+    if limit:
+        query = query.limit(limit)
+
+    def generate():
+        for row in query.yield_per(STREAM_CHUNK_SIZE):
+            yield AssessmentResultResponse.model_validate(row).model_dump_json() + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
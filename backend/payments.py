@@ -12,9 +12,10 @@ import paypalrestsdk
 
 # --- Import your project's files ---
 # (Assumes 'database.py' has DB tables, 'models.py' has Pydantic schemas)
-from database import get_db, User, PaymentLog
-from auth import get_current_user
+from database import get_db, PaymentLog
+from auth import get_current_principal, Principal
 from models import PaymentLogResponse, PaymentCreateBody, PaymentExecuteBody
+from entitlements import grant_level, invalidate_entitlements, level_from_service_type
 
 # --- Configuration ---
 # This PRICING dict is based on your docs.
@@ -63,7 +64,7 @@ def validate_price(level: int, currency: str) -> Optional[Decimal]:
 @router.post("/create-order")
 async def create_payment_order(
     body: PaymentCreateBody,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -173,7 +174,7 @@ async def create_payment_order(
 @router.post("/execute-payment")
 async def execute_payment(
     body: PaymentExecuteBody,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -217,7 +218,11 @@ async def execute_payment(
         # SUCCESS! Update our database
         payment_log.status = "completed"
         payment_log.completed_at = datetime.utcnow()
+        level = level_from_service_type(payment_log.service_type)
+        if level is not None:
+            grant_level(db, current_user.id, level, payment_log.id)
         db.commit()
+        invalidate_entitlements(current_user.id)
 
         logger.info(
             "Payment verified and completed for user %s", current_user.id)
@@ -240,7 +245,7 @@ async def execute_payment(
 
 @router.get("/history", response_model=List[PaymentLogResponse])
 async def get_payment_history(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get user's payment history."""
@@ -265,7 +270,7 @@ async def get_payment_history(
 @router.get("/status/{payment_id}", response_model=PaymentLogResponse)
 async def get_payment_status(
     payment_id: int,  # Assuming your PaymentLog id is an integer
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """Get status of a specific payment."""
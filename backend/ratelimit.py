@@ -0,0 +1,195 @@
+# ratelimit.py
+
+from fastapi import HTTPException, Request, status
+from collections import deque
+from typing import Dict, Tuple
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+
+from cache import get_redis_client, REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.getenv(
+    "RATE_LIMIT_BACKEND", "redis" if REDIS_URL else "local")
+# Take the client IP from X-Forwarded-For (set by the load balancer)
+RATE_LIMIT_TRUST_PROXY = os.getenv(
+    "RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+SWEEP_INTERVAL_SECONDS = 60.0
+REDIS_KEY_PREFIX = "mindfulpath:ratelimit:"
+
+
+def _limit_from_env(name: str, default: str) -> Tuple[int, float]:
+    """Parse a '<requests>/<seconds>' setting such as RATE_LIMIT_LOGIN_IP=20/60."""
+    requests, seconds = os.getenv(name, default).split("/")
+    return int(requests), float(seconds)
+
+
+# ====== BACKENDS ======
+
+class SlidingWindowLimiter:
+    """
+    Per-key sliding-window limiter held in process memory. Each key keeps
+    a ring buffer of its last `limit` request times; idle keys are swept
+    out every SWEEP_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, name: str, limit: int, window: float):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self._buckets: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL_SECONDS
+        self.allowed = 0
+        self.rejected = 0
+
+    def hit(self, key: str) -> Tuple[bool, float]:
+        """Record a request for key. Returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = deque(maxlen=self.limit)
+
+            # A full ring whose oldest entry is still inside the window means
+            # `limit` requests already happened within it
+            if len(bucket) == self.limit and now - bucket[0] < self.window:
+                self.rejected += 1
+                return False, bucket[0] + self.window - now
+
+            bucket.append(now)
+            self.allowed += 1
+            return True, 0.0
+
+    def _sweep(self, now: float) -> None:
+        idle = [k for k, b in self._buckets.items() if now - b[-1] >= self.window]
+        for key in idle:
+            del self._buckets[key]
+        self._next_sweep = now + SWEEP_INTERVAL_SECONDS
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "limit": self.limit,
+                "window": self.window,
+                "keys": len(self._buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+            }
+
+
+class RedisSlidingWindowLimiter:
+    """
+    Sliding-window limiter shared across workers, one sorted set of request
+    times per key. Fails open if Redis is unreachable.
+    """
+
+    def __init__(self, name: str, limit: int, window: float, client):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.client = client
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def hit(self, key: str) -> Tuple[bool, float]:
+        redis_key = f"{REDIS_KEY_PREFIX}{self.name}:{key}"
+        now = time.time()
+        member = f"{now}:{uuid.uuid4().hex[:8]}"
+        try:
+            # Record first, then count, in one round trip; a request over the
+            # limit removes its own entry again
+            pipe = self.client.pipeline()
+            pipe.zremrangebyscore(redis_key, 0, now - self.window)
+            pipe.zadd(redis_key, {member: now})
+            pipe.zcard(redis_key)
+            pipe.zrange(redis_key, 0, 0, withscores=True)
+            pipe.expire(redis_key, math.ceil(self.window))
+            _, _, count, oldest, _ = pipe.execute()
+
+            if count > self.limit:
+                self.client.zrem(redis_key, member)
+                self.rejected += 1
+                return False, oldest[0][1] + self.window - now if oldest else self.window
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Rate limiter {self.name} unavailable: {e}")
+
+        self.allowed += 1
+        return True, 0.0
+
+    def reset(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "limit": self.limit,
+            "window": self.window,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+def make_limiter(name: str, limit: int, window: float):
+    """Build a limiter on the backend selected by RATE_LIMIT_BACKEND."""
+    if RATE_LIMIT_BACKEND == "redis":
+        client = get_redis_client()
+        if client is not None:
+            return RedisSlidingWindowLimiter(name, limit, window, client)
+    return SlidingWindowLimiter(name, limit, window)
+
+
+# ====== AUTH LIMITS ======
+
+LIMITERS = {
+    name: make_limiter(name, *_limit_from_env(env, default))
+    for name, env, default in [
+        ("login_ip", "RATE_LIMIT_LOGIN_IP", "20/60"),
+        ("login_email", "RATE_LIMIT_LOGIN_EMAIL", "10/300"),
+        ("register_ip", "RATE_LIMIT_REGISTER_IP", "10/3600"),
+        ("reset_ip", "RATE_LIMIT_RESET_IP", "5/900"),
+        ("reset_email", "RATE_LIMIT_RESET_EMAIL", "3/3600"),
+    ]
+}
+
+
+def client_ip(request: Request) -> str:
+    """Caller IP, from X-Forwarded-For when behind a trusted proxy."""
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def enforce_rate_limit(name: str, key: str) -> None:
+    """Raise 429 with Retry-After if key is over the named limit."""
+    allowed, retry_after = LIMITERS[name].hit(key)
+    if not allowed:
+        logger.warning(f"Rate limit {name} exceeded for {key}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+def rate_limit_stats() -> list:
+    """Counters for every auth limiter."""
+    return [limiter.stats() for limiter in LIMITERS.values()]
@@ -0,0 +1,302 @@
+# scoring.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, and_, select
+import logging
+
+from database import AssessmentResult, UserScoreSnapshot
+from assessment_data import LIFE_DOMAINS, POINT_VALUES
+
+logger = logging.getLogger(__name__)
+
+QUESTIONS_PER_LEVEL = 12
+
+# Upper bound (inclusive) of each overall score stage (36-144)
+OVERALL_STAGE_THRESHOLDS = [
+    (71, "foundation"),
+    (107, "growth"),
+    (144, "transformation"),
+]
+
+# LIFE_DOMAINS entry -> UserScoreSnapshot column
+DOMAIN_COLUMNS = {
+    "Career & Vocation": "career_vocation",
+    "Financial Well-Being": "financial_well_being",
+    "Physical Health": "physical_health",
+    "Emotional Well-Being": "emotional_well_being",
+    "Family": "family",
+    "Friends": "friends",
+    "Relationships & Love": "relationships_love",
+    "Community & Giving": "community_giving",
+    "Fun & Recreation": "fun_recreation",
+    "Physical Environment": "physical_environment",
+    "Personal Growth": "personal_growth",
+    "Spirituality": "spirituality",
+}
+
+# Maps the stored answer letter to its points inside the database, so the
+# per-domain sums can be computed by the aggregate instead of in Python.
+POINTS_EXPRESSION = case(
+    *[(AssessmentResult.answer == letter, points)
+      for letter, points in POINT_VALUES.items()],
+    else_=0,
+)
+
+
+def get_overall_stage_key(overall_score: int) -> str:
+    """Get the OVERALL_SCORE_STAGES key for an overall score."""
+    for upper_bound, stage in OVERALL_STAGE_THRESHOLDS:
+        if overall_score <= upper_bound:
+            return stage
+    return OVERALL_STAGE_THRESHOLDS[-1][1]
+
+
+def levels_to_bitmask(levels) -> int:
+    """Encode assessment levels (1-based) as a bitmask."""
+    mask = 0
+    for level in levels:
+        mask |= 1 << (level - 1)
+    return mask
+
+
+def bitmask_to_levels(mask: int) -> list:
+    """Decode a completed-levels bitmask into a sorted list of levels."""
+    return [bit + 1 for bit in range(mask.bit_length()) if mask & (1 << bit)]
+
+
+# Rows stored before attempts were recorded count as attempt 0
+ATTEMPT_EXPRESSION = func.coalesce(AssessmentResult.attempt, 0)
+
+
+# ====== GROUPED AGGREGATE ======
+
+def latest_attempt_only(query, *criteria):
+    """
+    Restrict an AssessmentResult query (and the attempt lookup) to the
+    latest attempt of each (user, level), so a retake replaces that
+    level's earlier answers instead of adding to them.
+    """
+    latest = select(
+        AssessmentResult.user_id,
+        AssessmentResult.level,
+        func.max(ATTEMPT_EXPRESSION).label("attempt"),
+    ).where(*criteria).group_by(
+        AssessmentResult.user_id,
+        AssessmentResult.level,
+    ).subquery()
+
+    return query.select_from(AssessmentResult).join(latest, and_(
+        AssessmentResult.user_id == latest.c.user_id,
+        AssessmentResult.level == latest.c.level,
+        ATTEMPT_EXPRESSION == latest.c.attempt,
+    )).filter(*criteria)
+
+
+def fetch_score_rows(db: Session, user_id: int) -> list:
+    """
+    Load (domain, level, points, answered) rows for a user's latest
+    attempt at each level. One grouped aggregate replaces the per-domain
+    queries.
+    """
+    return latest_attempt_only(db.query(
+        AssessmentResult.domain,
+        AssessmentResult.level,
+        func.sum(POINTS_EXPRESSION),
+        func.count(AssessmentResult.id),
+    ), AssessmentResult.user_id == user_id).group_by(
+        AssessmentResult.domain,
+        AssessmentResult.level,
+    ).all()
+
+
+def count_answers_by_level(db: Session, user_id: int) -> dict:
+    """Get {level: answered} for a user's latest attempts with one COUNT ... GROUP BY level."""
+    return dict(
+        latest_attempt_only(db.query(
+            AssessmentResult.level,
+            func.count(AssessmentResult.id),
+        ), AssessmentResult.user_id == user_id).group_by(
+            AssessmentResult.level,
+        ).all()
+    )
+
+
+def build_score_summary(rows) -> dict:
+    """
+    Fold grouped (domain, level, points, answered) rows into the scores
+    used by the report, progress and admin views.
+    """
+    domain_scores = {domain: 0 for domain in LIFE_DOMAINS}
+    level_counts = {}
+    total_answers = 0
+
+    for domain, level, points, answered in rows:
+        if domain in domain_scores:
+            domain_scores[domain] += int(points or 0)
+        level_counts[level] = level_counts.get(level, 0) + answered
+        total_answers += answered
+
+    return {
+        "domain_scores": domain_scores,
+        "overall_score": sum(domain_scores.values()),
+        "level_counts": level_counts,
+        "completed_levels": sorted(level_counts),
+        "total_answers": total_answers,
+    }
+
+
+def get_user_score_summary(db: Session, user_id: int) -> dict:
+    """Get cumulative domain scores, overall score and level counts."""
+    return build_score_summary(fetch_score_rows(db, user_id))
+
+
+# ====== SCORE SNAPSHOTS ======
+
+def fill_snapshot(snapshot: UserScoreSnapshot, summary: dict) -> UserScoreSnapshot:
+    """Overwrite a snapshot with a freshly aggregated summary."""
+    for domain, column in DOMAIN_COLUMNS.items():
+        setattr(snapshot, column, summary["domain_scores"].get(domain, 0))
+    snapshot.overall_score = summary["overall_score"]
+    snapshot.wellness_stage = get_overall_stage_key(summary["overall_score"])
+    snapshot.completed_levels = levels_to_bitmask(summary["completed_levels"])
+    snapshot.total_answers = summary["total_answers"]
+    return snapshot
+
+
+def snapshot_to_summary(snapshot: UserScoreSnapshot) -> dict:
+    """Read a snapshot back into the summary shape used by the endpoints."""
+    domain_scores = {
+        domain: getattr(snapshot, column) or 0
+        for domain, column in DOMAIN_COLUMNS.items()
+    }
+    return {
+        "domain_scores": domain_scores,
+        "overall_score": snapshot.overall_score,
+        "wellness_stage": snapshot.wellness_stage,
+        "completed_levels": bitmask_to_levels(snapshot.completed_levels),
+        "total_answers": snapshot.total_answers,
+    }
+
+
+def apply_submission_to_snapshot(db: Session, user_id: int, level: int, rows: list) -> UserScoreSnapshot:
+    """
+    Add freshly inserted answer rows to the user's snapshot; a retake
+    replaces the level's earlier contribution instead of adding to it.
+    Must run in the same transaction as the insert; the caller commits.
+    """
+    # Lock the row so concurrent submits for one user apply one after
+    # another instead of overwriting each other's read-modify-write
+    snapshot = db.query(UserScoreSnapshot).filter(
+        UserScoreSnapshot.user_id == user_id,
+    ).with_for_update().populate_existing().first()
+
+    if snapshot is None:
+        # No snapshot yet (first submission or not backfilled): seed it
+        # from the stored rows, which already include this submission.
+        snapshot = fill_snapshot(UserScoreSnapshot(user_id=user_id),
+                                 get_user_score_summary(db, user_id))
+        db.add(snapshot)
+        return snapshot
+
+    if (snapshot.completed_levels or 0) & levels_to_bitmask([level]):
+        # Retake: the new attempt supersedes the level's earlier answers,
+        # so rebuild from the latest-attempt aggregate
+        return fill_snapshot(snapshot, get_user_score_summary(db, user_id))
+
+    for row in rows:
+        column = DOMAIN_COLUMNS.get(row["domain"])
+        if column:
+            setattr(snapshot, column,
+                    (getattr(snapshot, column) or 0) + row["domain_score"])
+
+    snapshot.overall_score = sum(
+        getattr(snapshot, column) or 0 for column in DOMAIN_COLUMNS.values())
+    snapshot.wellness_stage = get_overall_stage_key(snapshot.overall_score)
+    snapshot.completed_levels = (
+        snapshot.completed_levels or 0) | levels_to_bitmask([level])
+    snapshot.total_answers = (snapshot.total_answers or 0) + len(rows)
+    return snapshot
+
+
+def get_user_scores(db: Session, user_id: int) -> dict:
+    """
+    Get a user's cumulative scores with a primary-key lookup.
+    Falls back to the grouped aggregate for users without a snapshot.
+    """
+    snapshot = db.get(UserScoreSnapshot, user_id)
+    if snapshot is not None:
+        return snapshot_to_summary(snapshot)
+
+    summary = get_user_score_summary(db, user_id)
+    summary["wellness_stage"] = get_overall_stage_key(summary["overall_score"])
+    return summary
+
+
+def backfill_score_snapshots(db: Session, batch_size: int = 500) -> int:
+    """
+    Rebuild snapshots for every user with stored answers.
+    Users are processed in id-ordered batches, one aggregate per batch.
+    Returns the number of snapshots written.
+    """
+    written = 0
+    last_user_id = 0
+
+    while True:
+        user_ids = [
+            row[0] for row in db.query(AssessmentResult.user_id).filter(
+                AssessmentResult.user_id > last_user_id,
+            ).distinct().order_by(AssessmentResult.user_id).limit(batch_size)
+        ]
+        if not user_ids:
+            break
+
+        rows_by_user = {user_id: [] for user_id in user_ids}
+        grouped = latest_attempt_only(db.query(
+            AssessmentResult.user_id,
+            AssessmentResult.domain,
+            AssessmentResult.level,
+            func.sum(POINTS_EXPRESSION),
+            func.count(AssessmentResult.id),
+        ), AssessmentResult.user_id.in_(user_ids)).group_by(
+            AssessmentResult.user_id,
+            AssessmentResult.domain,
+            AssessmentResult.level,
+        )
+        for user_id, domain, level, points, answered in grouped:
+            rows_by_user[user_id].append((domain, level, points, answered))
+
+        existing = {
+            snapshot.user_id: snapshot
+            for snapshot in db.query(UserScoreSnapshot).filter(
+                UserScoreSnapshot.user_id.in_(user_ids))
+        }
+
+        for user_id, rows in rows_by_user.items():
+            snapshot = existing.get(user_id)
+            if snapshot is None:
+                snapshot = UserScoreSnapshot(user_id=user_id)
+                db.add(snapshot)
+            fill_snapshot(snapshot, build_score_summary(rows))
+
+        db.commit()
+        written += len(user_ids)
+        last_user_id = user_ids[-1]
+        logger.info("Score snapshots backfilled: %s", written)
+
+    return written
+
+
+if __name__ == "__main__":
+    # Backfill command: python scoring.py [batch_size]
+    import sys
+    from database import SessionLocal, init_db
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    session = SessionLocal()
+    try:
+        batch = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+        total = backfill_score_snapshots(session, batch_size=batch)
+        logger.info("Backfill complete: %s snapshots", total)
+    finally:
+        session.close()
@@ -0,0 +1,274 @@
+# streaks.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Iterable, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import logging
+import os
+import time
+
+import numpy as np
+
+from database import User, DailyPractice, Streak
+
+logger = logging.getLogger(__name__)
+
+# Used for users without a (valid) timezone on their profile
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC")
+STREAK_BATCH_SIZE = int(os.getenv("STREAK_BATCH_SIZE", "5000"))
+# Advisory lock held by the bulk recompute command (see maintenance.leader_lock)
+STREAK_RECOMPUTE_LOCK_KEY = int(os.getenv("STREAK_RECOMPUTE_LOCK_KEY", "7240025"))
+OVERALL_STREAK = "all"
+
+
+# ====== LOCAL DAYS ======
+
+@lru_cache(maxsize=1024)
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo for an IANA name, falling back to DEFAULT_TIMEZONE."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown timezone {name!r}; using {DEFAULT_TIMEZONE}")
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def local_today(timezone_name: Optional[str], now: Optional[datetime] = None) -> date:
+    """The current calendar day in the given timezone."""
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(get_zone(timezone_name)).date()
+
+
+# ====== INCREMENTAL UPDATE ======
+
+def update_streak(db: Session, user_id: int, practice_type: str, today: date) -> Streak:
+    """
+    Extend or restart a streak for a practice logged on the user's local
+    `today`. Commits; returns the streak row. recompute_streaks rebuilds
+    the same values from daily_practice.
+    """
+    yesterday = date.fromordinal(today.toordinal() - 1)
+
+    # Locked so a concurrent recompute batch and this update apply in turn
+    streak = db.query(Streak).filter(
+        Streak.user_id == user_id,
+        Streak.practice_type == practice_type,
+    ).with_for_update().first()
+
+    if not streak:
+        streak = Streak(
+            user_id=user_id,
+            practice_type=practice_type,
+            current_streak=0,
+            longest_streak=0
+        )
+        db.add(streak)
+
+    # Already counted today
+    if streak.last_practice_date == today:
+        return streak
+
+    if streak.last_practice_date == yesterday:
+        streak.current_streak += 1
+    else:
+        # Streak broken or first practice
+        streak.current_streak = 1
+        streak.streak_started_at = today
+
+    streak.last_practice_date = today
+    streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+
+    db.commit()
+    return streak
+
+
+# ====== BULK RECOMPUTE ======
+
+def summarize_runs(groups: np.ndarray, days: np.ndarray, today: np.ndarray) -> dict:
+    """
+    Run-length encode practice days per group in one vectorized pass.
+
+    groups, days and today are int64 arrays with one entry per practice:
+    any group id, the practice day as an ordinal, and that group's local
+    today as an ordinal. Duplicates are allowed. Returns per-group arrays:
+    group, current (0 once the last run ended before yesterday), longest,
+    started (first day of the last run) and last (last practice day).
+    """
+    if len(groups) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return {"group": empty, "current": empty, "longest": empty,
+                "started": empty, "last": empty}
+
+    order = np.lexsort((days, groups))
+    groups, days, today = groups[order], days[order], today[order]
+
+    new_group = np.ones(len(groups), dtype=bool)
+    new_group[1:] = groups[1:] != groups[:-1]
+    distinct = new_group.copy()
+    distinct[1:] |= days[1:] != days[:-1]
+    groups, days, today, new_group = groups[distinct], days[distinct], today[distinct], new_group[distinct]
+
+    # A run starts at each group's first day and after every gap
+    run_start = new_group.copy()
+    run_start[1:] |= days[1:] - days[:-1] != 1
+    starts = np.flatnonzero(run_start)
+    ends = np.append(starts[1:], len(days)) - 1
+    lengths = ends - starts + 1
+
+    # Runs are ordered by group, so each group's runs are contiguous
+    first_runs = np.flatnonzero(new_group[starts])
+    last_runs = np.append(first_runs[1:], len(starts)) - 1
+
+    last_day = days[ends[last_runs]]
+    alive = last_day >= today[ends[last_runs]] - 1
+    return {
+        "group": groups[starts[first_runs]],
+        "current": np.where(alive, lengths[last_runs], 0),
+        "longest": np.maximum.reduceat(lengths, first_runs),
+        "started": days[starts[last_runs]],
+        "last": last_day,
+    }
+
+
+def compute_streak_rows(db: Session, user_ids: Iterable[int], now: Optional[datetime] = None) -> list:
+    """Streak rows (overall and per practice type) for users, from their practice log."""
+    user_ids = list(user_ids)
+    practices = db.query(
+        DailyPractice.user_id,
+        DailyPractice.practice_type,
+        DailyPractice.logged_date,
+    ).filter(DailyPractice.user_id.in_(user_ids)).all()
+    if not practices:
+        return []
+
+    owners, types, logged = zip(*practices)
+    count = len(practices)
+    slots = {}
+    type_codes = np.fromiter(
+        (slots.setdefault(name, len(slots)) for name in types), dtype=np.int64, count=count)
+    type_names = [OVERALL_STREAK] + list(slots)
+    users, user_index = np.unique(
+        np.fromiter(owners, dtype=np.int64, count=count), return_inverse=True)
+    days = np.fromiter((day.toordinal() for day in logged), dtype=np.int64, count=count)
+
+    # Local today once per timezone rather than once per user
+    zones = dict(db.query(User.id, User.timezone).filter(User.id.in_(user_ids)))
+    today_by_zone = {name: local_today(name, now).toordinal() for name in set(zones.values())}
+    fallback = local_today(None, now).toordinal()
+    user_today = np.array(
+        [today_by_zone.get(zones.get(int(user_id)), fallback) for user_id in users],
+        dtype=np.int64)[user_index]
+
+    # Group id = user position * stride + type slot; slot 0 is the overall streak
+    stride = len(type_names)
+    base = user_index.astype(np.int64) * stride
+    runs = summarize_runs(
+        np.concatenate([base, base + type_codes + 1]),
+        np.concatenate([days, days]),
+        np.concatenate([user_today, user_today]),
+    )
+
+    rows = []
+    for group, current, longest, started, last in zip(
+            runs["group"], runs["current"], runs["longest"], runs["started"], runs["last"]):
+        rows.append({
+            "user_id": int(users[group // stride]),
+            "practice_type": type_names[group % stride],
+            "current_streak": int(current),
+            "longest_streak": int(longest),
+            "last_practice_date": date.fromordinal(int(last)),
+            "streak_started_at": date.fromordinal(int(started)) if current else None,
+        })
+    return rows
+
+
+def write_streak_batch(db: Session, user_ids: list, now: Optional[datetime] = None) -> int:
+    """
+    Recompute and upsert the streak rows of one batch of users in a
+    single transaction. Existing rows are locked before daily_practice is
+    read, so a practice logged meanwhile is either already visible or
+    waits for this batch. Returns the number of rows written.
+    """
+    existing = {
+        (user_id, practice_type): streak_id
+        for streak_id, user_id, practice_type in db.query(
+            Streak.id, Streak.user_id, Streak.practice_type,
+        ).filter(Streak.user_id.in_(user_ids)).with_for_update()
+    }
+
+    rows = compute_streak_rows(db, user_ids, now)
+    updates, inserts = [], []
+    for row in rows:
+        streak_id = existing.get((row["user_id"], row["practice_type"]))
+        if streak_id is None:
+            inserts.append(row)
+        else:
+            updates.append({"id": streak_id, **row})
+
+    if updates:
+        # ORM bulk UPDATE by primary key (one executemany)
+        db.execute(update(Streak), updates)
+    if inserts:
+        # Core executemany: the ORM bulk path would insert row by row
+        # to fetch each new primary key
+        db.execute(insert(Streak.__table__), inserts)
+    db.commit()
+    return len(rows)
+
+
+def recompute_streaks(db: Session, batch_size: int = STREAK_BATCH_SIZE, now: Optional[datetime] = None) -> int:
+    """
+    Rebuild every streak from daily_practice, batch_size users at a time.
+    Broken streaks drop to 0 even if the user has not logged since.
+    Returns the number of streak rows written.
+    """
+    written = 0
+    last_user_id = 0
+    started = time.perf_counter()
+
+    while True:
+        user_ids = [
+            row[0] for row in db.query(DailyPractice.user_id).filter(
+                DailyPractice.user_id > last_user_id,
+            ).distinct().order_by(DailyPractice.user_id).limit(batch_size)
+        ]
+        if not user_ids:
+            break
+
+        try:
+            written += write_streak_batch(db, user_ids, now)
+        except IntegrityError:
+            # A practice log created one of the new rows first; the retry
+            # sees it and updates it instead
+            db.rollback()
+            written += write_streak_batch(db, user_ids, now)
+        last_user_id = user_ids[-1]
+
+    logger.info("Streaks recomputed: %s rows in %.2fs",
+                written, time.perf_counter() - started)
+    return written
+
+
+if __name__ == "__main__":
+    # Bulk recompute command, meant for a daily cron / scheduled task:
+    # python streaks.py [batch_size]
+    import sys
+    from database import SessionLocal, init_db
+    from maintenance import leader_lock
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    with leader_lock(STREAK_RECOMPUTE_LOCK_KEY) as acquired:
+        if not acquired:
+            logger.info("Streak recompute already running elsewhere; exiting")
+            sys.exit(0)
+        session = SessionLocal()
+        try:
+            batch = int(sys.argv[1]) if len(sys.argv) > 1 else STREAK_BATCH_SIZE
+            recompute_streaks(session, batch_size=batch)
+        finally:
+            session.close()
@@ -9,6 +9,47 @@ from sqlalchemy.orm import sessionmaker
 from database import Base, AssessmentResult, User, RoleEnum
 # Import the data this test file actually uses
 from assessment_data import POINT_VALUES, DOMAIN_FEEDBACK, OVERALL_SCORE_STAGES
+from scoring import (
+    get_user_score_summary,
+    get_user_scores,
+    count_answers_by_level,
+    apply_submission_to_snapshot,
+    backfill_score_snapshots,
+)
+from database import UserScoreSnapshot, PaymentLog, AssessmentSubmission, UserEntitlement
+from entitlements import (
+    check_level_access,
+    grant_level,
+    revoke_level,
+    invalidate_entitlements,
+    sync_entitlements_from_payments,
+)
+from sqlalchemy import insert
+from assessment import (
+    build_answer_rows,
+    build_level_progress,
+    QUESTION_PAYLOADS,
+    etag_matches,
+    answers_digest,
+    find_duplicate_submission,
+    next_attempt,
+    store_submission,
+)
+from pagination import fetch_results_page, encode_cursor, decode_cursor
+from tracking import EventTracker
+from database import UserTracking
+from analytics import build_cohort, stage_histogram, summarize_cohort
+from async_db import run_db, async_database_url
+import db_pool
+from db_pool import pool_options, configure_engine, pool_stats
+from database import migrate_schema
+from sqlalchemy import inspect
+from sqlalchemy import text
+from datetime import datetime
+import asyncio
+import json
+import numpy as np
+from fastapi import HTTPException
 # (Removed the large, unused import block from models.py)
 # --- End of Fix ---
 
@@ -101,3 +142,457 @@ class TestScoringLogic:
 
         # Verify it's in high alignment range
         assert 9 <= total_score <= 12
+
+    def test_score_summary_aggregate(self, db):
+        """Test the grouped scoring engine against stored answers."""
+        user = User(
+            email="summary@example.com",
+            password_hash="hashed",
+            role=RoleEnum.USER,
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        )
+        db.add(user)
+        db.flush()
+
+        for level, answer in [(1, "A"), (2, "B"), (3, "D")]:
+            db.add(AssessmentResult(user_id=user.id, level=level,
+                                    domain="Career & Vocation",
+                                    domain_score=POINT_VALUES[answer],
+                                    answer=answer))
+        db.add(AssessmentResult(user_id=user.id, level=1, domain="Family",
+                                domain_score=2, answer="C"))
+        db.commit()
+
+        summary = get_user_score_summary(db, user.id)
+        assert summary["domain_scores"]["Career & Vocation"] == 8
+        assert summary["domain_scores"]["Family"] == 2
+        assert summary["domain_scores"]["Spirituality"] == 0
+        assert summary["overall_score"] == 10
+        assert summary["level_counts"] == {1: 2, 2: 1, 3: 1}
+        assert summary["completed_levels"] == [1, 2, 3]
+        assert summary["total_answers"] == 4
+
+
+class TestScoreSnapshot:
+    """Test the persisted per-user score snapshot."""
+
+    def _make_user(self, db, email):
+        user = User(
+            email=email,
+            password_hash="hashed",
+            role=RoleEnum.USER,
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        )
+        db.add(user)
+        db.flush()
+        return user
+
+    def _submit(self, db, user_id, level, answer):
+        rows = build_answer_rows(
+            user_id, level, {str(i): answer for i in range(12)})
+        db.execute(insert(AssessmentResult), rows)
+        apply_submission_to_snapshot(db, user_id, level, rows)
+        db.commit()
+
+    def test_incremental_updates_match_aggregate(self, db):
+        """Test that snapshot reads equal a fresh aggregate after submits."""
+        user = self._make_user(db, "snap@example.com")
+        self._submit(db, user.id, 1, "A")
+        self._submit(db, user.id, 2, "C")
+
+        scores = get_user_scores(db, user.id)
+        fresh = get_user_score_summary(db, user.id)
+        assert scores["domain_scores"] == fresh["domain_scores"]
+        assert scores["overall_score"] == 72
+        assert scores["wellness_stage"] == "growth"
+        assert scores["completed_levels"] == [1, 2]
+        assert scores["total_answers"] == 24
+
+    def test_retake_replaces_level(self, db):
+        """Test a retake replaces the level's answers instead of adding to them."""
+        user = self._make_user(db, "retake@example.com")
+        for level, answer in [(1, "A"), (2, "D"), (1, "C")]:
+            rows = build_answer_rows(
+                user.id, level, {str(i): answer for i in range(12)})
+            store_submission(db, user.id, level, rows, None, answers_digest(rows))
+
+        scores = get_user_scores(db, user.id)
+        assert scores["overall_score"] == 36
+        assert scores["total_answers"] == 24
+        assert scores["domain_scores"] == get_user_score_summary(db, user.id)["domain_scores"]
+        assert count_answers_by_level(db, user.id) == {1: 12, 2: 12}
+
+        db.query(UserScoreSnapshot).delete()
+        db.commit()
+        backfill_score_snapshots(db)
+        assert db.get(UserScoreSnapshot, user.id).overall_score == 36
+
+    def test_progress_counts(self, db):
+        """Test per-level answer counts feeding the progress response."""
+        user = self._make_user(db, "progress@example.com")
+        self._submit(db, user.id, 1, "A")
+
+        level_counts = count_answers_by_level(db, user.id)
+        assert level_counts == {1: 12}
+
+        progress = build_level_progress(level_counts, {1}, is_admin=False)
+        assert progress["level_1"]["completed"] is True
+        assert progress["level_1"]["questions_answered"] == 12
+        assert progress["level_2"]["questions_answered"] == 0
+        assert progress["level_2"]["unlocked"] is False
+        assert progress["level_3"]["price"]["USD"] == 10
+
+    def test_history_keyset_pages(self, db):
+        """Test that keyset pages cover every row exactly once."""
+        user = self._make_user(db, "history@example.com")
+        self._submit(db, user.id, 1, "A")
+        self._submit(db, user.id, 2, "B")
+
+        query = db.query(AssessmentResult).filter(
+            AssessmentResult.user_id == user.id)
+        seen, cursor = [], None
+        while True:
+            rows, cursor = fetch_results_page(query, cursor, 10)
+            seen.extend(r.id for r in rows)
+            if cursor is None:
+                break
+
+        assert len(seen) == 24
+        assert len(set(seen)) == 24
+
+    def test_cursor_round_trip(self):
+        """Test cursor encoding and rejection of garbage."""
+        stamp = datetime(2025, 1, 2, 3, 4, 5, 678)
+        assert decode_cursor(encode_cursor(stamp, 42)) == (stamp, 42)
+        with pytest.raises(HTTPException):
+            decode_cursor("not-a-cursor")
+
+    def test_backfill(self, db):
+        """Test that backfill builds snapshots from existing rows."""
+        user = self._make_user(db, "backfill@example.com")
+        rows = build_answer_rows(
+            user.id, 1, {str(i): "B" for i in range(12)})
+        db.execute(insert(AssessmentResult), rows)
+        db.commit()
+        assert db.get(UserScoreSnapshot, user.id) is None
+
+        assert backfill_score_snapshots(db, batch_size=1) == 1
+        snapshot = db.get(UserScoreSnapshot, user.id)
+        assert snapshot.overall_score == 36
+        assert snapshot.wellness_stage == "foundation"
+        assert snapshot.completed_levels == 0b001
+
+
+class TestSubmission:
+    """Test answer validation for bulk submission."""
+
+    def test_build_answer_rows(self):
+        """Test that a valid answer map becomes one row per question."""
+        answers = {str(i): "abcd"[i % 4] for i in range(12)}
+        rows = build_answer_rows(7, 1, answers)
+
+        assert len(rows) == 12
+        assert rows[0]["answer"] == "A"
+        assert rows[0]["domain_score"] == 4
+        assert rows[3]["domain_score"] == 1
+        assert [r["question_index"] for r in rows] == list(range(12))
+        assert all("question_text" not in r for r in rows)
+
+    def test_build_answer_rows_reports_all_invalid(self):
+        """Test that every invalid answer is reported in one error."""
+        answers = {str(i): "A" for i in range(12)}
+        answers["2"] = "E"
+        answers["5"] = ""
+
+        with pytest.raises(HTTPException) as exc:
+            build_answer_rows(7, 1, answers)
+        assert exc.value.status_code == 400
+        assert "2: E" in exc.value.detail
+        assert "5: " in exc.value.detail
+
+    def test_duplicate_submission_detection(self, db):
+        """Test that retries are matched by key or by identical answers."""
+        user = User(
+            email="retry@example.com",
+            password_hash="hashed",
+            role=RoleEnum.USER,
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        )
+        db.add(user)
+        db.flush()
+
+        rows = build_answer_rows(user.id, 1, {str(i): "A" for i in range(12)})
+        digest = answers_digest(rows)
+        assert next_attempt(db, user.id, 1) == 1
+        assert find_duplicate_submission(db, user.id, 1, None, digest) is None
+
+        db.add(AssessmentSubmission(
+            user_id=user.id, level=1, attempt=1,
+            idempotency_key="key-1", answers_digest=digest))
+        db.commit()
+
+        assert find_duplicate_submission(db, user.id, 1, None, digest).attempt == 1
+        assert find_duplicate_submission(db, user.id, 1, "key-1", "other").attempt == 1
+        assert find_duplicate_submission(db, user.id, 1, "key-2", digest) is None
+
+        retake = build_answer_rows(user.id, 1, {str(i): "B" for i in range(12)})
+        assert find_duplicate_submission(
+            db, user.id, 1, None, answers_digest(retake)) is None
+        assert next_attempt(db, user.id, 1) == 2
+
+        with pytest.raises(HTTPException) as exc:
+            find_duplicate_submission(db, user.id, 2, "key-1", digest)
+        assert exc.value.status_code == 409
+
+
+class TestEntitlements:
+    """Test cached paid-level access checks."""
+
+    def _make_user(self, db):
+        user = User(
+            email="paid@example.com",
+            password_hash="hashed",
+            role=RoleEnum.USER,
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        )
+        db.add(user)
+        db.flush()
+        invalidate_entitlements(user.id)
+        return user
+
+    def test_grant_and_revoke(self, db):
+        """Test that grants and refunds are visible after invalidation."""
+        user = self._make_user(db)
+        assert check_level_access(db, user.id, 1)
+        assert not check_level_access(db, user.id, 2)
+
+        grant_level(db, user.id, 2)
+        db.commit()
+        invalidate_entitlements(user.id)
+        assert check_level_access(db, user.id, 2)
+
+        revoke_level(db, user.id, 2)
+        db.commit()
+        invalidate_entitlements(user.id)
+        assert not check_level_access(db, user.id, 2)
+
+    def test_denial_rechecked(self, db):
+        """Test that a level granted on another worker is seen despite a cached denial."""
+        user = self._make_user(db)
+        assert not check_level_access(db, user.id, 2)
+
+        # Written without invalidation, as another worker would
+        db.add(UserEntitlement(user_id=user.id, level=2))
+        db.commit()
+        assert check_level_access(db, user.id, 2)
+
+    def test_sync_from_payments(self, db):
+        """Test that completed level payments become entitlements."""
+        user = self._make_user(db)
+        for level, status in [(2, "completed"), (3, "pending")]:
+            db.add(PaymentLog(
+                user_id=user.id, amount=5, currency="USD",
+                payment_gateway="paypal", transaction_id=f"PAY-{level}",
+                service_type=f"level_{level}", status=status,
+            ))
+        db.commit()
+
+        assert sync_entitlements_from_payments(db) == 1
+        assert sync_entitlements_from_payments(db) == 0
+        assert check_level_access(db, user.id, 2)
+        assert not check_level_access(db, user.id, 3)
+
+
+class TestQuestionPayloads:
+    """Test pre-serialized question payloads."""
+
+    def test_language_slices(self):
+        """Test that a language slice only carries that language."""
+        body, etag = QUESTION_PAYLOADS[(1, "de")]
+        payload = json.loads(body)
+
+        assert payload["total_questions"] == 12
+        assert set(payload["questions"][0]) == {"domain", "question"}
+        assert payload["questions"][0]["question"].startswith("Wenn")
+        assert len(body) < len(QUESTION_PAYLOADS[(1, None)][0])
+        assert etag != QUESTION_PAYLOADS[(1, "fr")][1]
+
+    def test_etag_matches(self):
+        """Test If-None-Match parsing."""
+        _, etag = QUESTION_PAYLOADS[(2, None)]
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", {etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('"other"', etag)
+
+
+class TestEventTracker:
+    """Test batched tracking event ingestion."""
+
+    def test_flush_writes_batches(self, db):
+        """Test that queued events are bulk-written in batch_size chunks."""
+        tracker = EventTracker(
+            session_factory=TestingSessionLocal, maxsize=10, batch_size=4)
+        for i in range(7):
+            assert tracker.track(1, "content_viewed", {"content_id": i})
+
+        assert db.query(UserTracking).count() == 0
+        assert tracker.flush() == 7
+        assert db.query(UserTracking).count() == 7
+        assert tracker.stats()["batches"] == 2
+
+    def test_full_queue_drops(self, db):
+        """Test that a full queue drops and counts events instead of blocking."""
+        tracker = EventTracker(
+            session_factory=TestingSessionLocal, maxsize=2, batch_size=10)
+        results = [tracker.track(1, "content_browsed") for _ in range(3)]
+
+        assert results == [True, True, False]
+        assert tracker.stats()["dropped"] == 1
+
+    def test_stop_drains_queue(self, db):
+        """Test that stopping the flusher writes pending events."""
+        tracker = EventTracker(
+            session_factory=TestingSessionLocal, batch_size=100,
+            flush_interval=60)
+        tracker.start()
+        tracker.track(1, "assessment_completed", {"level": 1})
+        tracker.stop()
+
+        assert db.query(UserTracking).count() == 1
+
+
+class TestCohortAnalytics:
+    """Test the vectorized cohort scoring engine."""
+
+    def test_build_cohort(self):
+        """Test folding result columns into per-user matrices."""
+        # (user_id, domain_index, level, points)
+        columns = np.array([
+            [10, 0, 1, 4],
+            [10, 0, 2, 3],
+            [10, 1, 1, 2],
+            [20, 0, 1, 1],
+            [20, -1, 1, 4],
+        ], dtype=np.int64)
+        cohort = build_cohort(columns)
+
+        assert list(cohort["user_ids"]) == [10, 20]
+        assert cohort["domain_scores"][0, 0] == 7
+        assert cohort["domain_scores"][0, 1] == 2
+        assert cohort["domain_scores"][1].sum() == 1
+        assert list(cohort["level_counts"][0]) == [2, 1, 0]
+
+        summary = summarize_cohort(cohort)
+        assert summary["users"] == 2
+        assert summary["level_funnel"][0]["started"] == 2
+        assert summary["level_funnel"][0]["completed"] == 0
+
+    def test_stage_histogram(self):
+        """Test stage boundaries match OVERALL_SCORE_STAGES."""
+        histogram = stage_histogram(np.array([36, 71, 72, 107, 108, 144]))
+        assert histogram == {"foundation": 2, "growth": 2, "transformation": 2}
+
+
+class TestRunDB:
+    """Test the DB_ASYNC switch for the hot routes."""
+
+    def test_async_database_url(self):
+        """Test sync URLs map to their asyncio drivers."""
+        assert async_database_url("postgresql://u:p@db:5432/app") == \
+            "postgresql+asyncpg://u:p@db:5432/app"
+        assert async_database_url("sqlite:////tmp/dev.db") == \
+            "sqlite+aiosqlite:////tmp/dev.db"
+
+    def test_default_runs_on_get_db_session(self, db):
+        """Test that without DB_ASYNC the work runs on the request's session."""
+        user = User(email="runner@example.com", password_hash="x",
+                    role=RoleEnum.USER)
+        db.add(user)
+        db.commit()
+
+        sessions = []
+
+        def count(session, user_id):
+            sessions.append(session)
+            return count_answers_by_level(session, user_id)
+
+        assert asyncio.run(run_db(db, count, user.id)) == {}
+        assert sessions == [db]
+
+
+class TestDBPool:
+    """Test pool configuration and telemetry."""
+
+    def test_memory_sqlite_keeps_default_pool(self):
+        """Test in-memory SQLite is left on its single-connection pool."""
+        assert pool_options("sqlite:///:memory:") == {}
+        assert pool_options("sqlite://") == {}
+        assert pool_options("sqlite:////tmp/dev.db")["pool_size"] == db_pool.DB_POOL_SIZE
+
+    def test_sqlite_pragmas_and_metrics(self, tmp_path, monkeypatch):
+        """Test WAL tuning, checkout counters and the idle pre-ping."""
+        url = f"sqlite:///{tmp_path / 'pool.db'}"
+        monkeypatch.setattr(db_pool, "DB_POOL_PRE_PING_IDLE_SECONDS", 0)
+        pool_engine = configure_engine(create_engine(
+            url, connect_args={"check_same_thread": False}, **pool_options(url)))
+
+        with pool_engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        with pool_engine.connect():
+            pass
+
+        stats = pool_stats(pool_engine)
+        assert stats["connects"] == 1
+        assert stats["checkouts"] == 2
+        assert stats["pings"] == 1
+        assert stats["checked_out"] == 0
+
+        # Counters survive the pool being recreated
+        pool_engine.dispose()
+        with pool_engine.connect():
+            pass
+        assert pool_stats(pool_engine)["checkouts"] == 3
+        pool_engine.dispose()
+
+
+class TestSchemaMigration:
+    """Test upgrading tables created before later columns existed."""
+
+    def test_adds_missing_columns_once(self, tmp_path):
+        """Test migrate_schema adds new columns and indexes idempotently."""
+        legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with legacy.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR(255))"))
+            conn.execute(text(
+                "CREATE TABLE assessment_results (id INTEGER PRIMARY KEY, "
+                "user_id INTEGER, level INTEGER, completed_at DATETIME)"))
+            conn.execute(text("INSERT INTO users (id, email) VALUES (1, 'old@example.com')"))
+
+        assert migrate_schema(legacy) == [
+            "users.token_version",
+            "assessment_results.question_index",
+            "assessment_results.attempt",
+            "ix_assessment_results_user_completed",
+            "unique_result_attempt_question",
+        ]
+        assert migrate_schema(legacy) == []
+
+        with legacy.connect() as conn:
+            assert conn.execute(text("SELECT token_version FROM users")).scalar() == 0
+        columns = {c["name"] for c in inspect(legacy).get_columns("assessment_results")}
+        assert {"question_index", "attempt"} <= columns
+        unique = {i["name"]: i["unique"] for i in inspect(legacy).get_indexes("assessment_results")}
+        assert unique["unique_result_attempt_question"]
+        legacy.dispose()
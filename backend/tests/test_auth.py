@@ -3,8 +3,35 @@
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from database import Base, get_db, User, RoleEnum
-from auth import AuthService
+from database import Base, get_db, User, RoleEnum, ConsentLog, RefreshToken
+from auth import (
+    AuthService,
+    Principal,
+    get_token_state,
+    revoke_user_tokens,
+    invalidate_token_state,
+    token_cache_stats,
+    hash_refresh_token,
+)
+from datetime import timedelta
+from passlib.context import CryptContext
+import asyncio
+import hashing
+from hashing import UNUSABLE_PASSWORD_HASH
+from user_cache import UserCache, LocalUserCacheBackend, RedisUserCacheBackend
+from models import UserDetailedResponse
+from ratelimit import SlidingWindowLimiter
+from user_import import import_users
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+from maintenance import prune_password_resets, enforce_data_retention
+import maintenance
+from contextlib import contextmanager
+from database import PasswordReset, UserTracking
+from datetime import datetime
+import time
+from fastapi import HTTPException
 
 # --- FIX 1: Corrected Imports ---
 # Import only the Pydantic schemas *used in this file* from models.py
@@ -47,6 +74,33 @@ class TestPasswordHashing:
         hashed = AuthService.hash_password(password)
         assert not AuthService.verify_password("WrongPassword123!", hashed)
 
+    def test_async_hash_and_verify(self):
+        """Test hashing and verification on the worker pool."""
+        async def run():
+            hashed = await hashing.hash_password_async("TestPassword123!")
+            return await hashing.verify_and_update_async("TestPassword123!", hashed)
+
+        valid, new_hash = asyncio.run(run())
+        assert valid
+        assert new_hash is None
+
+    def test_outdated_profile_is_rehashed(self):
+        """Test that a hash from a weaker profile is flagged for upgrade."""
+        weak = CryptContext(schemes=["argon2"], argon2__rounds=1,
+                            argon2__memory_cost=8192, argon2__parallelism=1)
+        valid, new_hash = hashing.verify_and_update(
+            "TestPassword123!", weak.hash("TestPassword123!"))
+        assert valid
+        assert new_hash is not None
+
+    def test_queue_limit_rejects(self, monkeypatch):
+        """Test that hashing beyond the queue limit fails fast with 503."""
+        monkeypatch.setattr(hashing, "HASH_QUEUE_LIMIT", 0)
+
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(hashing.hash_password_async("TestPassword123!"))
+        assert exc.value.status_code == 503
+
 
 class TestUserCreation:
     """Test user creation and validation."""
@@ -175,3 +229,382 @@ class TestTokenManagement:
         assert payload is not None
         assert payload.sub == user.id
         assert payload.email == user.email
+
+    def test_verified_token_cache(self, db):
+        """Test that a repeated token is served from the verification cache."""
+        user_data = UserCreate(
+            email="test@example.com",
+            password="TestPassword123!",
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        )
+        user, _ = AuthService.create_user(db, user_data)
+
+        token, _ = AuthService.create_access_token(user)
+        first = AuthService.verify_token(token)
+        hits = token_cache_stats()["verified_tokens"]["hits"]
+        assert AuthService.verify_token(token) is first
+        assert token_cache_stats()["verified_tokens"]["hits"] == hits + 1
+
+        expired, _ = AuthService.create_access_token(
+            user, expires_delta=timedelta(seconds=-1))
+        assert AuthService.verify_token(expired) is None
+        assert AuthService.verify_token(token + "x") is None
+
+    def test_refresh_token_rotation(self, db):
+        """Test rotation, reuse detection and revocation by token version."""
+        user_data = UserCreate(
+            email="test@example.com",
+            password="TestPassword123!",
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        )
+        user, _ = AuthService.create_user(db, user_data)
+
+        first, _ = AuthService.issue_refresh_token(db, user)
+        same_user, second, error = AuthService.rotate_refresh_token(db, first)
+        assert error is None
+        assert same_user.id == user.id
+        assert second != first
+
+        # Replaying a token whose successor was already used kills the family
+        _, third, _ = AuthService.rotate_refresh_token(db, second)
+        assert AuthService.rotate_refresh_token(db, first)[2] is not None
+        assert AuthService.rotate_refresh_token(db, third)[2] is not None
+
+        fourth, _ = AuthService.issue_refresh_token(db, user)
+        revoke_user_tokens(user)
+        db.commit()
+        assert AuthService.rotate_refresh_token(db, fourth)[2] is not None
+
+    def test_concurrent_refresh_keeps_family(self, db):
+        """Test that of two refreshes reading the token together one succeeds and the family survives."""
+        user, _ = AuthService.create_user(db, UserCreate(
+            email="test@example.com",
+            password="TestPassword123!",
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        ))
+        token, _ = AuthService.issue_refresh_token(db, user)
+
+        # The second request has already read the token as unused
+        other = TestingSessionLocal(expire_on_commit=False)
+        try:
+            stale = other.query(RefreshToken).filter(
+                RefreshToken.token_hash == hash_refresh_token(token)).first()
+            other.commit()
+
+            _, rotated, error = AuthService.rotate_refresh_token(db, token)
+            assert error is None
+            assert stale.used_at is None
+            assert AuthService.rotate_refresh_token(other, token)[2] == "Refresh token was already rotated."
+        finally:
+            other.close()
+
+        db.expire_all()
+        _, latest, error = AuthService.rotate_refresh_token(db, rotated)
+        assert error is None
+
+        # Outside the grace window the same replay is reuse
+        db.query(RefreshToken).filter(RefreshToken.used_at != None).update(
+            {RefreshToken.used_at: datetime.utcnow() - timedelta(minutes=5)})
+        db.commit()
+        assert AuthService.rotate_refresh_token(db, rotated)[2] == "Invalid refresh token."
+        assert AuthService.rotate_refresh_token(db, latest)[2] is not None
+
+    def test_token_version_revocation(self, db):
+        """Test that bumping token_version is seen after invalidation."""
+        user_data = UserCreate(
+            email="test@example.com",
+            password="TestPassword123!",
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        )
+        user, _ = AuthService.create_user(db, user_data)
+        invalidate_token_state(user.id)
+
+        token, _ = AuthService.create_access_token(user)
+        payload = AuthService.verify_token(token)
+        assert payload.ver == 0
+        assert get_token_state(db, user.id) == (0, True)
+
+        revoke_user_tokens(user)
+        db.commit()
+        assert get_token_state(db, user.id) == (0, True)  # still cached
+        invalidate_token_state(user.id)
+        assert get_token_state(db, user.id) == (1, True)
+
+    def test_principal_loads_user_lazily(self, db):
+        """Test that the principal only queries users when asked."""
+        user_data = UserCreate(
+            email="test@example.com",
+            password="TestPassword123!",
+            first_name="John",
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        )
+        user, _ = AuthService.create_user(db, user_data)
+        token, _ = AuthService.create_access_token(user)
+
+        principal = Principal(AuthService.verify_token(token), db)
+        assert principal.id == user.id
+        assert principal.role == RoleEnum.USER
+        assert principal._user is None
+        assert principal.first_name == "John"
+        assert principal._user is not None
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis client calls the cache uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def pipeline(self, transaction=False):
+        return self
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value.encode()
+
+    def execute(self):
+        pass
+
+    def delete(self, *keys):
+        for k in keys:
+            self.data.pop(k, None)
+
+
+class TestUserCache:
+    """Test the read-through user snapshot cache."""
+
+    def _make_users(self, db, count):
+        users = []
+        for i in range(count):
+            user, _ = AuthService.create_user(db, UserCreate(
+                email=f"user{i}@example.com",
+                password="TestPassword123!",
+                first_name="John" if i == 0 else None,
+                terms_accepted=True,
+                privacy_accepted=True,
+                consent_accepted=True,
+            ))
+            users.append(user)
+        return users
+
+    @pytest.mark.parametrize("backend", ["local", "redis"])
+    def test_read_through_and_invalidate(self, db, backend):
+        """Test hits, batched misses and invalidation on both backends."""
+        cache = UserCache(LocalUserCacheBackend() if backend == "local"
+                          else RedisUserCacheBackend(FakeRedis()))
+        users = self._make_users(db, 3)
+        ids = [u.id for u in users]
+
+        snapshots = cache.get_many(db, ids + [9999])
+        assert set(snapshots) == set(ids)
+        assert snapshots[ids[0]].display_name == "John"
+        assert snapshots[ids[1]].display_name == "user1"
+        assert cache.stats()["misses"] == 4
+
+        assert cache.get(db, ids[0]).email == "user0@example.com"
+        assert cache.stats()["hits"] == 1
+
+        users[0].first_name = "Jane"
+        db.commit()
+        assert cache.get(db, ids[0]).first_name == "John"  # stale until invalidated
+        cache.invalidate(ids[0])
+        assert cache.get(db, ids[0]).first_name == "Jane"
+
+    def test_snapshot_serves_admin_view(self, db):
+        """Test that a snapshot validates into the admin response schema."""
+        user = self._make_users(db, 1)[0]
+        snapshot = UserCache(LocalUserCacheBackend()).get(db, user.id)
+
+        detail = UserDetailedResponse.model_validate(snapshot)
+        assert detail.email == user.email
+        assert detail.role == "user"
+
+
+class TestRateLimiter:
+    """Test the in-memory sliding-window limiter."""
+
+    def test_limit_and_window(self):
+        """Test that requests over the limit are rejected until the window slides."""
+        limiter = SlidingWindowLimiter("test", limit=3, window=0.2)
+
+        assert [limiter.hit("1.2.3.4")[0] for _ in range(3)] == [True] * 3
+        allowed, retry_after = limiter.hit("1.2.3.4")
+        assert not allowed
+        assert 0 < retry_after <= 0.2
+        assert limiter.hit("5.6.7.8")[0]
+
+        time.sleep(0.25)
+        assert limiter.hit("1.2.3.4")[0]
+        assert limiter.stats()["rejected"] == 1
+
+    def test_idle_keys_are_swept(self):
+        """Test that keys idle for a full window are evicted."""
+        limiter = SlidingWindowLimiter("test", limit=2, window=0.05)
+        limiter.hit("a")
+        time.sleep(0.1)
+        limiter._sweep(time.monotonic())
+        assert limiter.stats()["keys"] == 0
+
+
+class TestMaintenance:
+    """Test the housekeeping jobs."""
+
+    def _make_user(self, db):
+        user, _ = AuthService.create_user(db, UserCreate(
+            email="test@example.com",
+            password="TestPassword123!",
+            first_name="John",
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        ))
+        return user
+
+    def test_prune_password_resets(self, db):
+        """Test that only long-expired or long-used tokens are deleted."""
+        user = self._make_user(db)
+        now = datetime.utcnow()
+        db.add_all([
+            PasswordReset(user_id=user.id, token="live",
+                          expires_at=now + timedelta(hours=1)),
+            PasswordReset(user_id=user.id, token="expired",
+                          expires_at=now - timedelta(days=2)),
+            PasswordReset(user_id=user.id, token="used",
+                          expires_at=now + timedelta(hours=1),
+                          used_at=now - timedelta(days=2)),
+        ])
+        db.commit()
+
+        assert prune_password_resets(db) == 2
+        assert [r.token for r in db.query(PasswordReset)] == ["live"]
+
+    def test_enforce_data_retention(self, db):
+        """Test that users past data_retention_until are anonymized."""
+        user = self._make_user(db)
+        user.data_retention_until = datetime.utcnow() - timedelta(days=1)
+        db.add(UserTracking(user_id=user.id, event_type="login"))
+        db.commit()
+
+        assert enforce_data_retention(db) == 1
+        db.refresh(user)
+        assert user.email == f"deleted-user-{user.id}@deleted.invalid"
+        assert user.first_name is None
+        assert not user.is_active
+        assert user.data_retention_until is None
+        assert db.query(UserTracking).count() == 0
+        assert enforce_data_retention(db) == 0
+
+    def test_run_skipped_without_lock(self, monkeypatch):
+        """Test a worker that loses the maintenance lock runs no jobs."""
+        ran = []
+
+        def job(db):
+            ran.append(job)
+            return 1
+
+        @contextmanager
+        def held_elsewhere(key, bind=None):
+            yield False
+
+        scheduler = maintenance.MaintenanceScheduler(jobs=[job])
+        monkeypatch.setattr(maintenance, "leader_lock", held_elsewhere)
+        assert scheduler.run_once() == {}
+        assert ran == [] and scheduler.stats()["skipped_runs"] == 1
+
+        monkeypatch.undo()
+        assert scheduler.run_once() == {"job": 1}
+
+
+class TestUserImport:
+    """Test bulk user provisioning."""
+
+    def test_csv_import_report(self, db):
+        """Test chunked import with existing, duplicate and invalid rows."""
+        AuthService.create_user(db, UserCreate(
+            email="exists@example.com",
+            password="TestPassword123!",
+            terms_accepted=True,
+            privacy_accepted=True,
+            consent_accepted=True,
+        ))
+        lines = ["email,first_name,terms_accepted,privacy_accepted,consent_accepted"]
+        lines += [f"user{i}@example.com,User{i},true,true,true" for i in range(5)]
+        lines += [
+            "exists@example.com,Old,true,true,true",
+            "user0@example.com,Again,true,true,true",
+            "refused@example.com,No,false,true,true",
+        ]
+        upload = io.BytesIO("\n".join(lines).encode("utf-8"))
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            report = import_users(db, upload, "csv", chunk_size=2, pool=pool)
+
+        assert report["total"] == 8
+        assert report["created"] == 5
+        assert report["existing"] == 1
+        assert [e["row"] for e in report["errors"]] == [8, 9]
+        assert db.query(User).count() == 6
+        assert db.query(ConsentLog).count() == 6
+
+    def test_passwordless_rows_skip_hashing(self, db):
+        """Test that rows without a password get an unusable hash instead of a hashed secret."""
+        upload = io.BytesIO((
+            "email,password,terms_accepted,privacy_accepted,consent_accepted\n"
+            "nopass@example.com,,true,true,true\n"
+            "withpass@example.com,TestPassword123!,true,true,true\n"
+        ).encode("utf-8"))
+        hashed = []
+
+        class RecordingPool(ThreadPoolExecutor):
+            def map(self, fn, items, **kwargs):
+                items = list(items)
+                hashed.extend(items)
+                return super().map(fn, items, **kwargs)
+
+        with RecordingPool(max_workers=2) as pool:
+            report = import_users(db, upload, "csv", pool=pool)
+
+        assert report["created"] == 2
+        assert hashed == ["TestPassword123!"]
+        assert AuthService.authenticate_user(db, "withpass@example.com", "TestPassword123!")[1] is None
+        nopass = db.query(User).filter(User.email == "nopass@example.com").one()
+        assert nopass.password_hash == UNUSABLE_PASSWORD_HASH
+        assert AuthService.authenticate_user(db, "nopass@example.com", "!")[0] is None
+
+    def test_invalid_utf8_reported(self, db):
+        """Test that a line that is not UTF-8 is reported and the rest imported."""
+        lines = [
+            json.dumps({"email": f"utf{i}@example.com", "terms_accepted": True,
+                        "privacy_accepted": True, "consent_accepted": True})
+            for i in range(3)
+        ]
+        lines.insert(1, '{"email": "caf\xe9@example.com"}')
+        ndjson = "\n".join(lines).encode("latin-1")
+        csv_upload = (
+            "email,terms_accepted,privacy_accepted,consent_accepted\n"
+            "csv0@example.com,true,true,true\n"
+            "caf\xe9@example.com,true,true,true\n"
+            "csv1@example.com,true,true,true\n"
+        ).encode("latin-1")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            ndjson_report = import_users(db, io.BytesIO(ndjson), "ndjson", chunk_size=2, pool=pool)
+            csv_report = import_users(db, io.BytesIO(csv_upload), "csv", chunk_size=2, pool=pool)
+
+        for report, created, bad_row in [(ndjson_report, 3, 2), (csv_report, 2, 3)]:
+            assert report["total"] == created + 1
+            assert report["created"] == created
+            assert [e["row"] for e in report["errors"]] == [bad_row]
+            assert "utf-8" in report["errors"][0]["error"]
@@ -0,0 +1,307 @@
+# /backend/tests/test_gamification.py
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from database import (
+    Base,
+    User,
+    RoleEnum,
+    DailyPractice,
+    UserDailyActivity,
+    Streak,
+    UserBadge,
+    migrate_schema,
+)
+from activity import (
+    record_daily_activity,
+    daily_sessions,
+    activity_totals,
+    backfill_daily_activity,
+)
+import badges
+from badges import BadgeCatalog, award_badges, earned_badges, BADGES_CONFIG
+from models import BadgeResponse
+from leaderboard import Leaderboard
+from streaks import local_today, summarize_runs, recompute_streaks, update_streak
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+
+# Test database
+SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_TEST_DATABASE_URL,
+                       connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    """Create a test database session."""
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def user(db):
+    """Create a practising user."""
+    user = User(email="practice@example.com", password_hash="x",
+                role=RoleEnum.USER)
+    db.add(user)
+    db.commit()
+    return user
+
+
+class TestDailyActivity:
+    """Test the per-user daily practice rollup."""
+
+    def test_record_and_read_range(self, db, user):
+        """Test rollup rows fill the weekly/monthly arrays by day offset."""
+        today = date(2026, 3, 31)
+        record_daily_activity(db, user.id, today, "yoga", 20, new_session=True)
+        record_daily_activity(db, user.id, today, "nlp", 10, new_session=True)
+        # More minutes on an existing log are not a new session
+        record_daily_activity(db, user.id, today, "yoga", 5, new_session=False)
+        record_daily_activity(db, user.id, today - timedelta(days=30),
+                              "meditation", None, new_session=True)
+        # Outside the 31-day window
+        record_daily_activity(db, user.id, today - timedelta(days=31),
+                              "meditation", 15, new_session=True)
+        db.commit()
+
+        row = db.get(UserDailyActivity, (user.id, today))
+        assert (row.sessions, row.minutes, row.yoga_sessions, row.nlp_sessions) == (2, 35, 1, 1)
+
+        monthly = daily_sessions(db, user.id, 31, today=today)
+        assert len(monthly) == 31
+        assert monthly[0] == 1 and monthly[-1] == 2 and sum(monthly) == 3
+        assert activity_totals(db, user.id) == {"sessions": 4, "minutes": 50}
+
+    def test_backfill_matches_practice_log(self, db, user):
+        """Test rebuilding the rollup from daily_practice."""
+        day = date(2026, 3, 1)
+        db.add_all([
+            DailyPractice(user_id=user.id, practice_type="yoga",
+                          duration_minutes=30, logged_date=day),
+            DailyPractice(user_id=user.id, practice_type="meditation",
+                          duration_minutes=None, logged_date=day),
+            DailyPractice(user_id=user.id, practice_type="yoga",
+                          duration_minutes=10, logged_date=day + timedelta(days=1)),
+        ])
+        # A drifted row is corrected in place, one without practices removed
+        db.add_all([
+            UserDailyActivity(user_id=user.id, activity_date=day, sessions=9, minutes=9,
+                              meditation_sessions=0, yoga_sessions=9, nlp_sessions=0),
+            UserDailyActivity(user_id=user.id, activity_date=day - timedelta(days=1),
+                              sessions=1, minutes=5, meditation_sessions=1,
+                              yoga_sessions=0, nlp_sessions=0),
+        ])
+        db.commit()
+
+        assert backfill_daily_activity(db, batch_size=1) == 2
+        row = db.get(UserDailyActivity, (user.id, day))
+        assert (row.sessions, row.minutes, row.yoga_sessions, row.meditation_sessions) == (2, 30, 1, 1)
+        assert db.get(UserDailyActivity, (user.id, day - timedelta(days=1))) is None
+        assert activity_totals(db, user.id) == {"sessions": 3, "minutes": 40}
+
+
+class TestBadgeEngine:
+    """Test set-based badge evaluation."""
+
+    def test_award_in_bulk_once(self, db, user, monkeypatch):
+        """Test every met criterion is awarded in one pass, and only once."""
+        catalog = BadgeCatalog()
+        monkeypatch.setattr(badges, "badge_catalog", catalog)
+        db.add_all([
+            DailyPractice(user_id=user.id, practice_type="yoga",
+                          logged_date=date(2026, 3, 1) + timedelta(days=i))
+            for i in range(50)
+        ])
+        db.add(Streak(user_id=user.id, practice_type="all",
+                      current_streak=7, longest_streak=7))
+        db.commit()
+
+        awarded = {badge.name for badge in award_badges(db, user.id)}
+        assert awarded == {"First Step", "Week Warrior", "Yoga Yogi"}
+        assert award_badges(db, user.id) == []
+        assert db.query(UserBadge).filter(UserBadge.user_id == user.id).count() == 3
+        assert len(catalog.get(db)) == len(BADGES_CONFIG)
+
+    def test_migration_removes_duplicate_awards(self, tmp_path):
+        """Test existing user_badges get the unique constraint, duplicates dropped."""
+        legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with legacy.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE user_badges (id INTEGER PRIMARY KEY, "
+                "user_id INTEGER, badge_id INTEGER)"))
+            conn.execute(text(
+                "INSERT INTO user_badges (id, user_id, badge_id) "
+                "VALUES (1, 1, 1), (2, 1, 1), (3, 1, 2)"))
+
+        assert "unique_user_badge" in migrate_schema(legacy)
+        with legacy.connect() as conn:
+            assert conn.execute(text("SELECT id FROM user_badges ORDER BY id")).scalars().all() == [1, 3]
+        assert any(i["name"] == "unique_user_badge" and i["unique"]
+                   for i in inspect(legacy).get_indexes("user_badges"))
+        legacy.dispose()
+
+    def test_declarative_criteria(self):
+        """Test a criterion is just a counter name compared to a threshold."""
+        catalog = [
+            BadgeResponse(id=1, name="Hour", description="", icon_url=None,
+                          criteria_type="minutes", criteria_value=60),
+            BadgeResponse(id=2, name="Yoga", description="", icon_url=None,
+                          criteria_type="sessions_yoga", criteria_value=2),
+        ]
+        counters = {"minutes": 75, "sessions_yoga": 1}
+        assert [b.name for b in earned_badges(catalog, counters, set())] == ["Hour"]
+        assert earned_badges(catalog, counters, {1}) == []
+
+
+class TestLeaderboard:
+    """Test the precomputed leaderboard windows."""
+
+    def test_windows_rank_independently(self, db):
+        """Test week/month rank by activity in the window, all by streak."""
+        today = date(2026, 3, 31)
+        for user_id, streak in [(1, 10), (2, 3), (3, 5)]:
+            db.add(User(id=user_id, email=f"u{user_id}@example.com",
+                        password_hash="x", role=RoleEnum.USER))
+            db.add(Streak(user_id=user_id, practice_type="all",
+                          current_streak=streak, longest_streak=streak))
+        db.commit()
+        # User 2 is busiest this week; user 1 practiced just before it
+        # (day 7 back) and long ago, day 30 back is outside the month
+        db.add_all([
+            UserDailyActivity(user_id=user_id, activity_date=today - timedelta(days=day_offset),
+                              sessions=sessions, minutes=10 * sessions)
+            for day_offset, user_id, sessions in [
+                (40, 1, 9), (7, 1, 4), (30, 2, 5), (1, 2, 3), (20, 3, 2), (6, 3, 1)]
+        ])
+        db.commit()
+
+        board = Leaderboard()
+        board.rebase(db, today)
+        ranked = lambda period: [user_id for _, user_id, _ in board.boards[period].slice(0, 10)]
+        assert ranked("all") == [1, 3, 2]
+        assert ranked("week") == [2, 3]
+        assert ranked("month") == [1, 3, 2]
+        assert board.boards["month"].get(2) == (3, 3, 30)
+
+    def test_practice_log_updates_rank_in_place(self, db):
+        """Test an incremental update moves a user without a rebase."""
+        board = Leaderboard()
+        board.rebase(db, date(2026, 3, 31))
+        board.record_practice(1, 20, new_session=True, current_streak=1)
+        board.record_practice(2, 30, new_session=True, current_streak=2)
+        assert board.boards["all"].rank(2) == 1
+        board.record_practice(1, 5, new_session=False, current_streak=1)
+        assert board.boards["week"].get(1) == (1, 1, 25)
+
+        board.record_practice(1, 10, new_session=True, current_streak=3)
+        assert [user_id for _, user_id, _ in board.boards["all"].slice(0, 2)] == [1, 2]
+        assert board.stats()["incremental_updates"] == 4
+
+    def test_refresh_runs_only_when_stale(self, db):
+        """Test the background refresh rebases once and skips a rebase already running."""
+        board = Leaderboard(session_factory=TestingSessionLocal)
+        assert board.refresh()
+        assert not board.refresh()
+        assert board.stats()["rebases"] == 1
+
+        board.rebase_seconds = 0
+        with board._rebasing:
+            assert not board.refresh()
+        assert board.refresh()
+        assert board.stats()["rebases"] == 2
+
+    def test_position_and_neighbourhood(self, db):
+        """Test rank, percentile and the places around a user."""
+        board = Leaderboard()
+        board.rebase(db)
+        board.boards["all"].load({
+            user_id: (streak, 0, 0)
+            for user_id, streak in enumerate([9, 8, 7, 6, 5, 4, 3, 2, 1, 0], 1)
+        })
+
+        position = board.around("all", 4, k=2)
+        assert (position["rank"], position["total_ranked"], position["percentile"]) == (4, 10, 70.0)
+        assert [user_id for _, user_id, _ in position["entries"]] == [2, 3, 4, 5, 6]
+        # Clipped at the top of the board
+        assert [rank for rank, _, _ in board.around("all", 1, k=2)["entries"]] == [1, 2, 3]
+        assert board.around("week", 4, k=2) == {
+            "rank": None, "total_ranked": 0, "percentile": None, "entries": []}
+
+
+class TestStreakEngine:
+    """Test timezone-aware, recomputable streaks."""
+
+    def test_local_today(self):
+        """Test the practice day follows the user's timezone."""
+        now = datetime(2026, 3, 31, 22, 30, tzinfo=timezone.utc)
+        assert local_today("Asia/Tokyo", now) == date(2026, 4, 1)
+        assert local_today("America/Los_Angeles", now) == date(2026, 3, 31)
+        assert local_today("Not/AZone", now) == local_today(None, now) == date(2026, 3, 31)
+
+    def test_run_length_encoding(self):
+        """Test runs, duplicates and lapsed streaks across groups in one pass."""
+        # Group 1: days 1-3 and 5-6 (alive on day 7); group 2: days 1-4, lapsed by day 7
+        groups = np.array([1, 1, 1, 1, 1, 1, 2, 2, 2, 2], dtype=np.int64)
+        days = np.array([6, 1, 2, 2, 3, 5, 1, 2, 3, 4], dtype=np.int64)
+        runs = summarize_runs(groups, days, np.full(10, 7, dtype=np.int64))
+        assert runs["group"].tolist() == [1, 2]
+        assert runs["current"].tolist() == [2, 0]
+        assert runs["longest"].tolist() == [3, 4]
+        assert runs["started"].tolist() == [5, 1]
+        assert runs["last"].tolist() == [6, 4]
+
+    def test_migration_allows_per_type_rows(self, tmp_path):
+        """Test the old one-row-per-user index is swapped for (user, type)."""
+        legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with legacy.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE streaks (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                "practice_type VARCHAR(50))"))
+            conn.execute(text("CREATE UNIQUE INDEX ix_streaks_user_id ON streaks (user_id)"))
+            conn.execute(text("INSERT INTO streaks (user_id, practice_type) VALUES (1, 'all')"))
+
+        assert migrate_schema(legacy) == [
+            "ix_streaks_user_id (no longer unique)", "unique_user_streak_type"]
+        assert migrate_schema(legacy) == []
+        with legacy.begin() as conn:
+            conn.execute(text("INSERT INTO streaks (user_id, practice_type) VALUES (1, 'yoga')"))
+        with pytest.raises(Exception):
+            with legacy.begin() as conn:
+                conn.execute(text("INSERT INTO streaks (user_id, practice_type) VALUES (1, 'yoga')"))
+        legacy.dispose()
+
+    def test_recompute_matches_incremental(self, db, user):
+        """Test the bulk rebuild agrees with logging day by day, per type."""
+        user.timezone = "Asia/Tokyo"
+        start = date(2026, 3, 20)
+        for offset, practice_type in [(0, "yoga"), (1, "yoga"), (2, "nlp"), (4, "yoga"), (5, "nlp")]:
+            day = start + timedelta(days=offset)
+            db.add(DailyPractice(user_id=user.id, practice_type=practice_type, logged_date=day))
+            update_streak(db, user.id, "all", day)
+            update_streak(db, user.id, practice_type, day)
+        incremental = {
+            s.practice_type: (s.current_streak, s.longest_streak)
+            for s in db.query(Streak).filter(Streak.user_id == user.id)
+        }
+        assert incremental == {"all": (2, 3), "yoga": (1, 2), "nlp": (1, 1)}
+
+        # 15:30 UTC on the 25th is already the 26th in Tokyo: "all" and
+        # "nlp" (last on the 25th) are still alive, "yoga" has lapsed
+        now = datetime(2026, 3, 25, 15, 30, tzinfo=timezone.utc)
+        ids = {s.practice_type: s.id for s in db.query(Streak)}
+        assert recompute_streaks(db, batch_size=1, now=now) == 3
+        # Rows are updated in place, not deleted and reinserted
+        assert {s.practice_type: s.id for s in db.query(Streak)} == ids
+        recomputed = {
+            s.practice_type: (s.current_streak, s.longest_streak)
+            for s in db.query(Streak).filter(Streak.user_id == user.id)
+        }
+        assert recomputed == {"all": (2, 3), "yoga": (0, 2), "nlp": (1, 1)}
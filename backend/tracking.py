@@ -0,0 +1,178 @@
+# tracking.py
+
+from sqlalchemy import insert
+from datetime import datetime
+from typing import Optional
+import logging
+import os
+import queue
+import threading
+import time
+
+from database import SessionLocal, UserTracking
+
+logger = logging.getLogger(__name__)
+
+TRACKING_QUEUE_SIZE = int(os.getenv("TRACKING_QUEUE_SIZE", "10000"))
+TRACKING_BATCH_SIZE = int(os.getenv("TRACKING_BATCH_SIZE", "500"))
+TRACKING_FLUSH_INTERVAL = float(
+    os.getenv("TRACKING_FLUSH_INTERVAL_SECONDS", "1.0"))
+# How often the flusher checks for shutdown while waiting on the queue
+STOP_POLL_INTERVAL = 0.1
+
+
+class EventTracker:
+    """
+    Bounded in-process queue of UserTracking events, written in bulk by a
+    background thread. A batch is flushed when it reaches batch_size or
+    flush_interval seconds after its first event, whichever comes first.
+    When the queue is full new events are dropped and counted rather than
+    blocking the request.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        maxsize: int = TRACKING_QUEUE_SIZE,
+        batch_size: int = TRACKING_BATCH_SIZE,
+        flush_interval: float = TRACKING_FLUSH_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._write_lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def track(
+        self,
+        user_id: int,
+        event_type: str,
+        event_data: Optional[dict] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> bool:
+        """Queue an event; returns False if it was dropped."""
+        event = {
+            "user_id": user_id,
+            "event_type": event_type,
+            "event_data": event_data,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "session_id": session_id,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(
+                    "Tracking queue full, events dropped so far: %s", self.dropped)
+            return False
+
+        self.enqueued += 1
+        return True
+
+    def start(self) -> None:
+        """Start the background flusher thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="tracking-flusher", daemon=True)
+        self._thread.start()
+        logger.info("Tracking flusher started")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher and write whatever is still queued."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        logger.info("Tracking flusher stopped: %s", self.stats())
+
+    def flush(self) -> int:
+        """Write all queued events now. Returns the number written."""
+        written = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=STOP_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(
+                        timeout=min(remaining, STOP_POLL_INTERVAL)))
+                except queue.Empty:
+                    continue
+
+            self._write(batch)
+
+    def _drain(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list) -> int:
+        """Bulk-insert one batch; failures are logged and counted."""
+        with self._write_lock:
+            db = self.session_factory()
+            try:
+                db.execute(insert(UserTracking), batch)
+                db.commit()
+                self.written += len(batch)
+                self.batches += 1
+                return len(batch)
+            except Exception as e:
+                db.rollback()
+                self.failed += len(batch)
+                logger.error(
+                    "Failed to write %s tracking events: %s", len(batch), e)
+                return 0
+            finally:
+                db.close()
+
+    def stats(self) -> dict:
+        """Queue depth and counters for monitoring."""
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+tracker = EventTracker()
+
+
+def track_event(user_id: int, event_type: str, event_data: Optional[dict] = None, **kwargs) -> bool:
+    """Queue a UserTracking event on the shared tracker."""
+    return tracker.track(user_id, event_type, event_data, **kwargs)
@@ -0,0 +1,176 @@
+# user_cache.py
+
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+import logging
+import os
+import threading
+
+from database import User
+from models import UserSnapshot
+from cache import TTLCache, get_redis_client, REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_BACKEND = os.getenv(
+    "USER_CACHE_BACKEND", "redis" if REDIS_URL else "local")
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+REDIS_KEY_PREFIX = "mindfulpath:user:"
+
+
+# ====== BACKENDS ======
+
+class LocalUserCacheBackend:
+    """Per-process LRU+TTL store; other workers see changes within the TTL."""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name="users")
+
+    def get_many(self, user_ids: List[int]) -> Dict[int, UserSnapshot]:
+        found = {}
+        for user_id in user_ids:
+            snapshot = self._cache.get(user_id)
+            if snapshot is not None:
+                found[user_id] = snapshot
+        return found
+
+    def set_many(self, snapshots: List[UserSnapshot]) -> None:
+        for snapshot in snapshots:
+            self._cache.set(snapshot.id, snapshot)
+
+    def delete(self, user_id: int) -> None:
+        self._cache.delete(user_id)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class RedisUserCacheBackend:
+    """
+    Shared store on a Redis-compatible server (e.g. ElastiCache), so an
+    invalidation reaches every worker at once. Redis errors are logged and
+    treated as misses; the database stays the source of truth.
+    """
+
+    def __init__(self, client, ttl: float = USER_CACHE_TTL_SECONDS, prefix: str = REDIS_KEY_PREFIX):
+        self.client = client
+        self.ttl = max(1, int(ttl))
+        self.prefix = prefix
+        self.errors = 0
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}"
+
+    def get_many(self, user_ids: List[int]) -> Dict[int, UserSnapshot]:
+        try:
+            values = self.client.mget([self._key(i) for i in user_ids])
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"User cache read failed: {e}")
+            return {}
+
+        return {
+            user_id: UserSnapshot.model_validate_json(value)
+            for user_id, value in zip(user_ids, values)
+            if value is not None
+        }
+
+    def set_many(self, snapshots: List[UserSnapshot]) -> None:
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for snapshot in snapshots:
+                pipe.setex(self._key(snapshot.id), self.ttl,
+                           snapshot.model_dump_json())
+            pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"User cache write failed: {e}")
+
+    def delete(self, user_id: int) -> None:
+        try:
+            self.client.delete(self._key(user_id))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"User cache invalidation failed for {user_id}: {e}")
+
+    def clear(self) -> None:
+        try:
+            keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+            if keys:
+                self.client.delete(*keys)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"User cache clear failed: {e}")
+
+
+def make_backend():
+    """Build the backend selected by USER_CACHE_BACKEND."""
+    if USER_CACHE_BACKEND == "redis":
+        client = get_redis_client()
+        if client is not None:
+            logger.info("User cache using Redis backend")
+            return RedisUserCacheBackend(client)
+        logger.warning("Redis unavailable; user cache using local backend")
+    return LocalUserCacheBackend()
+
+
+# ====== CACHE ======
+
+class UserCache:
+    """Read-through cache of UserSnapshot objects keyed by user id."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, user_id: int) -> Optional[UserSnapshot]:
+        """Snapshot for one user, or None if the user does not exist."""
+        return self.get_many(db, [user_id]).get(user_id)
+
+    def get_many(self, db: Session, user_ids: Iterable[int]) -> Dict[int, UserSnapshot]:
+        """Snapshots for several users, loading all misses in one query."""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+
+        found = self.backend.get_many(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in found]
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = [
+                UserSnapshot.model_validate(user)
+                for user in db.query(User).filter(User.id.in_(missing))
+            ]
+            self.backend.set_many(loaded)
+            found.update((snapshot.id, snapshot) for snapshot in loaded)
+
+        return found
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's snapshot; call after committing a change to the row."""
+        self.backend.delete(user_id)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring."""
+        with self._lock:
+            stats = {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+        if isinstance(self.backend, RedisUserCacheBackend):
+            stats["errors"] = self.backend.errors
+        return stats
+
+
+user_cache = UserCache(make_backend())
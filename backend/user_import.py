@@ -0,0 +1,286 @@
+# user_import.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+import codecs
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import threading
+
+from database import User, ConsentLog, RoleEnum
+from models import ImportedUser
+from hashing import hash_password, UNUSABLE_PASSWORD_HASH
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "500"))
+IMPORT_HASH_PROCESSES = int(
+    os.getenv("USER_IMPORT_HASH_PROCESSES", str(os.cpu_count() or 1)))
+MAX_REPORTED_ERRORS = 1000
+BOOLEAN_FIELDS = ("terms_accepted", "privacy_accepted", "consent_accepted")
+TERMS_VERSION = "1.0"
+PRIVACY_VERSION = "1.0"
+
+# Created on first import; Argon2 is CPU-bound, so separate processes give
+# true parallelism for large uploads. Workers are spawned rather than
+# forked: the API process already runs threads, and a forked child can
+# inherit their locks mid-acquire.
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_pool_lock = threading.Lock()
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(
+                max_workers=IMPORT_HASH_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(wait=False, cancel_futures=True)
+            _hash_pool = None
+
+
+# ====== PARSING ======
+
+def decode_lines(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    """
+    (line_number, text) for each line of an upload. Lines are decoded one
+    at a time, so a line that is not UTF-8 comes back as its
+    UnicodeDecodeError without affecting the lines around it.
+    """
+    for line_number, raw in enumerate(stream, start=1):
+        if line_number == 1:
+            raw = raw.removeprefix(codecs.BOM_UTF8)
+        try:
+            yield line_number, raw.decode("utf-8")
+        except UnicodeDecodeError as e:
+            yield line_number, e
+
+
+def iter_records(stream: BinaryIO, file_format: str) -> Iterator[Tuple[int, object]]:
+    """
+    Stream (row_number, record) pairs from a CSV or NDJSON upload without
+    reading it into memory. A record that cannot be parsed or decoded is
+    yielded as an Exception instance so it lands in the error report.
+    """
+    if file_format == "csv":
+        undecodable: List[Tuple[int, Exception]] = []
+
+        def text_lines() -> Iterator[str]:
+            for line_number, line in decode_lines(stream):
+                if isinstance(line, Exception):
+                    # Read as a blank line, which DictReader skips
+                    undecodable.append((line_number, line))
+                    line = "\n"
+                yield line
+
+        reader = csv.DictReader(text_lines())
+        for row in reader:
+            yield from undecodable
+            undecodable.clear()
+            yield reader.line_num, row
+        yield from undecodable
+        return
+
+    for row_number, line in decode_lines(stream):
+        if isinstance(line, Exception):
+            yield row_number, line
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("each line must be a JSON object")
+            yield row_number, record
+        except ValueError as e:
+            yield row_number, e
+
+
+def normalize_record(record: dict) -> dict:
+    """Turn raw CSV/JSON values into ImportedUser input."""
+    data = {
+        key.strip(): (value.strip() if isinstance(value, str) else value)
+        for key, value in record.items() if key
+    }
+    data = {key: value for key, value in data.items() if value not in ("", None)}
+
+    # CSV booleans arrive as text, and "false" would pass the consent check
+    for field in BOOLEAN_FIELDS:
+        if isinstance(data.get(field), str):
+            data[field] = data[field].lower() in ("true", "1", "yes", "y")
+
+    return data
+
+
+def validate_record(record) -> Tuple[Optional[ImportedUser], Optional[str]]:
+    """Validate one parsed record. Returns (ImportedUser, None) or (None, error)."""
+    if isinstance(record, Exception):
+        return None, f"Unreadable row: {record}"
+    try:
+        return ImportedUser.model_validate(normalize_record(record)), None
+    except ValidationError as e:
+        return None, "; ".join(
+            f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+# ====== IMPORT ======
+
+class ImportReport:
+    """Counters and per-row errors for one import."""
+
+    def __init__(self):
+        self.total = 0
+        self.created = 0
+        self.existing = 0
+        self.errors: List[dict] = []
+        self.error_count = 0
+
+    def error(self, row: int, email: Optional[str], message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "email": email, "error": message})
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "created": self.created,
+            "existing": self.existing,
+            "failed": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+        }
+
+
+def user_row(user: ImportedUser, password_hash: str, now: datetime) -> dict:
+    return {
+        "email": user.email,
+        "password_hash": password_hash,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "age": user.age,
+        "gender": user.gender,
+        "country": user.country,
+        "timezone": user.timezone,
+        "role": RoleEnum.USER,
+        "terms_accepted": True,
+        "privacy_accepted": True,
+        "consent_accepted": True,
+        "is_active": True,
+        "is_email_verified": False,
+        "token_version": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def consent_rows(user_ids: List[int], now: datetime) -> List[dict]:
+    return [
+        {
+            "user_id": user_id,
+            "terms_version": TERMS_VERSION,
+            "privacy_version": PRIVACY_VERSION,
+            "accepted_at": now,
+        }
+        for user_id in user_ids
+    ]
+
+
+def insert_chunk(db: Session, rows: List[dict], now: datetime) -> int:
+    """Insert users and their consent logs in one transaction."""
+    created = db.execute(
+        insert(User).returning(User.id), rows).scalars().all()
+    db.execute(insert(ConsentLog), consent_rows(created, now))
+    db.commit()
+    return len(created)
+
+
+def import_chunk(db: Session, chunk: List[Tuple[int, ImportedUser]], report: ImportReport, pool) -> None:
+    """Skip existing emails, hash in parallel and insert one chunk."""
+    emails = [user.email for _, user in chunk]
+    existing = {
+        email for (email,) in db.query(User.email).filter(User.email.in_(emails))
+    }
+    new = [(row, user) for row, user in chunk if user.email not in existing]
+    report.existing += len(chunk) - len(new)
+    if not new:
+        return
+
+    # Rows without a password (the usual provisioning case) get an unusable
+    # hash and set one through password reset; only the rest are hashed
+    passwords = [user.password for _, user in new if user.password]
+    hashes = iter(pool.map(
+        hash_password, passwords,
+        chunksize=max(1, len(passwords) // (IMPORT_HASH_PROCESSES * 4))))
+    now = datetime.utcnow()
+    rows = [user_row(user, next(hashes) if user.password else UNUSABLE_PASSWORD_HASH, now)
+            for _, user in new]
+
+    try:
+        report.created += insert_chunk(db, rows, now)
+        return
+    except IntegrityError:
+        db.rollback()
+
+    # Someone registered one of these emails meanwhile; retry row by row
+    for (row_number, user), values in zip(new, rows):
+        try:
+            report.created += insert_chunk(db, [values], now)
+        except IntegrityError:
+            db.rollback()
+            report.existing += 1
+        except Exception as e:
+            db.rollback()
+            report.error(row_number, user.email, str(e))
+
+
+def import_users(db: Session, stream: BinaryIO, file_format: str, chunk_size: int = IMPORT_CHUNK_SIZE, pool=None) -> dict:
+    """
+    Create users from a CSV or NDJSON stream, chunk_size rows per
+    transaction. Existing emails are skipped; invalid rows are reported.
+    """
+    pool = pool or get_hash_pool()
+    report = ImportReport()
+    seen = set()
+    chunk: List[Tuple[int, ImportedUser]] = []
+
+    for row_number, record in iter_records(stream, file_format):
+        report.total += 1
+        user, error = validate_record(record)
+        if error:
+            email = record.get("email") if isinstance(record, dict) else None
+            report.error(row_number, email, error)
+            continue
+
+        if user.email in seen:
+            report.error(row_number, user.email, "Duplicate email in upload")
+            continue
+        seen.add(user.email)
+
+        chunk.append((row_number, user))
+        if len(chunk) >= chunk_size:
+            import_chunk(db, chunk, report, pool)
+            chunk = []
+
+    if chunk:
+        import_chunk(db, chunk, report, pool)
+
+    logger.info("User import: %s rows, %s created, %s existing, %s failed",
+                report.total, report.created, report.existing, report.error_count)
+    return report.to_dict()
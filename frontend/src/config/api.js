@@ -19,12 +19,73 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Access tokens are short-lived: on a 401, swap the refresh token for a new
+// pair once and retry. Parallel 401s share one refresh call, because a
+// refresh token can only be used once.
+let refreshPromise = null;
+
+// Other tabs share the stored refresh token. If one of them rotates it
+// first, the server refuses ours without logging anyone out; wait this long
+// for that tab to store the new token, then refresh with it.
+const ROTATED_ELSEWHERE_WAIT_MS = 500;
+
+const postRefresh = (refreshToken) =>
+  axios
+    .post(`${API_BASE_URL}/auth/refresh`, { refresh_token: refreshToken })
+    .then((response) => {
+      localStorage.setItem('authToken', response.data.access_token);
+      localStorage.setItem('refreshToken', response.data.refresh_token);
+      return response.data.access_token;
+    });
+
+const refreshTokens = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refreshToken');
+    refreshPromise = postRefresh(refreshToken)
+      .catch(async (error) => {
+        if (error.response?.status !== 401) {
+          throw error;
+        }
+        await new Promise((resolve) => setTimeout(resolve, ROTATED_ELSEWHERE_WAIT_MS));
+        const current = localStorage.getItem('refreshToken');
+        if (!current || current === refreshToken) {
+          throw error;
+        }
+        return postRefresh(current);
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 // Handle 401 errors
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
-    if (error.response?.status === 401) {
+  async (error) => {
+    const original = error.config;
+    const isAuthCall = /^\/auth\/(login|register|refresh|logout)/.test(original?.url || '');
+
+    if (
+      error.response?.status === 401 &&
+      !original._retried &&
+      !isAuthCall &&
+      localStorage.getItem('refreshToken')
+    ) {
+      original._retried = true;
+      try {
+        const accessToken = await refreshTokens();
+        original.headers.Authorization = `Bearer ${accessToken}`;
+        return api(original);
+      } catch (refreshError) {
+        // Fall through to logout
+      }
+    }
+
+    if (error.response?.status === 401 && !isAuthCall) {
       localStorage.removeItem('authToken');
+      localStorage.removeItem('refreshToken');
       window.location.href = '/login';
     }
     return Promise.reject(error);
@@ -46,9 +46,10 @@ export const AuthProvider = ({ children }) => {
   const login = async (email, password) => {
     try {
       const response = await api.post('/auth/login', { email, password });
-      const { access_token, user: userData } = response.data;
+      const { access_token, refresh_token, user: userData } = response.data;
       
       localStorage.setItem('authToken', access_token);
+      localStorage.setItem('refreshToken', refresh_token);
       api.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
       setUser(userData); // Set user in global state
       
@@ -66,9 +67,10 @@ export const AuthProvider = ({ children }) => {
   const register = async (userData) => {
     try {
       const response = await api.post('/auth/register', userData);
-      const { access_token, user: newUser } = response.data;
+      const { access_token, refresh_token, user: newUser } = response.data;
       
       localStorage.setItem('authToken', access_token);
+      localStorage.setItem('refreshToken', refresh_token);
       api.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
       setUser(newUser);
       
@@ -84,9 +86,16 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    // Revoke the refresh token server-side; ignore failures
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      api.post('/auth/logout', { refresh_token: refreshToken }).catch(() => {});
+    }
+
     // Clear everything
     setUser(null);
     localStorage.removeItem('authToken');
+    localStorage.removeItem('refreshToken');
     delete api.defaults.headers.common['Authorization'];
     
     navigate('/login'); // Redirect to login page
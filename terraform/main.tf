@@ -368,6 +368,16 @@ resource "aws_ecr_lifecycle_policy" "app" {
   })
 }
 
+# ====== DB CONNECTION BUDGET ======
+
+locals {
+  # Worst case per task: every worker's pool checked out, overflow included
+  db_connections_per_task = var.app_workers_per_task * (var.db_async ? 2 : 1) * (var.db_pool_size + var.db_max_overflow)
+  db_connection_budget    = var.db_max_connections - var.db_reserved_connections
+  # Autoscaling never adds tasks the database cannot serve
+  ecs_max_tasks = min(var.ecs_max_tasks, floor(local.db_connection_budget / local.db_connections_per_task))
+}
+
 # ====== ECS CLUSTER ======
 
 resource "aws_ecs_cluster" "main" {
@@ -476,6 +486,23 @@ resource "aws_ecs_task_definition" "app" {
         {
           name  = "REDIS_URL"
           value = "redis://${aws_elasticache_cluster.main.cache_nodes[0].address}:6379"
+        },
+        {
+          name  = "DB_POOL_SIZE"
+          value = tostring(var.db_pool_size)
+        },
+        {
+          name  = "DB_MAX_OVERFLOW"
+          value = tostring(var.db_max_overflow)
+        },
+        {
+          name  = "DB_ASYNC"
+          value = tostring(var.db_async)
+        },
+        {
+          # Every worker competes for a Postgres advisory lock; one runs each pass
+          name  = "MAINTENANCE_ENABLED"
+          value = "true"
         }
       ]
 
@@ -518,7 +545,7 @@ resource "aws_ecs_service" "app" {
   name            = "${var.app_name}-service"
   cluster         = aws_ecs_cluster.main.id
   task_definition = aws_ecs_task_definition.app.arn
-  desired_count   = 2
+  desired_count   = var.ecs_min_tasks
   launch_type     = "FARGATE"
 
   network_configuration {
@@ -544,8 +571,8 @@ resource "aws_ecs_service" "app" {
 }
 
 resource "aws_appautoscaling_target" "ecs_target" {
-  max_capacity       = 4
-  min_capacity       = 2
+  max_capacity       = local.ecs_max_tasks
+  min_capacity       = min(var.ecs_min_tasks, local.ecs_max_tasks)
   resource_id        = "service/${aws_ecs_cluster.main.name}/${aws_ecs_service.app.name}"
   scalable_dimension = "ecs:service:DesiredCount"
   service_namespace  = "ecs"
@@ -744,6 +771,15 @@ output "ecs_cluster_name" {
   value       = aws_ecs_cluster.main.name
 }
 
+output "db_connection_budget" {
+  description = "Worst-case DB connections per ECS task and the resulting task cap"
+  value = {
+    per_task  = local.db_connections_per_task
+    budget    = local.db_connection_budget
+    max_tasks = local.ecs_max_tasks
+  }
+}
+
 output "redis_endpoint" {
   description = "Redis cluster endpoint"
   value       = aws_elasticache_cluster.main.cache_nodes[0].address
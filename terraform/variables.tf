@@ -55,3 +55,43 @@ variable "razorpay_key" {
   description = "Razorpay API key"
   sensitive   = true
 }
+
+variable "db_max_connections" {
+  description = "max_connections of the Aurora writer (about 180 on db.t3.small)"
+  default     = 180
+}
+
+variable "db_reserved_connections" {
+  description = "Connections kept free for admin sessions, migrations and monitoring"
+  default     = 20
+}
+
+variable "db_pool_size" {
+  description = "SQLAlchemy pool size per worker process (DB_POOL_SIZE)"
+  default     = 5
+}
+
+variable "db_max_overflow" {
+  description = "SQLAlchemy pool overflow per worker process (DB_MAX_OVERFLOW)"
+  default     = 5
+}
+
+variable "db_async" {
+  description = "Serve hot routes from the async engine (DB_ASYNC); adds a second pool per worker"
+  default     = false
+}
+
+variable "app_workers_per_task" {
+  description = "Uvicorn worker processes per ECS task"
+  default     = 1
+}
+
+variable "ecs_min_tasks" {
+  description = "Minimum ECS tasks"
+  default     = 2
+}
+
+variable "ecs_max_tasks" {
+  description = "Upper bound on ECS tasks; lowered further to fit the DB connection budget"
+  default     = 4
+}